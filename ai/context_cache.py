@@ -0,0 +1,166 @@
+import datetime
+import threading
+from dataclasses import dataclass, field
+from typing import Optional
+
+from ai.request_scheduler import _error_code, is_retryable_error
+
+# Errors that mean the cached content is gone (expired or deleted)
+STALE_CODES = {403, 404}
+
+# Smallest prefix (tokens) Gemini accepts as explicit cached content
+MIN_CACHE_TOKENS = {"gemini-2.5-pro": 4096}
+DEFAULT_MIN_CACHE_TOKENS = 1024
+
+
+# -----------------------------
+# Provider-side prompt cache
+# -----------------------------
+@dataclass
+class ContextCache:
+    """
+    The static part of every request (system instruction + prompt) uploaded
+    once as Gemini cached content. Requests then reference it by name and
+    send only the page-specific parts, and cached tokens are billed at a
+    fraction of the input price.
+
+    `bind(base_model, generation_config)` returns a model that answers with
+    the cached prefix, creating the cache on first use and extending its TTL
+    when less than `refresh_seconds` is left. It returns None when caching is
+    unavailable (the model or key does not support it, …); callers then send
+    the prompt inline as before, and such a permanent failure is remembered
+    in `unavailable`. A prefix below the model's minimum cache size (estimated
+    locally, see `min_tokens`) is unavailable without asking the API. Transient
+    failures (429, 5xx, timeouts) are raised instead, so the request
+    scheduler backs off and retries the request, which binds again.
+
+    A base model may bring its own `create_cached_content` and
+    `from_cached_content` (the offline FakeGenerativeModel does); otherwise
+    the google.generativeai caching API is used with the configured key.
+    """
+
+    model_name: str
+    system_instruction: str
+    prompt: str
+    ttl_seconds: float = 3600.0
+    refresh_seconds: float = 300.0
+    # None: the base model's `min_cache_tokens` if it has one, else Gemini's
+    min_tokens: Optional[int] = None
+
+    cached: object = field(default=None, repr=False)
+    unavailable: Optional[str] = None
+    close_error: Optional[str] = None
+    created: int = 0
+    refreshed: int = 0
+
+    def __post_init__(self):
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def _ttl(self) -> datetime.timedelta:
+        return datetime.timedelta(seconds=self.ttl_seconds)
+
+    @property
+    def prefix_tokens(self) -> int:
+        # ~4 characters per token, as in GeminiModel._estimate_tokens
+        return (len(self.system_instruction) + len(self.prompt)) // 4
+
+    def _min_tokens(self, base_model) -> int:
+        if self.min_tokens is not None:
+            return self.min_tokens
+        minimum = getattr(base_model, "min_cache_tokens", None)
+        if minimum is not None:
+            return minimum
+        return MIN_CACHE_TOKENS.get(self.model_name, DEFAULT_MIN_CACHE_TOKENS)
+
+    def _create(self, base_model):
+        create = getattr(base_model, "create_cached_content", None)
+        if create is None:
+            from google.generativeai import caching
+
+            create = caching.CachedContent.create
+        return create(
+            model=self.model_name,
+            display_name="pdf2excel-prompt",
+            system_instruction=self.system_instruction,
+            contents=[self.prompt],
+            ttl=self._ttl,
+        )
+
+    def _bind_model(self, base_model, generation_config):
+        from_cached = getattr(base_model, "from_cached_content", None)
+        if from_cached is None:
+            import google.generativeai as genai
+
+            from_cached = genai.GenerativeModel.from_cached_content
+        return from_cached(self.cached, generation_config=generation_config)
+
+    def _expires_soon(self) -> bool:
+        expire_time = getattr(self.cached, "expire_time", None)
+        if expire_time is None:
+            return False
+        now = datetime.datetime.now(datetime.timezone.utc)
+        return (expire_time - now).total_seconds() < self.refresh_seconds
+
+    def bind(self, base_model, generation_config=None):
+        """A model using the cached prefix, or None to send the prompt inline."""
+        with self._lock:
+            if self.unavailable is not None:
+                return None
+            minimum = self._min_tokens(base_model)
+            if self.cached is None and self.prefix_tokens < minimum:
+                # A request that is certain to fail: skip it
+                self.unavailable = (
+                    f"prefix of ~{self.prefix_tokens} tokens is below "
+                    f"the {minimum}-token minimum"
+                )
+                return None
+            try:
+                if self.cached is None:
+                    self.cached = self._create(base_model)
+                    self._model = self._bind_model(base_model, generation_config)
+                    self.created += 1
+                elif self._expires_soon():
+                    self.cached.update(ttl=self._ttl)
+                    self.refreshed += 1
+            except Exception as e:
+                if self.is_transient_error(e):
+                    raise
+                self.unavailable = f"{type(e).__name__}: {e}"
+                self.cached = self._model = None
+                return None
+            return self._model
+
+    @staticmethod
+    def is_transient_error(exc: Exception) -> bool:
+        return is_retryable_error(exc) or isinstance(exc, (TimeoutError, ConnectionError))
+
+    @staticmethod
+    def is_stale_error(exc: Exception) -> bool:
+        return _error_code(exc) in STALE_CODES
+
+    def invalidate(self):
+        """Forgets a cache the API no longer knows; the next bind creates a new one."""
+        with self._lock:
+            self.cached = self._model = None
+
+    def close(self):
+        """Deletes the cached content so it stops accruing storage cost."""
+        with self._lock:
+            cached, self.cached, self._model = self.cached, None, None
+        if cached is not None:
+            try:
+                cached.delete()
+            except Exception as e:
+                # It expires with its TTL anyway; the caller reports this
+                self.close_error = f"{type(e).__name__}: {e}"
+
+    def stats(self) -> dict:
+        return {
+            "active": self.cached is not None,
+            "created": self.created,
+            "refreshed": self.refreshed,
+            "unavailable": self.unavailable,
+            "close_error": self.close_error,
+        }
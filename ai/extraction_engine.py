@@ -0,0 +1,34 @@
+from typing import Callable, Iterable, Optional, Protocol
+
+import fitz
+
+from ai.models import HangMuc
+
+
+# -----------------------------
+# Local extraction engine interface
+# -----------------------------
+class ExtractionEngine(Protocol):
+    """
+    A local way of reading BOQ pages that `GeminiModel.extract_info` tries
+    before the model (see `local_engines`).
+
+    `extract_page` returns a HangMuc when the engine is confident about the
+    page and None otherwise; None escalates the page to the next engine and
+    finally to Gemini. `prepare` runs once per document before any page is
+    asked for (e.g. to OCR it), `close` once afterwards. A long `prepare`
+    polls `cancel_flag` and returns early once it is true.
+    """
+
+    name: str
+
+    def prepare(
+        self,
+        pdf_path: str,
+        page_numbers: Iterable[int],
+        cancel_flag: Optional[Callable[[], bool]] = None,
+    ) -> None: ...
+
+    def extract_page(self, page: fitz.Page) -> Optional[HangMuc]: ...
+
+    def close(self) -> None: ...
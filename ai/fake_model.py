@@ -0,0 +1,312 @@
+import datetime
+import itertools
+import random
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import Optional
+
+from ai.models import CongViec, DanhSachCongViec, HangMuc
+
+# Matches GeminiModel.TILE_PROMPT
+_TILE = re.compile(r"band (\d+) of (\d+)")
+
+
+class FakeAPIError(Exception):
+    """Mimics google.api_core errors, which expose an HTTP status as `.code`."""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+def sample_hang_muc(rows: int = 20, title: str = "HẠNG MỤC MẪU") -> HangMuc:
+    return HangMuc(
+        ten_hang_muc=title,
+        cong_viec=[
+            CongViec(
+                stt=str(i + 1),
+                noi_dung_cong_viec=f"Công việc mẫu số {i + 1}",
+                don_vi="m3",
+                khoi_luong=f"{i + 1}.234,500",
+            )
+            for i in range(rows)
+        ],
+    )
+
+
+def _deadline_exceeded() -> FakeAPIError:
+    return FakeAPIError(504, "Deadline Exceeded")
+
+
+def _text_tokens(text: str) -> int:
+    # Rough Gemini accounting: ~4 chars per text token
+    return len(text) // 4
+
+
+_cache_ids = itertools.count(1)
+
+
+@dataclass
+class FakeCachedContent:
+    """Stand-in for caching.CachedContent: a token count and an expiry."""
+
+    name: str
+    model: str
+    token_count: int
+    expire_time: datetime.datetime
+    deleted: bool = False
+
+    @property
+    def usable(self) -> bool:
+        return not self.deleted and self.expire_time > datetime.datetime.now(
+            datetime.timezone.utc
+        )
+
+    def update(self, ttl: datetime.timedelta = None, expire_time=None):
+        self.expire_time = expire_time or datetime.datetime.now(datetime.timezone.utc) + ttl
+
+    def delete(self):
+        self.deleted = True
+
+
+class FakeCachedModel:
+    """What `FakeGenerativeModel.from_cached_content` returns."""
+
+    def __init__(self, base: "FakeGenerativeModel", cached: FakeCachedContent):
+        self.base = base
+        self.cached = cached
+
+    def generate_content(self, contents, **kwargs):
+        if not self.cached.usable:
+            raise FakeAPIError(403, "CachedContent not found (or permission denied)")
+        return self.base.generate_content(contents, cached_content=self.cached, **kwargs)
+
+
+class FakeStreamResponse:
+    """Iterates the response text in chunks, like a `stream=True` response."""
+
+    def __init__(
+        self, text: str, usage_metadata, chunk_chars: int, delays, timeout=None
+    ):
+        self.text = text
+        self.usage_metadata = usage_metadata
+        self._chunks = [text[i : i + chunk_chars] for i in range(0, len(text), chunk_chars)]
+        self._delays = delays(len(self._chunks))
+        self._timeout = timeout
+
+    def __iter__(self):
+        elapsed = 0.0
+        for chunk, delay in zip(self._chunks, self._delays):
+            if self._timeout is not None and elapsed + delay > self._timeout:
+                time.sleep(self._timeout - elapsed)
+                raise _deadline_exceeded()
+            elapsed += delay
+            if delay:
+                time.sleep(delay)
+            yield SimpleNamespace(text=chunk)
+
+
+# -----------------------------
+# Local stand-in for genai.GenerativeModel
+# -----------------------------
+@dataclass
+class FakeGenerativeModel:
+    """
+    Offline drop-in for `GeminiModel.model_multimodal`.
+
+    Returns canned HangMuc JSON after a configurable latency and can inject
+    random server errors, random 429s, or real quota behaviour (429 once more
+    than `requests_per_minute` calls arrive within a minute).
+
+        model = GeminiModel(api_key="fake")
+        model.model_multimodal = FakeGenerativeModel(latency=0.5, throttle_rate=0.1)
+    """
+
+    latency: float = 0.0
+    latency_jitter: float = 0.0
+    latency_per_row: float = 0.0  # output-length dependent part of the latency
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    sloppy_rate: float = 0.0  # answers that drop a row, like a lighter model
+    # Share of calls that hang for tail_latency seconds (a stuck request)
+    tail_rate: float = 0.0
+    tail_latency: float = 0.0
+    requests_per_minute: Optional[float] = None
+    # Input-length dependent part of the latency, per 1000 uncached prompt tokens
+    prefill_latency: float = 0.0
+    # Counted in every uncached prompt, like a real model's system instruction
+    system_instruction: str = ""
+    # create_cached_content refuses smaller prefixes, as Gemini does
+    min_cache_tokens: int = 0
+    response: HangMuc = field(default_factory=sample_hang_muc)
+    seed: Optional[int] = None
+
+    # Streaming: chunk size and the delay before the first chunk (None spreads
+    # the whole latency evenly over the chunks)
+    stream_chunk_chars: int = 256
+    time_to_first_token: Optional[float] = None
+
+    calls: int = 0
+    throttled: int = 0
+    sloppy: int = 0
+    cached_contents: int = 0
+
+    def __post_init__(self):
+        self._random = random.Random(self.seed)
+        self._lock = threading.Lock()
+        self._recent = deque()
+
+    def _check_quota(self) -> float:
+        """Raises the injected error for this call, or returns its latency."""
+        with self._lock:
+            self.calls += 1
+            roll = self._random.random()
+            delay = self.latency + self._random.uniform(0, self.latency_jitter)
+            if self._random.random() < self.tail_rate:
+                delay = max(delay, self.tail_latency)
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] > 60:
+                self._recent.popleft()
+            over_quota = (
+                self.requests_per_minute is not None
+                and len(self._recent) >= self.requests_per_minute
+            )
+            if not over_quota:
+                self._recent.append(now)
+            if over_quota or roll < self.throttle_rate:
+                self.throttled += 1
+                raise FakeAPIError(429, "Resource has been exhausted (e.g. check quota).")
+            if roll < self.throttle_rate + self.error_rate:
+                raise FakeAPIError(500, "An internal error has occurred.")
+            return delay
+
+    def _tile_response(self, index: int, count: int) -> HangMuc:
+        # The band's share of the rows plus one row of overlap on each side
+        rows = self.response.cong_viec
+        size = len(rows) / count
+        start = max(0, int((index - 1) * size) - 1)
+        end = min(len(rows), int(index * size) + 1)
+        return HangMuc(
+            ten_hang_muc=self.response.ten_hang_muc if index == 1 else "",
+            cong_viec=rows[start:end],
+        )
+
+    def _drop_row(self, response: HangMuc) -> HangMuc:
+        with self._lock:
+            if len(response.cong_viec) < 3 or self._random.random() >= self.sloppy_rate:
+                return response
+            self.sloppy += 1
+        rows = list(response.cong_viec)
+        del rows[len(rows) // 2]
+        return HangMuc(ten_hang_muc=response.ten_hang_muc, cong_viec=rows)
+
+    def _response(self, contents, generation_config):
+        schema = (generation_config or {}).get("response_schema")
+        if schema is DanhSachCongViec:
+            images = sum(1 for part in contents if isinstance(part, dict))
+            return DanhSachCongViec(
+                du_lieu=[self._drop_row(self.response) for _ in range(images)]
+            )
+        for part in contents:
+            tile = _TILE.search(part) if isinstance(part, str) else None
+            if tile:
+                return self._tile_response(int(tile.group(1)), int(tile.group(2)))
+        return self._drop_row(self.response)
+
+    @staticmethod
+    def _row_count(response) -> int:
+        if isinstance(response, DanhSachCongViec):
+            return sum(len(page.cong_viec) for page in response.du_lieu)
+        return len(response.cong_viec)
+
+    def _usage(self, contents, text: str, cached_content=None) -> SimpleNamespace:
+        # 258 tokens per image; prompt_token_count includes the cached prefix
+        uncached = sum(
+            258 if isinstance(part, dict) else _text_tokens(str(part)) for part in contents
+        )
+        if cached_content is None:
+            uncached += _text_tokens(self.system_instruction)
+            cached = 0
+        else:
+            cached = cached_content.token_count
+        output = _text_tokens(text)
+        return SimpleNamespace(
+            prompt_token_count=uncached + cached,
+            candidates_token_count=output,
+            cached_content_token_count=cached,
+            total_token_count=uncached + cached + output,
+        )
+
+    # ---------------------------------------------------------
+    # Context caching (used by ai.context_cache.ContextCache)
+    # ---------------------------------------------------------
+    def create_cached_content(
+        self,
+        model: str,
+        display_name=None,
+        system_instruction: str = "",
+        contents=(),
+        ttl: datetime.timedelta = datetime.timedelta(hours=1),
+    ) -> FakeCachedContent:
+        tokens = _text_tokens(system_instruction or "") + sum(
+            _text_tokens(str(part)) for part in contents
+        )
+        if tokens < self.min_cache_tokens:
+            raise FakeAPIError(
+                400,
+                f"Cached content is too small. total_token_count={tokens}, "
+                f"min_total_token_count={self.min_cache_tokens}",
+            )
+        with self._lock:
+            self.cached_contents += 1
+        return FakeCachedContent(
+            name=f"cachedContents/fake-{next(_cache_ids)}",
+            model=model,
+            token_count=tokens,
+            expire_time=datetime.datetime.now(datetime.timezone.utc) + ttl,
+        )
+
+    def from_cached_content(self, cached_content, generation_config=None):
+        return FakeCachedModel(self, cached_content)
+
+    def _stream_delays(self, delay: float, chunks: int):
+        if self.time_to_first_token is None or chunks < 2:
+            return [delay / max(1, chunks)] * chunks
+        first = min(delay, self.time_to_first_token)
+        return [first] + [(delay - first) / (chunks - 1)] * (chunks - 1)
+
+    def generate_content(
+        self,
+        contents,
+        generation_config=None,
+        stream=False,
+        request_options=None,
+        cached_content=None,
+        **kwargs,
+    ):
+        delay = self._check_quota()
+        timeout = (request_options or {}).get("timeout")
+        response = self._response(contents, generation_config)
+        delay += self.latency_per_row * self._row_count(response)
+        text = response.model_dump_json()
+        usage = self._usage(contents, text, cached_content)
+        uncached = usage.prompt_token_count - usage.cached_content_token_count
+        delay += self.prefill_latency * uncached / 1000
+        if stream:
+            return FakeStreamResponse(
+                text,
+                usage,
+                self.stream_chunk_chars,
+                lambda chunks: self._stream_delays(delay, chunks),
+                timeout,
+            )
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise _deadline_exceeded()
+        if delay:
+            time.sleep(delay)
+        return SimpleNamespace(text=text, usage_metadata=usage)
@@ -1,29 +1,51 @@
+import contextlib
+import json
+import threading
+import time
+from collections import deque
+from itertools import islice
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    CancelledError,
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
 from dataclasses import dataclass
-from typing import Callable, Dict, List, Optional
+from functools import partial
+from typing import Callable, ContextManager, Dict, List, Optional, Union
 
 import google.generativeai as genai
-from pydantic import BaseModel
 
-from services.pdf_handler import PDFHandler
+from ai.context_cache import ContextCache
+from ai.extraction_engine import ExtractionEngine
+from ai.model_router import ModelRoute, ModelRouter, check_hang_muc
+from ai.models import CongViec, DanhSachCongViec, HangMuc  # noqa: F401
+from ai.request_scheduler import RequestScheduler
+from ai.response_cache import ResponseCache
+from ai.row_stitcher import stitch_rows
+from ai.row_store import PageRows, RowStore
+from ai.stream_parser import RowFeed, StreamingRowParser
+from ai.text_layer_extractor import TextLayerExtractor
+from services.job_journal import JobJournal
+from services.pdf_handler import ImageOptions, PDFHandler
+from services.run_report import RunReport, maybe_span
 
 
-# -----------------------------
-# Pydantic Models
-# -----------------------------
-class CongViec(BaseModel):
-    stt: str
-    noi_dung_cong_viec: str
-    don_vi: str
-    khoi_luong: str
-
+def _in_thread(fn: Callable[[], object]) -> Future:
+    """Runs fn on a daemon thread, so an abandoned call never blocks exit."""
+    future = Future()
 
-class HangMuc(BaseModel):
-    ten_hang_muc: str
-    cong_viec: List[CongViec]
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
 
-
-class DanhSachCongViec(BaseModel):
-    du_lieu: List[HangMuc]
+    threading.Thread(target=run, daemon=True).start()
+    return future
 
 
 # -----------------------------
@@ -34,26 +56,79 @@ class GeminiModel:
     api_key: str
     model_name: str = "gemini-2.5-flash"
 
+    # Optional on-disk cache of validated page responses
+    cache: Optional[ResponseCache] = None
+
+    # Optional shared limit on concurrent API calls (e.g. a cross-process semaphore)
+    request_limiter: Optional[ContextManager] = None
+
+    # Optional quota-aware pacing, backoff and adaptive concurrency
+    scheduler: Optional[RequestScheduler] = None
+
+    # Optional per-run stage timings and token accounting
+    report: Optional[RunReport] = None
+
+    # Stream responses so rows can be shown before the whole page is back
+    stream: bool = False
+
+    # Optional cascade over several API keys and models; replaces model_name
+    router: Optional[ModelRouter] = None
+
+    # Deadline per model call (seconds); an expired call is retried like a 504
+    request_timeout: Optional[float] = 180.0
+
+    # Send a duplicate request once one has been out longer than this
+    # percentile of recent request latencies; the first valid answer wins
+    hedge_percentile: Optional[float] = None
+    hedge_min_samples: int = 20
+
+    # Upload SYSTEM_INSTRUCTION + PROMPT once per run as Gemini cached content
+    # and send only the page parts; falls back to the inline prompt when the
+    # API refuses (e.g. the prefix is below the model's minimum cache size)
+    context_cache: bool = False
+    context_cache_ttl: float = 3600.0
+
     # Cached models to avoid reloading
     _cached_models: Dict[str, genai.GenerativeModel] = None
 
-    SYSTEM_INSTRUCTION = (
-        "You extract BOQ table from image. Output strict JSON only."
-        "Do not guess: if unsure, mark needs_review=true and explain in notes."
+    SYSTEM_INSTRUCTION = "You extract BOQ tables from images. Output strict JSON only."
+
+    # Sent with every page, so kept short: same rules, no indentation or markup
+    PROMPT = (
+        "Extract the BOQ table (Vietnamese) from the image.\n"
+        "- Copy every value as the exact text printed, never as a JSON number: "
+        "KHỐI LƯỢNG '360,000' is \"360,000\", '1.082,333' is \"1.082,333\".\n"
+        "- Include ALL table rows, also rows with an empty STT.\n"
+        "- ĐƠN VỊ: the complete unit, joining stacked or multi-line parts with a "
+        "space ('100m cọc' not 'cọc', 'm3 d.dich' not 'd.dich').\n"
+        "- ten_hang_muc: the section title in the header above the table (usually "
+        "its last line), without labels like 'HẠNG MỤC:' or colons. Never take it "
+        "from inside the table, even bold or capitalized sub-headings. '' if the "
+        "page has no title.\n"
     )
 
-    PROMPT = """
-        Task: Extract the BOQ table (in Vietnamese) from the image.
-        Rules:
-        - **CRITICAL: For all columns, extract the value AS A STRING ONLY. DO NOT convert the format to a standard JSON number (float). Output the raw text value only.**
-        - Example: 
-            - The value '360,000' for KHỐI LƯỢNG must be output as the string "360,000".
-            - The value '1.082,333' for ĐƠN GIÁ must be output as the string "1.082,333".
-        - Get data of ALL rows from the table, INCLUDING rows without "STT" column
-        - **CRITICAL: For the 'ĐƠN VỊ' column, capture the complete unit string, including ALL stacked or multi-line text (e.g., '100m cọc' instead of 'cọc'; 'm3 d.dich' instead of 'd.dich'). If a unit is vertically split, combine all parts into a single string, separated by a space if needed.**
-        - For the 'ten_hang_muc' key, identify and return the main section title or category name ONLY IF it appears in the document's header/title area (above the main table). It is usually the last row of the title. DO NOT extract any text from the table, even if it is bolded, capitalized, or appears as an internal sub-heading. Return only the name itself, without any introductory labels (like 'HẠNG MỤC:') or colons. If the title is absent on this page, return an empty string ('').
+    BATCH_PROMPT = """
+        The following {count} images are consecutive pages of the same document.
+        Apply the task below to each image independently and return "du_lieu" with
+        exactly one entry per image, in the same order as the images.
     """
 
+    TILE_PROMPT = """
+        This image is horizontal band {index} of {count} cut from one page, top to
+        bottom; neighbouring bands overlap a little. The table header may be cut
+        off: the columns are, left to right, STT, NỘI DUNG CÔNG VIỆC, ĐƠN VỊ and
+        KHỐI LƯỢNG. Extract every row that is fully visible and skip rows cut by
+        the top or bottom edge.{title_rule}
+    """
+    TILE_TITLE_RULE = " Return an empty string for 'ten_hang_muc'."
+
+    # How often waits check the cancel flag
+    CANCEL_POLL_SECONDS = 0.1
+
+    # Token estimates used for TPM pacing before the real usage is known
+    IMAGE_TOKEN_ESTIMATE = 1300
+    OUTPUT_TOKEN_ESTIMATE = 2000
+
     generation_config = {
         "temperature": 0,
         "top_p": 0.1,
@@ -71,13 +146,516 @@ class GeminiModel:
 
         # Load once
         if self.model_name not in GeminiModel._cached_models:
-            GeminiModel._cached_models[self.model_name] = genai.GenerativeModel(
-                model_name=self.model_name,
-                system_instruction=self.SYSTEM_INSTRUCTION,
-                generation_config=self.generation_config,
-            )
+            GeminiModel._cached_models[self.model_name] = self._make_model(self.model_name)
 
         self.model_multimodal = GeminiModel._cached_models[self.model_name]
+        if self.router is not None:
+            self.router.build(self._make_model)
+
+        # Recent request latencies, for the hedging threshold
+        self._latencies = deque(maxlen=200)
+        self._latency_lock = threading.Lock()
+
+        # One provider-side prompt cache per model name, made on first use
+        self._context_caches: Dict[str, ContextCache] = {}
+        self._context_lock = threading.Lock()
+
+    def _make_model(self, model_name: str, api_key: Optional[str] = None):
+        model = genai.GenerativeModel(
+            model_name=model_name,
+            system_instruction=self.SYSTEM_INSTRUCTION,
+            generation_config=self.generation_config,
+        )
+        if api_key is not None:
+            # genai.configure() is process-wide; a client of its own lets
+            # this model use a different key than the others
+            from google.ai import generativelanguage as glm
+
+            model._client = glm.GenerativeServiceClient(
+                client_options={"api_key": api_key}
+            )
+        return model
+
+    def _context_cache_for(self, route: Optional[ModelRoute]) -> Optional[ContextCache]:
+        # Cached content belongs to the key that made it, and the SDK's caching
+        # API only uses the configured key: routes on other keys send the prompt
+        if not self.context_cache:
+            return None
+        if route is not None and route.api_key != self.api_key:
+            return None
+        model_name = route.model_name if route is not None else self.model_name
+        with self._context_lock:
+            if model_name not in self._context_caches:
+                self._context_caches[model_name] = ContextCache(
+                    model_name=model_name,
+                    system_instruction=self.SYSTEM_INSTRUCTION,
+                    prompt=self.PROMPT,
+                    ttl_seconds=self.context_cache_ttl,
+                )
+            return self._context_caches[model_name]
+
+    def context_cache_stats(self) -> Dict[str, dict]:
+        with self._context_lock:
+            return {name: cache.stats() for name, cache in self._context_caches.items()}
+
+    def close_context_caches(self):
+        """Deletes this run's cached prompts (they would otherwise live out their TTL)."""
+        with self._context_lock:
+            caches = list(self._context_caches.values())
+        for cache in caches:
+            cache.close()
+
+    def _cache_key(self, image_bytes: bytes, extra_prompt: str = "") -> str:
+        # Everything that can change the model's answer goes into the key
+        config = dict(self.generation_config)
+        config["response_schema"] = config["response_schema"].model_json_schema()
+        parts = [
+            image_bytes,
+            self.PROMPT,
+            self.SYSTEM_INSTRUCTION,
+            self.router.signature() if self.router is not None else self.model_name,
+            json.dumps(config, sort_keys=True),
+        ]
+        if extra_prompt:
+            parts.append(extra_prompt)
+        return ResponseCache.make_key(*parts)
+
+    # ---------------------------------------------------------
+    # Response cache helpers
+    # ---------------------------------------------------------
+    def _cache_lookup(self, page: dict, extra_prompt: str = ""):
+        """Returns (cache_key, cached HangMuc or None)."""
+        if self.cache is None:
+            return None, None
+        cache_key = self._cache_key(page["image_bytes"], extra_prompt)
+        cached = self.cache.get(cache_key)
+        if cached is None:
+            return cache_key, None
+        try:
+            return cache_key, HangMuc.model_validate_json(cached)
+        except ValueError:
+            # Corrupt or written for an older schema: drop it and ask the model
+            self.cache.invalidate(cache_key)
+            return cache_key, None
+
+    def _cache_store(self, cache_key: Optional[str], parsed: HangMuc):
+        # Only validated responses are cached
+        if cache_key is not None:
+            self.cache.put(cache_key, parsed.model_dump_json())
+
+    @staticmethod
+    def _image_part(page: dict) -> dict:
+        return {
+            "mime_type": page.get("mime_type", "image/png"),
+            "data": page["image_bytes"],
+        }
+
+    # ---------------------------------------------------------
+    # Single page request
+    # ---------------------------------------------------------
+    def _limit(self) -> ContextManager:
+        return self.request_limiter or contextlib.nullcontext()
+
+    def _estimate_tokens(self, contents: list) -> int:
+        # Rough upfront cost for the TPM bucket; settled with usage_metadata later
+        prompt = sum(
+            self.IMAGE_TOKEN_ESTIMATE if isinstance(part, dict) else len(part) // 4
+            for part in contents
+        )
+        images = sum(1 for part in contents if isinstance(part, dict))
+        return prompt + images * self.OUTPUT_TOKEN_ESTIMATE
+
+    def _stream(self, model, contents: list, on_row, cancel_flag=None, **kwargs):
+        resp = model.generate_content(contents, stream=True, **kwargs)
+        parser = StreamingRowParser(on_row)
+        for chunk in resp:
+            if cancel_flag is not None and cancel_flag():
+                # Stop reading; the rest of the stream is dropped
+                raise CancelledError("cancelled mid-response")
+            try:
+                parser.feed(chunk.text)
+            except ValueError:
+                # Chunks without text parts (e.g. only a finish reason)
+                continue
+        return resp
+
+    def _generate(
+        self,
+        contents: list,
+        page_numbers: List[int],
+        rows: Optional[RowFeed] = None,
+        route: Optional[ModelRoute] = None,
+        cancel_flag: Optional[Callable[[], bool]] = None,
+        **kwargs,
+    ):
+        model = route.model if route is not None else self.model_multimodal
+        scheduler = route.scheduler if route is not None else None
+        scheduler = scheduler or self.scheduler
+        context = self._context_cache_for(route)
+        if self.request_timeout:
+            kwargs["request_options"] = {"timeout": self.request_timeout}
+
+        def send(model, contents):
+            started = time.perf_counter()
+            forward = rows.attempt(page_numbers) if rows is not None else None
+            first_row = True
+
+            def on_row(index, row):
+                nonlocal first_row
+                if first_row and self.report is not None:
+                    self.report.record("first_row", time.perf_counter() - started)
+                first_row = False
+                if forward is not None:
+                    forward(index, row)
+
+            with self._limit(), maybe_span(self.report, "request"):
+                if self.stream:
+                    return self._stream(model, contents, on_row, cancel_flag, **kwargs)
+                resp = model.generate_content(contents, **kwargs)
+            if self.report is not None:
+                # Without streaming no row is visible before the whole response
+                self.report.record("first_row", time.perf_counter() - started)
+            return resp
+
+        def call():
+            if cancel_flag is not None and cancel_flag():
+                raise CancelledError("cancelled")
+            cached_model = (
+                context.bind(model, self.generation_config) if context is not None else None
+            )
+            if cached_model is not None:
+                try:
+                    # The prompt is already in the cached prefix
+                    parts = [part for part in contents if part != context.prompt]
+                    return send(cached_model, parts)
+                except Exception as e:
+                    if not context.is_stale_error(e):
+                        raise
+                    # Expired or deleted under us: answer inline, re-create next time
+                    context.invalidate()
+            return send(model, contents)
+
+        started = time.perf_counter()
+        try:
+            if scheduler is None:
+                resp = call()
+            else:
+                resp = scheduler.call(
+                    call,
+                    estimated_tokens=self._estimate_tokens(contents),
+                    cancel_flag=cancel_flag,
+                )
+        except Exception:
+            if route is not None:
+                self.router.finished(route, time.perf_counter() - started, failed=True)
+            raise
+        if route is not None:
+            self.router.finished(
+                route,
+                time.perf_counter() - started,
+                getattr(resp, "usage_metadata", None),
+            )
+        if self.report is not None:
+            self.report.record_usage(page_numbers, getattr(resp, "usage_metadata", None))
+        return resp
+
+    def _attempt(
+        self, contents, page_numbers, rows, schema, tier, cancel_flag, **kwargs
+    ):
+        """One validated answer, from `tier` of the router if there is one."""
+        route = self.router.pick(tier) if tier is not None else None
+        resp = self._generate(
+            contents, page_numbers, rows, route=route, cancel_flag=cancel_flag, **kwargs
+        )
+        try:
+            with maybe_span(self.report, "validate"):
+                return route, schema.model_validate_json(resp.text)
+        except ValueError:
+            if route is not None:
+                self.router.judge(route, accepted=False)
+            raise
+
+    def _hedge_delay(self) -> Optional[float]:
+        if not self.hedge_percentile:
+            return None
+        with self._latency_lock:
+            if len(self._latencies) < self.hedge_min_samples:
+                return None
+            latencies = sorted(self._latencies)
+        index = round(self.hedge_percentile / 100 * (len(latencies) - 1))
+        return latencies[min(len(latencies) - 1, index)]
+
+    def _hedged(self, attempt: Callable[[], object], cancel_flag=None):
+        """
+        Runs `attempt`, and a duplicate of it once the first has been out
+        longer than the hedge delay; returns the first result that is not an
+        exception. The slower copy finishes in the background, ignored.
+        """
+        started = time.perf_counter()
+        delay = self._hedge_delay()
+        if delay is None:
+            result = attempt()
+        else:
+            result = self._race(attempt, delay, started, cancel_flag)
+        with self._latency_lock:
+            self._latencies.append(time.perf_counter() - started)
+        return result
+
+    def _race(self, attempt, delay: float, started: float, cancel_flag=None):
+        first = _in_thread(attempt)
+        if wait([first], timeout=delay).done:
+            return first.result()
+
+        if self.report is not None:
+            self.report.record("hedge", time.perf_counter() - started)
+        pending = {first, _in_thread(attempt)}
+        error = None
+        while pending:
+            if cancel_flag is not None and cancel_flag():
+                raise CancelledError("cancelled")
+            done, pending = wait(
+                pending, timeout=self.CANCEL_POLL_SECONDS, return_when=FIRST_COMPLETED
+            )
+            for future in done:
+                if future.exception() is None:
+                    if future is not first and self.report is not None:
+                        self.report.record("hedge_won", time.perf_counter() - started)
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _ask(
+        self,
+        contents: list,
+        page_numbers: List[int],
+        rows: Optional[RowFeed] = None,
+        schema=HangMuc,
+        allow_empty: bool = False,
+        cancel_flag: Optional[Callable[[], bool]] = None,
+        **kwargs,
+    ):
+        """
+        Requests and validates one answer, hedged when `hedge_percentile` is set.
+
+        With a router the request starts at the router's cheapest usable tier;
+        an answer that fails validation or `check_hang_muc` is escalated to
+        the next tier. The last tier's valid answer is kept even if a sanity
+        check still flags it.
+        """
+
+        def ask(tier):
+            return self._hedged(
+                partial(
+                    self._attempt,
+                    contents,
+                    page_numbers,
+                    rows,
+                    schema,
+                    tier,
+                    cancel_flag,
+                    **kwargs,
+                ),
+                cancel_flag,
+            )
+
+        if self.router is None:
+            return ask(None)[1]
+
+        start = self.router.start_tier()
+        tiers = [tier for tier in self.router.tiers if tier >= start]
+        for tier in tiers:
+            last = tier == tiers[-1]
+            try:
+                route, parsed = ask(tier)
+            except ValueError:
+                # No copy of the answer validated
+                if last:
+                    raise
+                self.router.escalated()
+                continue
+
+            answers = parsed.du_lieu if isinstance(parsed, DanhSachCongViec) else [parsed]
+            accepted = all(check_hang_muc(page, allow_empty) is None for page in answers)
+            self.router.judge(route, accepted)
+            if accepted or last:
+                return parsed
+            self.router.escalated()
+
+    def _request_page(
+        self, page: dict, rows: Optional[RowFeed] = None, cancel_flag=None
+    ) -> HangMuc:
+        return self._ask(
+            [self.PROMPT, self._image_part(page)],
+            [page["page_number"]],
+            rows,
+            cancel_flag=cancel_flag,
+        )
+
+    def _extract_page(self, page: dict) -> HangMuc:
+        cache_key, cached = self._cache_lookup(page)
+        if cached is not None:
+            return cached
+
+        parsed = self._request_page(page)
+        self._cache_store(cache_key, parsed)
+        return parsed
+
+    # ---------------------------------------------------------
+    # Tiled page (dense pages cut into overlapping bands)
+    # ---------------------------------------------------------
+    def _tile_prompt(self, tile: dict) -> str:
+        return self.TILE_PROMPT.format(
+            index=tile["tile_index"] + 1,
+            count=tile["tile_count"],
+            title_rule="" if tile["tile_index"] == 0 else self.TILE_TITLE_RULE,
+        )
+
+    def _extract_tile(self, tile: dict, cancel_flag=None) -> HangMuc:
+        tile_prompt = self._tile_prompt(tile)
+        cache_key, cached = self._cache_lookup(tile, tile_prompt)
+        if cached is not None:
+            return cached
+
+        # A band below the table may legitimately have no rows
+        parsed = self._ask(
+            [tile_prompt, self.PROMPT, self._image_part(tile)],
+            [tile["page_number"]],
+            allow_empty=True,
+            cancel_flag=cancel_flag,
+        )
+        self._cache_store(cache_key, parsed)
+        return parsed
+
+    def _extract_tiled(
+        self,
+        page: dict,
+        tile_pool: Optional[ThreadPoolExecutor] = None,
+        cancel_flag=None,
+    ) -> HangMuc:
+        """Extracts the tiles of one page concurrently and stitches their rows."""
+        if tile_pool is None:
+            bands = [self._extract_tile(tile, cancel_flag) for tile in page["tiles"]]
+        else:
+            futures = [
+                tile_pool.submit(self._extract_tile, tile, cancel_flag)
+                for tile in page["tiles"]
+            ]
+            bands = [future.result() for future in futures]
+        with maybe_span(self.report, "stitch"):
+            rows = stitch_rows([band.cong_viec for band in bands])
+        return HangMuc(ten_hang_muc=bands[0].ten_hang_muc, cong_viec=rows)
+
+    # ---------------------------------------------------------
+    # Multi-page (batched) request
+    # ---------------------------------------------------------
+    def _request_batch(
+        self, pages: List[dict], rows: Optional[RowFeed] = None, cancel_flag=None
+    ) -> List[HangMuc]:
+        contents = [self.BATCH_PROMPT.format(count=len(pages)), self.PROMPT]
+        for idx, page in enumerate(pages, start=1):
+            contents.append(f"Image {idx}:")
+            contents.append(self._image_part(page))
+
+        batch = self._ask(
+            contents,
+            [page["page_number"] for page in pages],
+            rows,
+            schema=DanhSachCongViec,
+            cancel_flag=cancel_flag,
+            generation_config={
+                **self.generation_config,
+                "response_schema": DanhSachCongViec,
+            },
+        )
+        if len(batch.du_lieu) != len(pages):
+            raise ValueError(
+                f"Batched response has {len(batch.du_lieu)} pages, expected {len(pages)}"
+            )
+        return batch.du_lieu
+
+    def _extract_unit(
+        self,
+        pages: List[dict],
+        rows: Optional[RowFeed] = None,
+        tile_pool: Optional[ThreadPoolExecutor] = None,
+        cancel_flag: Optional[Callable[[], bool]] = None,
+    ) -> List[Union[HangMuc, Exception]]:
+        """
+        Extracts a run of consecutive pages, sharing one request where possible.
+
+        Returns one entry per page: the parsed HangMuc, or the exception that
+        made that page fail. With `rows`, every page's rows are delivered to
+        it, while streaming where possible. Tiled pages are extracted tile by
+        tile on `tile_pool`. Requests give up once `cancel_flag()` is true.
+        """
+        # "unit": wall time of the whole unit, hedges and escalations included
+        with maybe_span(self.report, "unit"):
+            results = self._extract_unit_pages(pages, rows, tile_pool, cancel_flag)
+        if rows is not None:
+            for page, outcome in zip(pages, results):
+                if isinstance(outcome, Exception):
+                    rows.discard(page["page_number"])
+                else:
+                    rows.finish(page["page_number"], outcome)
+        return results
+
+    def _extract_unit_pages(
+        self, pages, rows, tile_pool, cancel_flag
+    ) -> List[Union[HangMuc, Exception]]:
+        results: List[Union[HangMuc, Exception, None]] = [None] * len(pages)
+        todo = []  # (index, cache_key) of pages that need the model
+
+        for idx, page in enumerate(pages):
+            if "hang_muc" in page:
+                results[idx] = page["hang_muc"]
+                continue
+            if "tiles" in page:
+                try:
+                    results[idx] = self._extract_tiled(page, tile_pool, cancel_flag)
+                except Exception as e:
+                    results[idx] = e
+                continue
+            try:
+                cache_key, cached = self._cache_lookup(page)
+            except Exception as e:
+                results[idx] = e
+                continue
+            if cached is not None:
+                results[idx] = cached
+            else:
+                todo.append((idx, cache_key))
+
+        if len(todo) > 1:
+            try:
+                batch = self._request_batch(
+                    [pages[idx] for idx, _ in todo], rows, cancel_flag
+                )
+                for (idx, cache_key), parsed in zip(todo, batch):
+                    # The per-page answer is keyed like a single-page request so
+                    # later runs hit it regardless of batch size
+                    self._cache_store(cache_key, parsed)
+                    results[idx] = parsed
+                todo = []
+            except Exception:
+                # Fall back to one request per page
+                pass
+
+        for idx, cache_key in todo:
+            try:
+                parsed = self._request_page(pages[idx], rows, cancel_flag)
+                self._cache_store(cache_key, parsed)
+                results[idx] = parsed
+            except Exception as e:
+                results[idx] = e
+        return results
+
+    @staticmethod
+    def _journal_outcomes(journal: JobJournal, page_numbers: List[int], future: Future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        for page_number, outcome in zip(page_numbers, future.result()):
+            if not isinstance(outcome, Exception):
+                journal.append(page_number, outcome)
 
     # ---------------------------------------------------------
     # Main extraction logic with progress + cancellation
@@ -89,57 +667,256 @@ class GeminiModel:
         to_page: int,
         cancel_flag: Callable[[], bool],
         progress_callback: Optional[Callable[[str], None]] = None,
+        max_concurrency: int = 1,
+        text_layer_first: bool = False,
+        image_options: Optional[ImageOptions] = None,
+        batch_size: int = 1,
+        journal: Optional[JobJournal] = None,
+        pages: Optional[List[int]] = None,
+        row_callback: Optional[Callable[[int, CongViec], None]] = None,
+        page_callback: Optional[Callable[[int, PageRows], None]] = None,
+        local_engines: Optional[List[ExtractionEngine]] = None,
+        escalate: bool = True,
+        row_reset_callback: Optional[Callable[[int], None]] = None,
     ):
-        pdf_handler = PDFHandler(pdf_path)
-        pdf_pages = pdf_handler.extract_pdf_pages_as_images(
-            from_page=from_page, to_page=to_page
+        """
+        Sends each page to Gemini and returns the pages in document order as a
+        RowStore (iterating it yields HangMuc-like PageRows).
+
+        With `text_layer_first`, born-digital pages are read from the PDF text
+        layer instead and only pages it cannot handle confidently go to Gemini.
+        `local_engines` (e.g. LocalOcrEngine) are tried next, in order; with
+        `escalate=False` pages no local engine can read fail instead of being
+        sent to Gemini.
+        `image_options` controls cropping, colour, zoom, encoding and tiling of
+        the page images sent to the model; tiles of a dense page are extracted
+        concurrently and their rows stitched back together.
+
+        Pages are rendered lazily and up to `max_concurrency` requests are in
+        flight at once; results are collected from the head of the window so the
+        output keeps document order. Every model call has `request_timeout` as
+        its deadline, and `cancel_flag` is polled while waiting, so a cancel
+        returns within a fraction of a second; requests still on the wire are
+        abandoned (a streamed one stops at its next chunk). With `batch_size` > 1, that many consecutive
+        pages share one request, and pages of a failed batch are retried alone.
+
+        With a `journal`, pages it already holds are not extracted again and every
+        new page result is appended to it as soon as its request completes.
+
+        `pages` (e.g. from `detect_boq_pages`) limits extraction to those page
+        numbers; from_page/to_page are then ignored.
+
+        `row_callback(page_number, row)` receives rows as soon as they are known,
+        in completion order (mid-response when the model streams). Rows streamed
+        from an answer that is then thrown away (failed validation, a retry, an
+        escalation, a losing hedge) are taken back with
+        `row_reset_callback(page_number)`, after which the page's accepted rows
+        are delivered again. Both are called from worker threads.
+        `page_callback(page_number, hang_muc)` receives finished pages in
+        document order, e.g. to feed a StreamingExcelWriter. It is called on
+        the calling thread, during the ordered reassembly.
+        """
+        pdf_handler = PDFHandler(
+            pdf_path, image_options=image_options or ImageOptions(), report=self.report
+        )
+        if self.report is not None:
+            self.report.pages_total += (
+                len(pages) if pages is not None else to_page - from_page + 1
+            )
+
+        engines = list(local_engines or [])
+        if text_layer_first:
+            engines.insert(0, TextLayerExtractor())
+        for engine in list(engines):
+            try:
+                engine.prepare(
+                    pdf_path,
+                    pages if pages is not None else range(from_page, to_page + 1),
+                    cancel_flag,
+                )
+            except Exception as e:
+                # e.g. OCR tools not installed: carry on without this engine
+                engines.remove(engine)
+                if progress_callback:
+                    progress_callback(f"Local engine '{engine.name}' unavailable: {e}")
+
+        def local_extractor(page):
+            # Pages finished by an earlier run come straight from the journal
+            if journal is not None:
+                done = journal.get(page.number + 1)
+                if done is not None:
+                    return done
+            for engine in engines:
+                with maybe_span(self.report, f"engine_{engine.name}"):
+                    result = engine.extract_page(page)
+                if result is not None:
+                    return result
+            return None
+
+        # Pages are rendered on demand, so at most the in-flight window is in memory
+        pdf_pages = pdf_handler.iter_pdf_pages_as_images(
+            from_page=from_page,
+            to_page=to_page,
+            local_extractor=local_extractor if journal is not None or engines else None,
+            page_numbers=pages,
+        )
+
+        max_concurrency = max(1, max_concurrency)
+        batch_size = max(1, batch_size)
+        executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        tiles = (image_options or ImageOptions()).tiles
+        # Tile requests run on their own pool so page workers can wait on them
+        tile_pool = (
+            ThreadPoolExecutor(max_workers=max_concurrency * tiles) if tiles > 1 else None
         )
+        in_flight = deque()  # (page_numbers, future) in page order
 
-        responses = []
+        responses = RowStore()
         is_cancelled = False  # Track if a cancellation occurred
+        rows = RowFeed(row_callback, row_reset_callback) if row_callback else None
+        all_sent = False  # every page has been handed to a worker
 
-        for page in pdf_pages:
-            page_number = page["page_number"]
+        def fill_window():
+            nonlocal all_sent
+            while len(in_flight) < max_concurrency:
+                unit = list(islice(pdf_pages, batch_size))
+                if not unit:
+                    all_sent = True
+                    return
+                page_numbers = [page["page_number"] for page in unit]
 
-            # Send progress to UI
-            if progress_callback:
-                progress_callback(f"Extracting page {page_number}…")
+                # Send progress to UI
+                if progress_callback:
+                    if len(unit) == 1:
+                        message = f"Extracting page {page_numbers[0]}…"
+                    else:
+                        message = f"Extracting pages {page_numbers[0]}–{page_numbers[-1]}…"
+                    if self.report is not None and self.report.pages_done:
+                        # Throughput and ETA ride along: a message of their own
+                        # would be replaced by the next one straight away
+                        message += f" ({self.report.progress_text()})"
+                    progress_callback(message)
+
+                if all("hang_muc" in page for page in unit):
+                    # Already extracted locally, no API call needed
+                    future = Future()
+                    future.set_result([page["hang_muc"] for page in unit])
+                    if rows is not None:
+                        for page in unit:
+                            rows.finish(page["page_number"], page["hang_muc"])
+                elif not escalate:
+                    future = Future()
+                    future.set_result(
+                        [
+                            page["hang_muc"]
+                            if "hang_muc" in page
+                            else LookupError("no local engine could read this page")
+                            for page in unit
+                        ]
+                    )
+                    if rows is not None:
+                        for page in unit:
+                            if "hang_muc" in page:
+                                rows.finish(page["page_number"], page["hang_muc"])
+                else:
+                    future = executor.submit(
+                        self._extract_unit, unit, rows, tile_pool, cancel_flag
+                    )
+                if journal is not None:
+                    # Checkpoint as soon as the request completes, not when the
+                    # ordered reassembly gets to it
+                    future.add_done_callback(
+                        partial(self._journal_outcomes, journal, page_numbers)
+                    )
+                in_flight.append((page_numbers, future))
 
-            # Check cancellation BEFORE starting API call
-            if cancel_flag():
+        def cancelled() -> bool:
+            nonlocal is_cancelled
+            if not is_cancelled and cancel_flag():
                 if progress_callback:
                     progress_callback("Cancelling…")
                 is_cancelled = True
-                break
+            return is_cancelled
 
-            try:
-                resp = self.model_multimodal.generate_content(
-                    [
-                        self.PROMPT,
-                        {"mime_type": "image/png", "data": page["image_bytes"]},
-                    ]
-                )
+        try:
+            finished = False
+            while not finished:
+                # Check cancellation BEFORE starting more API calls
+                if cancelled():
+                    break
 
-                # Check cancellation immediately after API returns
-                if cancel_flag():
-                    if progress_callback:
-                        progress_callback("Cancelling…")
-                    is_cancelled = True
+                fill_window()
+                if not in_flight:
                     break
 
-                parsed = HangMuc.model_validate_json(resp.text)
-                responses.append(parsed)
+                page_numbers, future = in_flight.popleft()
+                # Render the next pages while the head of the window is still on the wire
+                fill_window()
+                # Wait in short slices so Cancel does not wait for a slow request
+                while not future.done() and not cancelled():
+                    wait([future], timeout=self.CANCEL_POLL_SECONDS)
+                if cancelled():
+                    break
+                try:
+                    outcomes = future.result()
+                except Exception as e:
+                    outcomes = [e] * len(page_numbers)
 
-            except Exception as e:
-                if progress_callback:
-                    progress_callback(f"Error on page {page_number}: {e}")
-                continue
+                for page_number, outcome in zip(page_numbers, outcomes):
+                    if self.report is not None:
+                        self.report.page_finished()
+                        if all_sent and progress_callback:
+                            # No "Extracting page" message left to carry the ETA
+                            progress_callback(
+                                f"Waiting for the last pages… ({self.report.progress_text()})"
+                            )
+
+                    if isinstance(outcome, Exception):
+                        if progress_callback:
+                            progress_callback(f"Error on page {page_number}: {outcome}")
+                        continue
 
-            if responses[0].ten_hang_muc == "":
-                break
+                    if journal is not None:
+                        # No-op if the done callback already recorded it
+                        journal.append(page_number, outcome)
+                    page = responses.add(page_number, outcome)
+                    if page_callback:
+                        page_callback(page_number, page)
+
+                    if responses[0].ten_hang_muc == "":
+                        finished = True
+                        break
+        finally:
+            # Drop queued pages; requests already on the wire finish in the background
+            executor.shutdown(wait=False, cancel_futures=True)
+            if tile_pool is not None:
+                tile_pool.shutdown(wait=False, cancel_futures=True)
+            pdf_pages.close()
+            for engine in engines:
+                engine.close()
+            self.close_context_caches()
 
         if progress_callback and not is_cancelled:
-            progress_callback("Finished extraction")
+            for name, stats in self.context_cache_stats().items():
+                if stats["unavailable"]:
+                    progress_callback(
+                        f"Context cache not used for {name}: {stats['unavailable']}"
+                    )
+                if stats["close_error"]:
+                    progress_callback(
+                        f"Could not delete context cache: {stats['close_error']}"
+                    )
+            if pdf_handler.bytes_baseline:
+                progress_callback(pdf_handler.savings_text())
+            if self.cache is not None:
+                stats = self.cache.stats()
+                invalid = f", {stats['invalid']} invalid" if stats["invalid"] else ""
+                progress_callback(
+                    f"Finished extraction (cache: {stats['hits']} hits, "
+                    f"{stats['misses']} misses{invalid})"
+                )
+            else:
+                progress_callback("Finished extraction")
 
         print(responses)
         return responses
@@ -0,0 +1,252 @@
+import threading
+from dataclasses import dataclass, field, replace
+from typing import Callable, Dict, List, Optional
+
+from ai.models import HangMuc
+from ai.request_scheduler import RequestScheduler
+from services.number_format import NumberNormalizer
+
+# USD per million (input, output) tokens, paid-tier list prices
+PRICES = {
+    "gemini-2.5-flash-lite": (0.10, 0.40),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-pro": (1.25, 10.00),
+}
+
+# Cheap model first, the default model when its answer does not hold up
+DEFAULT_CASCADE = ["gemini-2.5-flash-lite", "gemini-2.5-flash"]
+
+
+def split_keys(text: str) -> List[str]:
+    """API keys from a comma or whitespace separated string."""
+    return [key for key in text.replace(",", " ").split() if key]
+
+
+def check_hang_muc(hang_muc: HangMuc, allow_empty: bool = False) -> Optional[str]:
+    """
+    Local sanity checks on a validated page; returns the problem found or None.
+
+    Catches what lighter models typically get wrong: no table at all, rows
+    dropped from the middle of the table (a forward gap in the STT sequence)
+    and numbered rows whose khối lượng is not a number. Numbering may restart
+    ("1, 2, 3, 1, 2") and section rows ("I", "A") start a new sequence.
+    """
+    rows = hang_muc.cong_viec
+    if not rows:
+        return None if allow_empty else "no rows"
+
+    previous = None
+    for cv in rows:
+        stt = cv.stt.strip()
+        if stt.isdigit():
+            current = int(stt)
+            if previous is not None and current > previous + 1:
+                return f"STT jumps from {previous} to {current}"
+            previous = current
+        elif stt:
+            previous = None
+
+    quantities = [cv.khoi_luong for cv in rows if cv.stt.strip()]
+    _, errors = NumberNormalizer().normalize(quantities)
+    if any(errors):
+        return f"{sum(errors)} unparsable khối lượng"
+    return None
+
+
+# -----------------------------
+# One API key + model
+# -----------------------------
+@dataclass
+class ModelRoute:
+    api_key: str
+    model_name: str
+    tier: int = 0  # cascade position, 0 is tried first
+
+    # Own pacing per key: quotas are per key and model
+    scheduler: Optional[RequestScheduler] = None
+
+    # USD per million tokens; defaults to PRICES
+    input_price: Optional[float] = None
+    output_price: Optional[float] = None
+
+    # genai.GenerativeModel bound to this key, built by ModelRouter.build
+    model: object = field(default=None, repr=False)
+
+    calls: int = 0
+    errors: int = 0
+    rejected: int = 0  # answers that failed validation or sanity checks
+    in_flight: int = 0
+    latency: Optional[float] = None  # smoothed seconds per call, retries included
+    input_tokens: int = 0
+    output_tokens: int = 0
+
+    def __post_init__(self):
+        default_input, default_output = PRICES.get(self.model_name, (0.0, 0.0))
+        if self.input_price is None:
+            self.input_price = default_input
+        if self.output_price is None:
+            self.output_price = default_output
+
+    @property
+    def label(self) -> str:
+        # Never log the key itself
+        return f"{self.model_name}/…{self.api_key[-4:]}"
+
+    @property
+    def cost_usd(self) -> float:
+        return (
+            self.input_tokens * self.input_price + self.output_tokens * self.output_price
+        ) / 1e6
+
+
+# -----------------------------
+# Model cascade + key pool
+# -----------------------------
+@dataclass
+class ModelRouter:
+    """
+    Spreads requests over several API keys and model variants.
+
+    Pages go to the cheapest tier first and are escalated to the next tier
+    only when the answer fails HangMuc validation or `check_hang_muc`. Within
+    a tier each request takes the route with the shortest expected wait
+    (smoothed latency × requests already in flight), so a slow or throttled
+    key sheds load to the others. A tier whose recent rejection rate exceeds
+    `max_rejection_rate` is skipped, apart from every `probe_every`-th page
+    that keeps measuring it.
+    """
+
+    routes: List[ModelRoute]
+    max_rejection_rate: float = 0.5
+    probe_every: int = 10
+    smoothing: float = 0.2
+
+    def __post_init__(self):
+        if not self.routes:
+            raise ValueError("ModelRouter needs at least one route")
+        self.tiers = sorted({route.tier for route in self.routes})
+        self.rejection_rate: Dict[int, float] = {tier: 0.0 for tier in self.tiers}
+        self.escalations = 0
+        self._skipped = {tier: 0 for tier in self.tiers}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_keys(
+        cls,
+        api_keys: List[str],
+        model_names: List[str],
+        scheduler: Optional[RequestScheduler] = None,
+        **kwargs,
+    ) -> "ModelRouter":
+        """
+        One route per key and model; `model_names` is the cascade, cheapest
+        first. Each route gets its own copy of `scheduler`.
+        """
+        routes = [
+            ModelRoute(
+                api_key=key,
+                model_name=name,
+                tier=tier,
+                scheduler=replace(scheduler, stats={}) if scheduler else None,
+            )
+            for tier, name in enumerate(model_names)
+            for key in api_keys
+        ]
+        return cls(routes, **kwargs)
+
+    def build(self, make_model: Callable[[str, str], object]):
+        """Creates the model of every route that has none, as make_model(name, key)."""
+        for route in self.routes:
+            if route.model is None:
+                route.model = make_model(route.model_name, route.api_key)
+
+    def signature(self) -> str:
+        """The cascade's model names, e.g. for cache keys."""
+        routes = sorted(self.routes, key=lambda route: route.tier)
+        return ">".join(dict.fromkeys(route.model_name for route in routes))
+
+    # ---------------------------------------------------------
+    # Routing
+    # ---------------------------------------------------------
+    def start_tier(self) -> int:
+        """First tier worth trying for the next request."""
+        with self._lock:
+            for tier in self.tiers[:-1]:
+                if self.rejection_rate[tier] <= self.max_rejection_rate:
+                    return tier
+                self._skipped[tier] += 1
+                if self._skipped[tier] % self.probe_every == 0:
+                    return tier
+            return self.tiers[-1]
+
+    def pick(self, tier: int) -> ModelRoute:
+        with self._lock:
+            route = min(
+                (route for route in self.routes if route.tier == tier),
+                key=lambda r: (
+                    (r.latency or 0.0) * (r.in_flight + 1),
+                    r.in_flight,
+                    r.calls,
+                ),
+            )
+            route.in_flight += 1
+            return route
+
+    def finished(self, route: ModelRoute, seconds: float, usage=None, failed: bool = False):
+        """Records one call made through `pick`."""
+        with self._lock:
+            route.in_flight -= 1
+            route.calls += 1
+            if failed:
+                route.errors += 1
+            if route.latency is None:
+                route.latency = seconds
+            else:
+                route.latency += self.smoothing * (seconds - route.latency)
+            route.input_tokens += getattr(usage, "prompt_token_count", 0) or 0
+            route.output_tokens += getattr(usage, "candidates_token_count", 0) or 0
+
+    def judge(self, route: ModelRoute, accepted: bool):
+        """Records whether the route's answer passed validation and sanity checks."""
+        with self._lock:
+            rate = self.rejection_rate[route.tier]
+            self.rejection_rate[route.tier] = rate + self.smoothing * (
+                (0.0 if accepted else 1.0) - rate
+            )
+            if not accepted:
+                route.rejected += 1
+
+    def escalated(self):
+        with self._lock:
+            self.escalations += 1
+
+    def scheduler_stats(self) -> Dict[str, int]:
+        """Request scheduler counters summed over the routes' own schedulers."""
+        totals: Dict[str, int] = {}
+        schedulers = {id(route.scheduler): route.scheduler for route in self.routes}
+        for scheduler in schedulers.values():
+            if scheduler is not None:
+                for key, value in scheduler.stats.items():
+                    totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "escalations": self.escalations,
+                "cost_usd": round(sum(route.cost_usd for route in self.routes), 6),
+                "routes": {
+                    route.label: {
+                        "tier": route.tier,
+                        "calls": route.calls,
+                        "errors": route.errors,
+                        "rejected": route.rejected,
+                        "latency_seconds": round(route.latency or 0.0, 3),
+                        "input_tokens": route.input_tokens,
+                        "output_tokens": route.output_tokens,
+                        "cost_usd": round(route.cost_usd, 6),
+                        "scheduler": dict(route.scheduler.stats) if route.scheduler else None,
+                    }
+                    for route in self.routes
+                },
+            }
@@ -0,0 +1,22 @@
+from typing import List
+
+from pydantic import BaseModel
+
+
+# -----------------------------
+# Pydantic Models
+# -----------------------------
+class CongViec(BaseModel):
+    stt: str
+    noi_dung_cong_viec: str
+    don_vi: str
+    khoi_luong: str
+
+
+class HangMuc(BaseModel):
+    ten_hang_muc: str
+    cong_viec: List[CongViec]
+
+
+class DanhSachCongViec(BaseModel):
+    du_lieu: List[HangMuc]
@@ -0,0 +1,173 @@
+import bisect
+import hashlib
+import importlib.util
+import os
+import pathlib
+import subprocess
+import sys
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, List, Optional, Tuple
+
+import fitz
+
+from ai.models import HangMuc
+from ai.text_layer_extractor import TextLayerExtractor, _clean, _map_columns
+from services.job_journal import file_sha256
+from services.page_triage import find_raster_rules
+
+DEFAULT_OCR_DIR = pathlib.Path.home() / ".pdf2excel" / "ocr"
+
+
+def _page_spec(page_numbers: List[int]) -> str:
+    """[1, 2, 3, 7] -> "1-3,7", the page syntax ocrmypdf expects."""
+    spans = []
+    for number in sorted(set(page_numbers)):
+        if spans and number == spans[-1][1] + 1:
+            spans[-1][1] = number
+        else:
+            spans.append([number, number])
+    return ",".join(f"{a}-{b}" if a != b else str(a) for a, b in spans)
+
+
+def _cells_from_words(
+    words, rows_y: List[float], columns_x: List[float]
+) -> List[List[str]]:
+    """Drops each OCR word into the grid cell its centre falls in."""
+    grid = [[[] for _ in columns_x[1:]] for _ in rows_y[1:]]
+    for x0, y0, x1, y1, text, *_ in words:
+        cx, cy = (x0 + x1) / 2, (y0 + y1) / 2
+        row = bisect.bisect(rows_y, cy) - 1
+        col = bisect.bisect(columns_x, cx) - 1
+        if 0 <= row < len(grid) and 0 <= col < len(grid[0]):
+            grid[row][col].append((round(y0), x0, text))
+    # Reading order inside a cell: line by line, left to right
+    return [[_clean(" ".join(w[2] for w in sorted(cell))) for cell in row] for row in grid]
+
+
+# -----------------------------
+# Local OCR extraction engine
+# -----------------------------
+@dataclass
+class LocalOcrEngine(TextLayerExtractor):
+    """
+    Reads scanned BOQ pages offline with ocrmypdf/Tesseract.
+
+    `prepare` OCRs the requested scanned pages once, in `jobs` worker processes,
+    into a cached copy of the PDF that carries an invisible text layer. It
+    runs ocrmypdf as a child process so a cancelled run stops it. Each
+    page's table grid is then found from the ruling lines in its image, the
+    OCR words are dropped into the cells, and the header row is mapped to
+    CongViec fields the same way as for digital PDFs. Pages without a clear
+    grid, header or title, or with unparsable quantities, return None and go
+    to Gemini instead.
+    """
+
+    language: str = "vie+eng"
+    jobs: Optional[int] = None  # OCR processes; None uses every CPU
+    ocr_dir: Optional[str] = None
+    rule_zoom: float = 2.0
+    poll_seconds: float = 0.25  # how often a running OCR checks cancel_flag
+
+    name = "ocr"
+    _document: Optional[fitz.Document] = field(default=None, repr=False)
+
+    def _ocr_path(self, pdf_path: str, pages: str) -> pathlib.Path:
+        digest = hashlib.sha256(
+            f"{file_sha256(pdf_path)}|{pages}|{self.language}".encode()
+        ).hexdigest()
+        return pathlib.Path(self.ocr_dir or DEFAULT_OCR_DIR) / f"{digest[:32]}.pdf"
+
+    def _run_ocr(
+        self, pdf_path: str, output: pathlib.Path, pages: str, cancel_flag=None
+    ) -> bool:
+        """OCRs `pages` into `output`; False if cancel_flag stopped it first."""
+        command = [sys.executable, "-m", "ocrmypdf", "--quiet", "--skip-text"]
+        command += ["--language", self.language, "--pages", pages]
+        command += ["--output-type", "pdf", "--optimize", "0"]
+        if self.jobs:
+            command += ["--jobs", str(self.jobs)]
+        tmp = output.with_suffix(f".{os.getpid()}.tmp")
+        process = subprocess.Popen(
+            command + [pdf_path, str(tmp)],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        try:
+            while True:
+                try:
+                    _, stderr = process.communicate(timeout=self.poll_seconds)
+                    break
+                except subprocess.TimeoutExpired:
+                    if cancel_flag is not None and cancel_flag():
+                        process.terminate()
+                        process.wait()
+                        return False
+            if process.returncode != 0:
+                lines = stderr.strip().splitlines() or [f"exit code {process.returncode}"]
+                raise RuntimeError(f"ocrmypdf failed: {lines[-1]}")
+            os.replace(tmp, output)
+            return True
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            tmp.unlink(missing_ok=True)
+
+    def prepare(
+        self,
+        pdf_path: str,
+        page_numbers: Iterable[int],
+        cancel_flag: Optional[Callable[[], bool]] = None,
+    ) -> None:
+        # Optional: needs the Tesseract binary and language data as well
+        if importlib.util.find_spec("ocrmypdf") is None:
+            raise ImportError("ocrmypdf is not installed (pip install ocrmypdf)")
+
+        page_numbers = list(page_numbers)
+        with fitz.open(pdf_path) as document:
+            scanned = [
+                n
+                for n in page_numbers
+                if len(document.load_page(n - 1).get_text().strip()) < self.min_text_chars
+            ]
+        self.close()
+        if not scanned or (cancel_flag is not None and cancel_flag()):
+            return
+
+        pages = _page_spec(scanned)
+        output = self._ocr_path(pdf_path, pages)
+        if not output.exists():
+            output.parent.mkdir(parents=True, exist_ok=True)
+            if not self._run_ocr(pdf_path, output, pages, cancel_flag):
+                return
+        self._document = fitz.open(output)
+
+    def close(self) -> None:
+        if self._document is not None:
+            self._document.close()
+            self._document = None
+
+    def score_page(self, page: fitz.Page) -> Tuple[Optional[HangMuc], float]:
+        # Digital pages are the text-layer engine's job
+        if self._document is None or len(page.get_text().strip()) >= self.min_text_chars:
+            return None, 0.0
+
+        ocr_page = self._document.load_page(page.number)
+        rows_y, columns_x = find_raster_rules(page, self.rule_zoom)
+        if len(rows_y) < 3 or len(columns_x) < 3:
+            return None, 0.0
+
+        rows = _cells_from_words(ocr_page.get_text("words"), rows_y, columns_x)
+        mapping, first_data_row = _map_columns(rows)
+        if mapping is None:
+            return None, 0.0
+        cong_viec = self._rows_to_cong_viec(rows[first_data_row:], mapping)
+        if not cong_viec:
+            return None, 0.0
+
+        ten_hang_muc = self._find_title(ocr_page, rows_y[0])
+        if ten_hang_muc is None:
+            return None, 0.0
+        hang_muc = HangMuc(ten_hang_muc=ten_hang_muc, cong_viec=cong_viec)
+        return hang_muc, self._confidence(cong_viec)
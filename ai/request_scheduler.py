@@ -0,0 +1,231 @@
+import random
+import threading
+import time
+from concurrent.futures import CancelledError
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional
+
+# HTTP-ish status codes worth retrying: throttling and transient server errors
+RETRYABLE_CODES = {429, 500, 502, 503, 504}
+THROTTLE_CODES = {429}
+RETRYABLE_MARKERS = (
+    "429",
+    "resource exhausted",
+    "resource_exhausted",
+    "quota",
+    "rate limit",
+    "unavailable",
+    "deadline exceeded",
+    "internal error",
+)
+
+
+def _error_code(exc: Exception) -> Optional[int]:
+    # google.api_core exceptions carry .code (an int, or an HTTPStatus)
+    code = getattr(exc, "code", None)
+    try:
+        return int(code) if code is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def is_throttle_error(exc: Exception) -> bool:
+    code = _error_code(exc)
+    if code is not None:
+        return code in THROTTLE_CODES
+    text = str(exc).lower()
+    return any(marker in text for marker in ("429", "quota", "rate limit", "exhausted"))
+
+
+def is_retryable_error(exc: Exception) -> bool:
+    code = _error_code(exc)
+    if code is not None:
+        return code in RETRYABLE_CODES
+    text = str(exc).lower()
+    return any(marker in text for marker in RETRYABLE_MARKERS)
+
+
+# -----------------------------
+# Token bucket
+# -----------------------------
+class TokenBucket:
+    """
+    Classic token bucket refilled continuously at `per_minute` / 60 per second.
+
+    `adjust` lets callers settle an estimate against the real cost afterwards;
+    the balance may go negative, which simply delays the next acquire.
+    """
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(
+        self, amount: float = 1.0, cancel_flag: Optional[Callable[[], bool]] = None
+    ):
+        # Requests bigger than the bucket would never fit; let them drain it
+        amount = min(amount, self.capacity)
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            if cancel_flag and cancel_flag():
+                raise CancelledError("cancelled")
+            time.sleep(min(wait, 0.1 if cancel_flag else 1.0))
+
+    def adjust(self, delta: float):
+        with self.lock:
+            self._refill()
+            self.tokens -= delta
+
+
+# -----------------------------
+# AIMD concurrency limiter
+# -----------------------------
+class AdaptiveConcurrency:
+    """
+    Additive-increase / multiplicative-decrease limit on in-flight requests.
+
+    Each healthy response grows the limit by 1/limit (about +1 per round trip of
+    the whole window); a throttled one halves it, at most once per `cooldown`
+    seconds so a burst of 429s from the same window counts as one signal.
+    """
+
+    def __init__(self, initial: int, maximum: int, minimum: int = 1, cooldown: float = 2.0):
+        self.minimum = minimum
+        self.maximum = max(maximum, minimum)
+        self.limit = float(min(max(initial, minimum), self.maximum))
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.last_decrease = 0.0
+        self.condition = threading.Condition()
+
+    def acquire(self, cancel_flag: Optional[Callable[[], bool]] = None):
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                if cancel_flag and cancel_flag():
+                    raise CancelledError("cancelled")
+                self.condition.wait(0.1 if cancel_flag else None)
+            self.in_flight += 1
+
+    def release(self, throttled: bool = False):
+        with self.condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if throttled:
+                if now - self.last_decrease >= self.cooldown:
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self.last_decrease = now
+            else:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self.condition.notify_all()
+
+    def abandon(self):
+        """Releases a slot without a signal: the request was cancelled or failed."""
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+
+# -----------------------------
+# Request scheduler
+# -----------------------------
+@dataclass
+class RequestScheduler:
+    """
+    Sits in front of `generate_content`: paces calls to the RPM/TPM quota, adapts
+    concurrency to throttling and retries retryable errors with exponential
+    backoff and full jitter instead of dropping the page.
+    """
+
+    requests_per_minute: Optional[float] = None
+    tokens_per_minute: Optional[float] = None
+    max_concurrency: int = 8
+    initial_concurrency: int = 2
+    max_retries: int = 8
+    base_delay: float = 1.0
+    max_delay: float = 60.0
+
+    stats: Dict[str, int] = field(default_factory=dict)
+
+    def __post_init__(self):
+        self.concurrency = AdaptiveConcurrency(self.initial_concurrency, self.max_concurrency)
+        self.request_bucket = (
+            TokenBucket(self.requests_per_minute) if self.requests_per_minute else None
+        )
+        self.token_bucket = (
+            TokenBucket(self.tokens_per_minute) if self.tokens_per_minute else None
+        )
+        self.stats.update(calls=0, retries=0, throttled=0, failed=0)
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def backoff_delay(self, attempt: int) -> float:
+        # Full jitter: uniform in [0, min(max_delay, base * 2^attempt)]
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    def call(
+        self,
+        fn: Callable[[], object],
+        estimated_tokens: int = 0,
+        cancel_flag: Optional[Callable[[], bool]] = None,
+    ):
+        attempt = 0
+        while True:
+            self.concurrency.acquire(cancel_flag)
+            try:
+                if self.request_bucket:
+                    self.request_bucket.acquire(1, cancel_flag)
+                if self.token_bucket and estimated_tokens:
+                    self.token_bucket.acquire(estimated_tokens, cancel_flag)
+            except CancelledError:
+                self.concurrency.abandon()
+                raise
+
+            self._count("calls")
+            try:
+                result = fn()
+            except Exception as e:
+                throttled = is_throttle_error(e)
+                if throttled:
+                    self.concurrency.release(throttled=True)
+                    self._count("throttled")
+                else:
+                    # Only a healthy response is a reason to grow the window
+                    self.concurrency.abandon()
+
+                if not is_retryable_error(e) or attempt >= self.max_retries:
+                    self._count("failed")
+                    raise
+
+                self._count("retries")
+                deadline = time.monotonic() + self.backoff_delay(attempt)
+                while time.monotonic() < deadline:
+                    if cancel_flag and cancel_flag():
+                        raise
+                    time.sleep(min(0.1, max(0.0, deadline - time.monotonic())))
+                attempt += 1
+                continue
+
+            self.concurrency.release(throttled=False)
+
+            # Settle the token estimate against what the API actually billed
+            usage = getattr(result, "usage_metadata", None)
+            actual = getattr(usage, "total_token_count", None)
+            if self.token_bucket and actual:
+                self.token_bucket.adjust(actual - estimated_tokens)
+            return result
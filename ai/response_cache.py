@@ -0,0 +1,152 @@
+import hashlib
+import os
+import pathlib
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+DEFAULT_CACHE_DIR = pathlib.Path.home() / ".pdf2excel" / "response_cache"
+
+
+# -----------------------------
+# Content-addressed response cache
+# -----------------------------
+@dataclass
+class ResponseCache:
+    """
+    Persistent cache of validated page responses, stored as one JSON file per key.
+
+    Keys are content hashes (see `make_key`), so a changed page image, prompt or
+    model configuration simply misses. When the directory grows past `max_bytes`
+    the least recently used entries (by file mtime, refreshed on every hit) are
+    deleted.
+    """
+
+    cache_dir: str = str(DEFAULT_CACHE_DIR)
+    max_bytes: int = 256 * 1024 * 1024
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    invalid: int = 0
+
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    _total_bytes: Optional[int] = field(default=None, repr=False)
+
+    def __post_init__(self):
+        self._dir = pathlib.Path(self.cache_dir)
+        self._dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        """Hashes bytes/str parts into a stable hex key."""
+        digest = hashlib.sha256()
+        for part in parts:
+            if isinstance(part, str):
+                part = part.encode("utf-8")
+            digest.update(len(part).to_bytes(8, "little"))
+            digest.update(part)
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> pathlib.Path:
+        return self._dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            text = path.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        # Refresh recency for LRU eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        with self._lock:
+            self.hits += 1
+        return text
+
+    def put(self, key: str, value: str):
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        data = value.encode("utf-8")
+
+        # Write to a temp file first so a crash never leaves a truncated entry
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(data)
+        old_size = path.stat().st_size if path.exists() else 0
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._scan_size()
+            else:
+                self._total_bytes += len(data) - old_size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def invalidate(self, key: str):
+        """Deletes an entry the caller could not use; the lookup counts as a miss."""
+        path = self._path(key)
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except FileNotFoundError:
+            size = 0
+        with self._lock:
+            self.hits -= 1
+            self.misses += 1
+            self.invalid += 1
+            if self._total_bytes is not None:
+                self._total_bytes -= size
+
+    def _entries(self):
+        return [p for p in self._dir.glob("*/*.json") if p.is_file()]
+
+    def _scan_size(self) -> int:
+        return sum(p.stat().st_size for p in self._entries())
+
+    def _evict(self):
+        # Drop oldest entries until we are back under 90% of the budget
+        target = int(self.max_bytes * 0.9)
+        entries = []
+        for p in self._entries():
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, p in entries:
+            if total <= target:
+                break
+            try:
+                p.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.evictions += 1
+        self._total_bytes = total
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalid": self.invalid,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def clear(self):
+        with self._lock:
+            for p in self._entries():
+                p.unlink()
+            self._total_bytes = 0
@@ -0,0 +1,61 @@
+from difflib import SequenceMatcher
+from typing import List
+
+from ai.models import CongViec
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split()).lower()
+
+
+def same_row(a: CongViec, b: CongViec, threshold: float = 0.8) -> bool:
+    """
+    Whether two rows read from overlapping tiles are the same table row.
+
+    Different STTs rule a match out; otherwise the descriptions must be
+    similar, or one must contain the other (a row clipped by a tile edge).
+    """
+    if a.stt and b.stt and a.stt.strip() != b.stt.strip():
+        return False
+    text_a, text_b = _normalize(a.noi_dung_cong_viec), _normalize(b.noi_dung_cong_viec)
+    if not text_a or not text_b:
+        return text_a == text_b and a.khoi_luong == b.khoi_luong
+    if text_a in text_b or text_b in text_a:
+        return True
+    return SequenceMatcher(None, text_a, text_b).ratio() >= threshold
+
+
+def _completeness(row: CongViec) -> int:
+    return sum(
+        len(value.strip())
+        for value in (row.stt, row.noi_dung_cong_viec, row.don_vi, row.khoi_luong)
+    )
+
+
+def stitch_rows(
+    bands: List[List[CongViec]], window: int = 12, threshold: float = 0.8
+) -> List[CongViec]:
+    """
+    Joins the rows of top-to-bottom tiles of one page into a single list.
+
+    Where band k ends and band k+1 begins, the longest run of rows (at most
+    `window`) that ends band k and also starts band k+1 is taken to be the
+    overlap zone and kept once, using whichever copy of each row is more
+    complete.
+    """
+    rows: List[CongViec] = list(bands[0]) if bands else []
+    for band in bands[1:]:
+        overlap = 0
+        for size in range(min(window, len(rows), len(band)), 0, -1):
+            tail = rows[len(rows) - size :]
+            if all(same_row(a, b, threshold) for a, b in zip(tail, band[:size])):
+                overlap = size
+                break
+
+        start = len(rows) - overlap
+        for offset in range(overlap):
+            rows[start + offset] = max(
+                rows[start + offset], band[offset], key=_completeness
+            )
+        rows.extend(band[overlap:])
+    return rows
@@ -0,0 +1,153 @@
+import sys
+from array import array
+from typing import Iterator, List, Tuple, Union
+
+from ai.models import HangMuc
+
+FIELDS = ("stt", "noi_dung_cong_viec", "don_vi", "khoi_luong")
+
+
+class Row:
+    """One BOQ row read back from a RowStore; same attributes as CongViec."""
+
+    __slots__ = FIELDS
+
+    def __init__(
+        self, stt: str, noi_dung_cong_viec: str, don_vi: str, khoi_luong: str
+    ):
+        self.stt = stt
+        self.noi_dung_cong_viec = noi_dung_cong_viec
+        self.don_vi = don_vi
+        self.khoi_luong = khoi_luong
+
+    def __repr__(self):
+        values = ", ".join(repr(getattr(self, name)) for name in FIELDS)
+        return f"Row({values})"
+
+
+class PageRows:
+    """
+    One page of a RowStore. Duck-types HangMuc (`ten_hang_muc`, `cong_viec`)
+    so code written against the pydantic model keeps working; `columns()`
+    is the bulk path the writers use.
+    """
+
+    __slots__ = ("store", "page_number", "ten_hang_muc", "start", "stop")
+
+    def __init__(
+        self, store: "RowStore", page_number: int, ten_hang_muc: str, start: int, stop: int
+    ):
+        self.store = store
+        self.page_number = page_number
+        self.ten_hang_muc = ten_hang_muc
+        self.start = start
+        self.stop = stop
+
+    @property
+    def row_count(self) -> int:
+        return self.stop - self.start
+
+    def columns(self) -> Tuple[List[str], List[str], List[str], List[str]]:
+        """(stt, noi_dung_cong_viec, don_vi, khoi_luong) of this page's rows."""
+        s, e = self.start, self.stop
+        store = self.store
+        return (
+            store.stt[s:e],
+            store.noi_dung_cong_viec[s:e],
+            store.don_vi[s:e],
+            store.khoi_luong[s:e],
+        )
+
+    @property
+    def cong_viec(self) -> List[Row]:
+        return [Row(*values) for values in zip(*self.columns())]
+
+    def to_dict(self) -> dict:
+        """The page as HangMuc-shaped JSON data."""
+        return {
+            "ten_hang_muc": self.ten_hang_muc,
+            "cong_viec": [dict(zip(FIELDS, values)) for values in zip(*self.columns())],
+        }
+
+    def to_hang_muc(self) -> HangMuc:
+        return HangMuc.model_validate(self.to_dict())
+
+    def __repr__(self):
+        return (
+            f"PageRows(page={self.page_number}, ten_hang_muc={self.ten_hang_muc!r}, "
+            f"rows={self.row_count})"
+        )
+
+
+def page_columns(hang_muc: Union[HangMuc, PageRows]) -> Tuple[List[str], ...]:
+    """Column lists of a HangMuc or PageRows page, in FIELDS order."""
+    if isinstance(hang_muc, PageRows):
+        return hang_muc.columns()
+    rows = hang_muc.cong_viec
+    return (
+        [cv.stt for cv in rows],
+        [cv.noi_dung_cong_viec for cv in rows],
+        [cv.don_vi for cv in rows],
+        [cv.khoi_luong for cv in rows],
+    )
+
+
+# -----------------------------
+# Columnar row store
+# -----------------------------
+class RowStore:
+    """
+    Extracted pages held as parallel columns instead of pydantic objects.
+
+    Each row costs four list slots plus its page number in an unsigned int
+    array; STT, units and titles repeat a lot and are interned, so equal
+    values share one string. Pydantic validation happens where data enters
+    (model responses, the journal), `add` then copies the page in and the
+    validated objects can be dropped. Iterating yields PageRows in the order
+    pages were added.
+    """
+
+    def __init__(self):
+        self.stt: List[str] = []
+        self.noi_dung_cong_viec: List[str] = []
+        self.don_vi: List[str] = []
+        self.khoi_luong: List[str] = []
+        self.page_number = array("I")
+        self.pages: List[PageRows] = []
+
+    def add(self, page_number: int, hang_muc: Union[HangMuc, PageRows]) -> PageRows:
+        """Appends one page; a PageRows from another store shares its strings."""
+        stt, noi_dung, don_vi, khoi_luong = page_columns(hang_muc)
+
+        start = len(self.stt)
+        self.stt.extend(map(sys.intern, stt))
+        self.noi_dung_cong_viec.extend(noi_dung)
+        self.don_vi.extend(map(sys.intern, don_vi))
+        self.khoi_luong.extend(khoi_luong)
+        self.page_number.extend([page_number] * (len(self.stt) - start))
+
+        page = PageRows(
+            self, page_number, sys.intern(hang_muc.ten_hang_muc), start, len(self.stt)
+        )
+        self.pages.append(page)
+        return page
+
+    @property
+    def row_count(self) -> int:
+        return len(self.stt)
+
+    def __len__(self) -> int:
+        return len(self.pages)
+
+    def __iter__(self) -> Iterator[PageRows]:
+        return iter(self.pages)
+
+    def __getitem__(self, index: int) -> PageRows:
+        return self.pages[index]
+
+    def __bool__(self) -> bool:
+        return bool(self.pages)
+
+    def __repr__(self):
+        return f"RowStore(pages={len(self.pages)}, rows={self.row_count})"
+
@@ -0,0 +1,155 @@
+import json
+import re
+import threading
+from typing import Callable, Dict, List, Optional
+
+from ai.models import CongViec, HangMuc
+
+# Matches the tail of the buffer right before a row array opens
+_ROWS_KEY = re.compile(r'"cong_viec"\s*:\s*$')
+
+
+# -----------------------------
+# Incremental row parser
+# -----------------------------
+class StreamingRowParser:
+    """
+    Pulls CongViec rows out of a HangMuc (or DanhSachCongViec) JSON response
+    while it is still streaming in.
+
+    Text chunks are scanned once, character by character, tracking string and
+    nesting state; each object inside a "cong_viec" array is validated and
+    handed to `on_row(index, row)` the moment its closing brace arrives.
+    `index` counts the "cong_viec" arrays seen, i.e. the page within a
+    batched response. The full text is still validated as a whole afterwards;
+    this only makes rows visible early.
+    """
+
+    def __init__(self, on_row: Callable[[int, CongViec], None]):
+        self.on_row = on_row
+        self.text = ""  # everything received so far
+        self.pos = 0
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.rows_depth = None  # depth inside the current "cong_viec" array
+        self.row_start = None
+        self.array_index = -1
+
+    def feed(self, chunk: str):
+        if not chunk:
+            return
+        self.text += chunk
+        text = self.text
+        for i in range(self.pos, len(text)):
+            ch = text[i]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch in "[{":
+                self.depth += 1
+                if ch == "[" and self.rows_depth is None and _ROWS_KEY.search(text, max(0, i - 64), i):
+                    self.rows_depth = self.depth
+                    self.array_index += 1
+                elif ch == "{" and self.rows_depth is not None and self.depth == self.rows_depth + 1:
+                    self.row_start = i
+            elif ch in "]}":
+                if ch == "}" and self.row_start is not None and self.depth == self.rows_depth + 1:
+                    self._emit(text[self.row_start : i + 1])
+                    self.row_start = None
+                elif ch == "]" and self.depth == self.rows_depth:
+                    self.rows_depth = None
+                self.depth -= 1
+        self.pos = len(text)
+
+    def _emit(self, raw: str):
+        try:
+            row = CongViec.model_validate(json.loads(raw))
+        except ValueError:
+            # Malformed rows surface when the whole response is validated
+            return
+        self.on_row(self.array_index, row)
+
+
+# -----------------------------
+# Per-page row delivery
+# -----------------------------
+def _row_key(row) -> tuple:
+    return (row.stt, row.noi_dung_cong_viec, row.don_vi, row.khoi_luong)
+
+
+class RowFeed:
+    """
+    Delivers each page's rows to `on_row(page_number, row)` as they arrive.
+
+    A page can be streamed more than once (scheduler retries, a failed batch
+    retried page by page, escalations, hedged duplicates); rows at positions
+    already delivered are not repeated. `finish` settles the page with its
+    final, validated result, which also covers pages served from the cache,
+    text layer or journal: when the rows shown so far are not a prefix of
+    the accepted ones (they came from an answer that was thrown away),
+    `on_reset(page_number)` is called and all accepted rows are delivered
+    again; otherwise only the missing ones follow.
+    """
+
+    def __init__(
+        self,
+        on_row: Callable[[int, CongViec], None],
+        on_reset: Optional[Callable[[int], None]] = None,
+    ):
+        self.on_row = on_row
+        self.on_reset = on_reset
+        self.shown: Dict[int, List[tuple]] = {}
+        self.finished = set()
+        self.lock = threading.Lock()
+
+    def attempt(self, page_numbers: List[int]) -> Callable[[int, CongViec], None]:
+        """Returns the StreamingRowParser callback for one request attempt."""
+        seen: Dict[int, int] = {}
+
+        def forward(index: int, row: CongViec):
+            if index >= len(page_numbers):
+                return
+            page_number = page_numbers[index]
+            seen[page_number] = seen.get(page_number, 0) + 1
+            with self.lock:
+                if page_number in self.finished:
+                    return
+                shown = self.shown.setdefault(page_number, [])
+                if seen[page_number] <= len(shown):
+                    return
+                shown.append(_row_key(row))
+                # Delivered under the lock so a concurrent finish cannot interleave
+                self.on_row(page_number, row)
+
+        return forward
+
+    def finish(self, page_number: int, hang_muc: HangMuc):
+        accepted = hang_muc.cong_viec
+        keys = [_row_key(row) for row in accepted]
+        with self.lock:
+            shown = self.shown.get(page_number, [])
+            self.shown[page_number] = keys
+            # Abandoned attempts (e.g. a hedge that lost) may still be streaming
+            self.finished.add(page_number)
+            if shown == keys[: len(shown)] or self.on_reset is None:
+                rest = accepted[len(shown) :]
+            else:
+                self.on_reset(page_number)
+                rest = accepted
+            for row in rest:
+                self.on_row(page_number, row)
+
+    def discard(self, page_number: int):
+        """Takes back the rows shown for a page that failed after all."""
+        with self.lock:
+            shown = self.shown.pop(page_number, [])
+            self.finished.add(page_number)
+            if shown and self.on_reset is not None:
+                self.on_reset(page_number)
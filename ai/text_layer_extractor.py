@@ -0,0 +1,179 @@
+import re
+import unicodedata
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import fitz
+
+from ai.models import CongViec, HangMuc
+
+# Header keywords (upper-case, accents stripped) for each CongViec field
+HEADER_KEYWORDS = {
+    "stt": ("STT", "SO TT", "TT"),
+    "noi_dung_cong_viec": (
+        "NOI DUNG",
+        "MO TA",
+        "TEN CONG VIEC",
+        "HANG MUC CONG VIEC",
+        "DIEN GIAI",
+    ),
+    "don_vi": ("DON VI", "DVT"),
+    "khoi_luong": ("KHOI LUONG",),
+}
+
+HANG_MUC_LABEL = re.compile(r"^\s*HANG\s*MUC\s*[:\-]?\s*", re.IGNORECASE)
+COLUMN_NUMBER = re.compile(r"^\(?\d{1,2}\)?$")
+QUANTITY = re.compile(r"^[+-]?[\d.,\s]*\d$")
+
+
+def _fold(text: str) -> str:
+    """Upper-cases and strips Vietnamese accents so keywords match reliably."""
+    text = text.replace("đ", "d").replace("Đ", "D")
+    text = unicodedata.normalize("NFD", text)
+    text = "".join(ch for ch in text if unicodedata.category(ch) != "Mn")
+    return " ".join(text.upper().split())
+
+
+def _clean(cell: Optional[str]) -> str:
+    # Stacked/multi-line cell text is joined into a single line
+    return " ".join((cell or "").split())
+
+
+def _match_header(cell: str) -> Optional[str]:
+    folded = _fold(cell)
+    for field, keywords in HEADER_KEYWORDS.items():
+        for keyword in keywords:
+            if folded == keyword or folded.startswith(keyword + " "):
+                return field
+    return None
+
+
+def _map_columns(rows: List[List[str]]) -> Tuple[Optional[Dict[str, int]], int]:
+    """
+    Finds the header row among the first rows of a table.
+    Returns the field -> column index mapping and the index of the first data row.
+    """
+    for row_idx, row in enumerate(rows[:3]):
+        mapping = {}
+        for col_idx, cell in enumerate(row):
+            field = _match_header(_clean(cell))
+            if field and field not in mapping:
+                mapping[field] = col_idx
+        if {"noi_dung_cong_viec", "don_vi", "khoi_luong"} <= mapping.keys():
+            return mapping, row_idx + 1
+    return None, 0
+
+
+# -----------------------------
+# Text-layer extraction engine
+# -----------------------------
+@dataclass
+class TextLayerExtractor:
+    """
+    Rebuilds a page's HangMuc straight from the PDF text layer, without the LLM.
+
+    Only born-digital pages with a ruled table and a recognizable header row are
+    handled; anything else (scans, unlabeled titles, unparsable quantities)
+    returns None so the caller can fall back to Gemini.
+    """
+
+    min_text_chars: int = 40
+    min_confidence: float = 0.9
+
+    name = "text_layer"
+
+    def prepare(self, pdf_path: str, page_numbers: Iterable[int], cancel_flag=None) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def extract_page(self, page: fitz.Page) -> Optional[HangMuc]:
+        hang_muc, confidence = self.score_page(page)
+        if hang_muc is None or confidence < self.min_confidence:
+            return None
+        return hang_muc
+
+    def score_page(self, page: fitz.Page) -> Tuple[Optional[HangMuc], float]:
+        # Scanned pages have no (or only a stray) text layer
+        if len(page.get_text("text").strip()) < self.min_text_chars:
+            return None, 0.0
+
+        tables = [t for t in page.find_tables().tables if t.row_count > 1]
+        tables.sort(key=lambda t: t.bbox[1])
+
+        cong_viec = []
+        table_top = None
+        for table in tables:
+            rows = [[_clean(c) for c in row] for row in table.extract()]
+            mapping, first_data_row = _map_columns(rows)
+            if mapping is None:
+                continue
+            if table_top is None:
+                table_top = table.bbox[1]
+            cong_viec.extend(self._rows_to_cong_viec(rows[first_data_row:], mapping))
+
+        if table_top is None or not cong_viec:
+            return None, 0.0
+
+        ten_hang_muc = self._find_title(page, table_top)
+        if ten_hang_muc is None:
+            return None, 0.0
+
+        hang_muc = HangMuc(ten_hang_muc=ten_hang_muc, cong_viec=cong_viec)
+        return hang_muc, self._confidence(cong_viec)
+
+    @staticmethod
+    def _rows_to_cong_viec(rows, mapping) -> List[CongViec]:
+        def get(row, field):
+            idx = mapping.get(field)
+            return row[idx] if idx is not None and idx < len(row) else ""
+
+        result = []
+        for row in rows:
+            if not any(row):
+                continue
+            # Skip the "(1) (2) (3)…" column-number row under the header
+            if all(COLUMN_NUMBER.match(c) for c in row if c):
+                continue
+            result.append(
+                CongViec(
+                    stt=get(row, "stt"),
+                    noi_dung_cong_viec=get(row, "noi_dung_cong_viec"),
+                    don_vi=get(row, "don_vi"),
+                    khoi_luong=get(row, "khoi_luong"),
+                )
+            )
+        return result
+
+    @staticmethod
+    def _find_title(page: fitz.Page, table_top: float) -> Optional[str]:
+        """
+        Returns the 'HẠNG MỤC' title above the table, "" for a continuation
+        page with nothing above the table, or None when the title is ambiguous.
+        """
+        clip = fitz.Rect(0, 0, page.rect.width, table_top)
+        lines = [ln.strip() for ln in page.get_text("text", clip=clip).splitlines()]
+        lines = [ln for ln in lines if ln]
+        if not lines:
+            return ""
+
+        for line in reversed(lines):
+            if HANG_MUC_LABEL.match(_fold(line)):
+                # Cut the label from the original (accented) text
+                if ":" in line:
+                    return line.split(":", 1)[1].strip()
+                return " ".join(line.split()[2:])
+        return None
+
+    @staticmethod
+    def _confidence(cong_viec: List[CongViec]) -> float:
+        numbered = [cv for cv in cong_viec if cv.stt]
+        if not numbered:
+            return 0.0
+        ok = sum(
+            1
+            for cv in numbered
+            if cv.noi_dung_cong_viec and QUANTITY.match(cv.khoi_luong)
+        )
+        return ok / len(numbered)
@@ -0,0 +1,388 @@
+"""
+Offline performance benchmarks for the extraction pipeline.
+
+Generates a synthetic BOQ PDF, swaps `GeminiModel.model_multimodal` for
+FakeGenerativeModel and times the three heavy steps, each in a fresh process
+so its peak RSS is its own:
+
+    render   PDFHandler.extract_pdf_pages_as_images
+    extract  GeminiModel.extract_info (rendering + fake API + validation)
+    excel    write_data_to_excel, once per backend
+    export   services.export_sinks, once per machine-readable format
+
+With --context-cache, extract runs a second time with the prompt in a fake
+provider-side cache, to compare tokens per page and request latency.
+
+Results are printed and written as JSON for tracking across versions.
+
+Example:
+    python -m benchmarks.run_benchmarks --pages 40 --rows 40 --latency 0.3 \\
+        --concurrency 4 --output bench.json
+"""
+
+import argparse
+import json
+import os
+import pathlib
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+REPO_ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None if unavailable."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _fake_model(params, context_cache=False):
+    from ai.fake_model import FakeGenerativeModel, sample_hang_muc
+    from ai.gemini_caller import GeminiModel
+    from ai.model_router import ModelRouter
+    from ai.request_scheduler import RequestScheduler
+    from services.run_report import RunReport
+
+    def fake(latency_scale=1.0, sloppy_rate=0.0, seed=0):
+        return FakeGenerativeModel(
+            latency=params["latency"] * latency_scale,
+            latency_jitter=params["latency_jitter"],
+            error_rate=params["error_rate"],
+            throttle_rate=params["throttle_rate"],
+            sloppy_rate=sloppy_rate,
+            tail_rate=params["tail_rate"],
+            tail_latency=params["tail_latency"],
+            requests_per_minute=params["rpm"],
+            response=sample_hang_muc(rows=params["rows"]),
+            seed=params["seed"] + seed,
+            time_to_first_token=params["time_to_first_token"],
+            prefill_latency=params["prefill_latency"],
+            system_instruction=GeminiModel.SYSTEM_INSTRUCTION,
+            min_cache_tokens=params["min_cache_tokens"],
+        )
+
+    report = RunReport("benchmark")
+    # Pacing and retries only matter once a quota is simulated
+    scheduler = None
+    if params["rpm"]:
+        scheduler = RequestScheduler(
+            max_concurrency=params["concurrency"], base_delay=0.05, max_delay=1.0
+        )
+    router = None
+    if params["keys"] > 1 or params["cascade"]:
+        models = ["fake-lite", "fake"] if params["cascade"] else ["fake"]
+        keys = [f"benchmark-key-{i}" for i in range(params["keys"])]
+        router = ModelRouter.from_keys(keys, models, scheduler=scheduler)
+    model = GeminiModel(
+        api_key="benchmark",
+        report=report,
+        stream=params["stream"],
+        scheduler=scheduler,
+        router=router,
+        request_timeout=params["request_timeout"],
+        hedge_percentile=params["hedge_percentile"],
+        context_cache=context_cache,
+    )
+    model.model_multimodal = fake()
+    if router is not None:
+        # The lighter model answers in half the time but drops rows now and then
+        for i, route in enumerate(router.routes):
+            lite = route.model_name == "fake-lite"
+            route.model = fake(0.5 if lite else 1.0, params["sloppy_rate"] if lite else 0.0, i)
+    return model, report, router
+
+
+# -----------------------------
+# Benchmarks (each runs in its own process)
+# -----------------------------
+def bench_render(params):
+    from services.pdf_handler import PDFHandler
+
+    started = time.perf_counter()
+    pages = PDFHandler(params["pdf"]).extract_pdf_pages_as_images(1, params["pages"])
+    seconds = time.perf_counter() - started
+    return {
+        "seconds": round(seconds, 3),
+        "pages_per_second": round(len(pages) / seconds, 2),
+        "image_bytes": sum(len(p["image_bytes"]) for p in pages),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def _per_page(tokens: dict, pages: int) -> dict:
+    prompt = tokens["prompt_token_count"]
+    cached = tokens["cached_content_token_count"]
+    return {
+        "prompt": round(prompt / pages, 1),
+        "cached": round(cached / pages, 1),
+        "uncached_prompt": round((prompt - cached) / pages, 1),
+        "output": round(tokens["candidates_token_count"] / pages, 1),
+    }
+
+
+def bench_extract(params, context_cache=False):
+    model, report, router = _fake_model(params, context_cache)
+    errors = []
+
+    def on_progress(msg):
+        if msg.startswith("Error"):
+            errors.append(msg)
+
+    started = time.perf_counter()
+    data = model.extract_info(
+        pdf_path=params["pdf"],
+        from_page=1,
+        to_page=params["pages"],
+        cancel_flag=lambda: False,
+        progress_callback=on_progress,
+        max_concurrency=params["concurrency"],
+        text_layer_first=params["text_layer"],
+        batch_size=params["batch_size"],
+    )
+    seconds = time.perf_counter() - started
+    run = report.to_dict()
+    return {
+        "seconds": round(seconds, 3),
+        "pages_per_second": round(len(data) / seconds, 2),
+        "pages": len(data),
+        "page_errors": len(errors),
+        "api_calls": (
+            sum(route.model.calls for route in router.routes)
+            if router is not None
+            else model.model_multimodal.calls
+        ),
+        "routing": router.stats() if router is not None else None,
+        "stages": run["stages"],
+        "tokens": run["tokens"],
+        "tokens_per_page": _per_page(run["tokens"], max(1, len(data))),
+        "context_cache": model.context_cache_stats() if context_cache else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def _sample_rows(params):
+    from ai.fake_model import sample_hang_muc
+    from ai.row_store import RowStore
+
+    # Held the way extract_info returns it
+    every = max(1, params["title_every"])
+    data = RowStore()
+    for p in range(params["pages"]):
+        title = f"HẠNG MỤC {p // every + 1}" if p % every == 0 else ""
+        data.add(p + 1, sample_hang_muc(params["rows"], title=title))
+    return data
+
+
+def bench_excel(params, backend):
+    from services.excel_handler import write_data_to_excel
+
+    data = _sample_rows(params)
+    output = os.path.join(params["workdir"], f"bench_{backend}.xlsx")
+    started = time.perf_counter()
+    write_data_to_excel(data, output, backend=backend)
+    seconds = time.perf_counter() - started
+    return {
+        "seconds": round(seconds, 3),
+        "pages_per_second": round(len(data) / seconds, 2),
+        "rows": data.row_count,
+        "file_bytes": os.path.getsize(output),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def bench_export(params, fmt):
+    from services.export_sinks import export_data
+
+    data = _sample_rows(params)
+    output = os.path.join(params["workdir"], f"bench.{fmt}")
+    started = time.perf_counter()
+    try:
+        export_data(data, output, fmt)
+    except RuntimeError as e:  # arrow / parquet without pyarrow
+        return {"skipped": str(e)}
+    seconds = time.perf_counter() - started
+    return {
+        "seconds": round(seconds, 3),
+        "pages_per_second": round(len(data) / seconds, 2),
+        "rows": data.row_count,
+        "file_bytes": os.path.getsize(output),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def _isolated(fn, *args):
+    # Spawned (not forked) so the child does not inherit the parent's RSS
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+        return pool.submit(fn, *args).result()
+
+
+def run(params):
+    from benchmarks.synthetic_pdf import make_boq_pdf
+
+    with tempfile.TemporaryDirectory(prefix="pdf2excel-bench-") as workdir:
+        params = dict(params, workdir=workdir, pdf=os.path.join(workdir, "boq.pdf"))
+        make_boq_pdf(
+            params["pdf"],
+            pages=params["pages"],
+            rows_per_page=params["rows"],
+            title_every=params["title_every"],
+            seed=params["seed"],
+        )
+
+        results = {}
+        steps = [
+            ("render", bench_render, ()),
+            ("extract", bench_extract, ()),
+            ("excel_openpyxl", bench_excel, ("openpyxl",)),
+            ("excel_xlsxwriter", bench_excel, ("xlsxwriter",)),
+            ("export_csv", bench_export, ("csv",)),
+            ("export_jsonl", bench_export, ("jsonl",)),
+            ("export_parquet", bench_export, ("parquet",)),
+        ]
+        if params["context_cache"]:
+            steps.insert(2, ("extract_context_cache", bench_extract, (True,)))
+        for name, fn, args in steps:
+            print(f"Running {name}…", flush=True)
+            results[name] = _isolated(fn, params, *args)
+
+    params = {k: v for k, v in params.items() if k not in ("workdir", "pdf")}
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "params": params,
+        "results": results,
+    }
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark the extraction pipeline offline.")
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--rows", type=int, default=30, help="Table rows per page")
+    parser.add_argument("--title-every", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.2, help="Fake API latency (s)")
+    parser.add_argument("--latency-jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--tail-rate", type=float, default=0.0, help="Share of fake calls that hang"
+    )
+    parser.add_argument(
+        "--tail-latency", type=float, default=5.0, help="How long a hanging call takes (s)"
+    )
+    parser.add_argument("--request-timeout", type=float, default=None)
+    parser.add_argument("--hedge-percentile", type=float, default=None)
+    parser.add_argument(
+        "--rpm", type=float, default=None, help="Fake per-key quota (requests per minute)"
+    )
+    parser.add_argument("--keys", type=int, default=1, help="Fake API keys to spread over")
+    parser.add_argument(
+        "--cascade", action="store_true", help="Try a faster, sloppier fake model first"
+    )
+    parser.add_argument(
+        "--sloppy-rate",
+        type=float,
+        default=0.1,
+        help="Share of --cascade fast-model answers that drop a row",
+    )
+    parser.add_argument(
+        "--context-cache",
+        action="store_true",
+        help="Also run extract with the prompt in a (fake) context cache and compare",
+    )
+    parser.add_argument(
+        "--prefill-latency",
+        type=float,
+        default=0.0,
+        help="Fake latency per 1000 uncached prompt tokens (s)",
+    )
+    parser.add_argument(
+        "--min-cache-tokens",
+        type=int,
+        default=0,
+        help="Fake minimum cache size; larger prompts fall back to sending inline",
+    )
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--text-layer", action="store_true", help="Try the PDF text layer first")
+    parser.add_argument("--stream", action="store_true", help="Stream fake responses")
+    parser.add_argument(
+        "--time-to-first-token",
+        type=float,
+        default=None,
+        help="Fake streaming delay before the first chunk (default: latency spread evenly)",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Write the results JSON here")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    params = {
+        "pages": args.pages,
+        "rows": args.rows,
+        "title_every": args.title_every,
+        "latency": args.latency,
+        "latency_jitter": args.latency_jitter,
+        "error_rate": args.error_rate,
+        "throttle_rate": args.throttle_rate,
+        "tail_rate": args.tail_rate,
+        "tail_latency": args.tail_latency,
+        "request_timeout": args.request_timeout,
+        "hedge_percentile": args.hedge_percentile,
+        "rpm": args.rpm,
+        "keys": args.keys,
+        "cascade": args.cascade,
+        "sloppy_rate": args.sloppy_rate,
+        "context_cache": args.context_cache,
+        "prefill_latency": args.prefill_latency,
+        "min_cache_tokens": args.min_cache_tokens,
+        "concurrency": args.concurrency,
+        "batch_size": args.batch_size,
+        "text_layer": args.text_layer,
+        "stream": args.stream,
+        "time_to_first_token": args.time_to_first_token,
+        "seed": args.seed,
+    }
+    result = run(params)
+
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"✔ Results written to {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Synthetic BOQ PDFs for benchmarking, generated with PyMuPDF.
+
+Each page carries a ruled table (STT / NỘI DUNG CÔNG VIỆC / ĐƠN VỊ / KHỐI LƯỢNG)
+and, every `title_every` pages, a "HẠNG MỤC:" title above it, so the output
+looks like the scanned tenders the app normally sees.
+
+Example:
+    python -m benchmarks.synthetic_pdf boq.pdf --pages 50 --rows 30
+"""
+
+import argparse
+import random
+import unicodedata
+
+import fitz
+
+HEADER = ("STT", "NỘI DUNG CÔNG VIỆC", "ĐƠN VỊ", "KHỐI LƯỢNG")
+UNITS = ("m3", "m2", "tấn", "100m", "cái", "md")
+WORDS = (
+    "Đào", "đắp", "đất", "bê tông", "cốt thép", "ván khuôn", "móng", "cột",
+    "dầm", "sàn", "tường", "xây", "trát", "lát", "nền", "mác 250", "đá 1x2",
+)
+
+# Table geometry (points)
+COLUMN_X = (40, 80, 380, 450, 555)
+MARGIN_TOP = 50
+TITLE_HEIGHT = 30
+
+
+def _load_font():
+    """
+    A Unicode font so Vietnamese diacritics end up in the text layer; it ships
+    with the optional pymupdf-fonts package. Returns (font, needs_ascii).
+    """
+    try:
+        return fitz.Font("notos"), False
+    except Exception:
+        return fitz.Font("helv"), True
+
+
+def _ascii(text: str) -> str:
+    text = text.replace("đ", "d").replace("Đ", "D")
+    text = unicodedata.normalize("NFD", text)
+    return "".join(ch for ch in text if unicodedata.category(ch) != "Mn")
+
+
+def _row_text(rng: random.Random, page_idx: int, row_idx: int):
+    description = " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 7)))
+    quantity = f"{rng.randint(0, 9999):,}".replace(",", ".") + f",{rng.randint(0, 999):03d}"
+    # Every fifth row is a sub-heading without STT, as in real BOQs
+    stt = "" if row_idx % 5 == 4 else str(row_idx + 1)
+    return stt, f"{description} ({page_idx + 1}.{row_idx + 1})", rng.choice(UNITS), quantity
+
+
+def make_boq_pdf(
+    path: str,
+    pages: int = 20,
+    rows_per_page: int = 30,
+    title_every: int = 5,
+    seed: int = 0,
+) -> str:
+    """Writes a `pages`-page BOQ PDF to `path` and returns the path."""
+    rng = random.Random(seed)
+    font, needs_ascii = _load_font()
+    text = _ascii if needs_ascii else str
+    doc = fitz.open()
+    for page_idx in range(pages):
+        page = doc.new_page(width=595, height=842)  # A4
+        writer = fitz.TextWriter(page.rect)
+        y = MARGIN_TOP
+        if title_every and page_idx % title_every == 0:
+            writer.append(
+                (COLUMN_X[0], y + 14),
+                text(f"HẠNG MỤC: Công trình số {page_idx // title_every + 1}"),
+                font=font,
+                fontsize=12,
+            )
+            y += TITLE_HEIGHT
+
+        # Shrink rows so the table always fits the page
+        row_height = min(18.0, (page.rect.height - y - 40) / (rows_per_page + 1))
+        fontsize = max(4.0, row_height * 0.5)
+        rows = [HEADER] + [_row_text(rng, page_idx, r) for r in range(rows_per_page)]
+        for row_idx, row in enumerate(rows):
+            baseline = y + row_idx * row_height + row_height * 0.7
+            for col_idx, cell in enumerate(row):
+                writer.append(
+                    (COLUMN_X[col_idx] + 3, baseline), text(cell), font=font, fontsize=fontsize
+                )
+        writer.write_text(page)
+
+        bottom = y + len(rows) * row_height
+        shape = page.new_shape()
+        for row_idx in range(len(rows) + 1):
+            line_y = y + row_idx * row_height
+            shape.draw_line((COLUMN_X[0], line_y), (COLUMN_X[-1], line_y))
+        for x in COLUMN_X:
+            shape.draw_line((x, y), (x, bottom))
+        shape.finish(width=0.5)
+        shape.commit()
+
+    doc.save(path, garbage=3, deflate=True)
+    doc.close()
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic BOQ PDF.")
+    parser.add_argument("output")
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--rows", type=int, default=30, help="Table rows per page")
+    parser.add_argument("--title-every", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    make_boq_pdf(args.output, args.pages, args.rows, args.title_every, args.seed)
+    print(f"✔ Wrote {args.pages} pages to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,544 @@
+"""
+Headless batch mode: extract many BOQ PDFs into one workbook each.
+
+Example:
+    python cli.py "tenders/**/*.pdf" --output-dir out --workers 4 --max-requests 8
+"""
+
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import pathlib
+import time
+import traceback
+
+from dotenv import load_dotenv
+
+# Shared across the worker processes, set by _init_worker
+_request_limiter = None
+
+
+def parse_page_range(text):
+    """Parses '5-20' or '7' into (from_page, to_page); None means all pages."""
+    if not text or text == "all":
+        return None
+    start, _, end = text.partition("-")
+    from_page = int(start)
+    to_page = int(end) if end else from_page
+    if from_page < 1 or from_page > to_page:
+        raise argparse.ArgumentTypeError(f"Invalid page range: {text}")
+    return from_page, to_page
+
+
+def parse_export_formats(text):
+    """Parses 'csv,parquet' into a list of export formats."""
+    from services.export_sinks import SINKS
+
+    formats = [fmt.strip().lower() for fmt in text.split(",") if fmt.strip()]
+    for fmt in formats:
+        if fmt not in SINKS or fmt == "xlsx":
+            raise argparse.ArgumentTypeError(f"Unknown export format: {fmt}")
+    return list(dict.fromkeys(formats))
+
+
+def output_stems(pdfs):
+    """
+    Output path (without suffix) per PDF, relative to the output directory.
+
+    Paths mirror the PDFs' folders below their common root, so a/BOQ.pdf and
+    b/BOQ.pdf become a/BOQ and b/BOQ instead of overwriting each other.
+    """
+    absolute = [os.path.abspath(pdf) for pdf in pdfs]
+    root = os.path.commonpath([os.path.dirname(path) for path in absolute])
+    return {
+        pdf: pathlib.Path(os.path.relpath(path, root)).with_suffix("")
+        for pdf, path in zip(pdfs, absolute)
+    }
+
+
+def drop_duplicate_pdfs(pdfs):
+    """
+    Keeps the first of several PDFs with the same content: they would share
+    one checkpoint journal (keyed by content hash) and produce the same
+    workbook. Returns (unique PDFs, {duplicate: PDF it repeats}).
+    """
+    from services.job_journal import file_sha256
+
+    seen, unique, duplicates = {}, [], {}
+    for pdf in pdfs:
+        digest = file_sha256(pdf)
+        if digest in seen:
+            duplicates[pdf] = seen[digest]
+        else:
+            seen[digest] = pdf
+            unique.append(pdf)
+    return unique, duplicates
+
+
+def _init_worker(request_limiter):
+    global _request_limiter
+    _request_limiter = request_limiter
+
+
+def process_pdf(job):
+    """Runs one PDF end to end inside a worker process and returns its summary."""
+    import fitz
+
+    from ai.gemini_caller import GeminiModel
+    from ai.model_router import ModelRouter
+    from ai.ocr_engine import LocalOcrEngine
+    from ai.request_scheduler import RequestScheduler
+    from ai.response_cache import ResponseCache
+    from services.excel_handler import write_data_to_excel
+    from services.export_sinks import ExcelSink, export_data, open_sink
+    from services.job_journal import JobJournal
+    from services.number_format import detect_number_convention
+    from services.page_triage import detect_boq_pages
+    from services.pdf_handler import ImageOptions
+    from services.run_report import RunReport
+
+    summary = {
+        "pdf": job["pdf"],
+        "output": job["output"],
+        "status": "ok",
+        "pages": 0,
+        "hang_muc": 0,
+        "rows": 0,
+        "extract_seconds": 0.0,
+        "excel_seconds": 0.0,
+        "error": None,
+    }
+    started = time.perf_counter()
+    try:
+        page_range = job["pages"]
+        if page_range is None:
+            with fitz.open(job["pdf"]) as document:
+                page_range = (1, document.page_count)
+        from_page, to_page = page_range
+        summary["pages"] = to_page - from_page + 1
+
+        pages = None
+        if job["auto_pages"]:
+            pages = detect_boq_pages(job["pdf"], from_page, to_page)
+            summary["pages"] = len(pages)
+            summary["selected_pages"] = pages
+            if not pages:
+                raise ValueError("No BOQ pages detected")
+
+        journal = JobJournal.for_pdf(job["pdf"], job["journal_dir"])
+        if not job["resume"]:
+            journal.reset()
+        summary["resumed_pages"] = sum(
+            journal.get(page) is not None
+            for page in (pages if pages is not None else range(from_page, to_page + 1))
+        )
+
+        report = RunReport(pathlib.Path(job["pdf"]).stem)
+        scheduler = RequestScheduler(
+            requests_per_minute=job["rpm"],
+            tokens_per_minute=job["tpm"],
+            max_concurrency=job["concurrency"],
+            initial_concurrency=min(2, job["concurrency"]),
+        )
+        router = None
+        if len(job["api_keys"]) > 1 or job["cascade"]:
+            # Each key and model paces itself with its own copy of the scheduler
+            router = ModelRouter.from_keys(
+                job["api_keys"], job["cascade"] or [job["model_name"]], scheduler=scheduler
+            )
+        model = GeminiModel(
+            api_key=job["api_keys"][0],
+            model_name=job["model_name"],
+            cache=ResponseCache(job["cache_dir"]) if job["cache_dir"] else None,
+            request_limiter=_request_limiter,
+            scheduler=scheduler,
+            report=report,
+            stream=job["stream"],
+            router=router,
+            request_timeout=job["request_timeout"],
+            hedge_percentile=job["hedge_percentile"],
+            context_cache=job["context_cache"],
+            context_cache_ttl=job["context_cache_ttl"],
+        )
+        errors = []
+
+        def on_progress(msg):
+            if msg.startswith("Error"):
+                errors.append(msg)
+
+        # Machine-readable copies next to the workbook, e.g. out/boq.parquet
+        output = pathlib.Path(job["output"])
+        exports = {fmt: str(output.with_suffix(f".{fmt}")) for fmt in job["exports"]}
+
+        # With --stream, pages go into the workbook as soon as they are in order
+        # Streamed rows are written before the document is seen, so the number
+        # convention is fixed first: --number-format, or a text layer pre-pass
+        number_convention = job["number_format"]
+        sinks = []
+        if job["stream"]:
+            if number_convention is None:
+                number_convention = detect_number_convention(
+                    job["pdf"], pages or range(from_page, to_page + 1)
+                )
+            summary["number_format"] = number_convention
+            sinks.append(ExcelSink(job["output"], number_convention))
+            sinks.extend(
+                open_sink(path, fmt, number_convention) for fmt, path in exports.items()
+            )
+
+        def on_page(page_number, hang_muc):
+            for sink in sinks:
+                sink.add(hang_muc, page_number)
+
+        try:
+            data = model.extract_info(
+                pdf_path=job["pdf"],
+                from_page=from_page,
+                to_page=to_page,
+                cancel_flag=lambda: False,
+                progress_callback=on_progress,
+                max_concurrency=job["concurrency"],
+                text_layer_first=job["text_layer_first"],
+                batch_size=job["batch_size"],
+                journal=journal,
+                pages=pages,
+                image_options=ImageOptions(tiles=job["tiles"], tile_zoom=job["tile_zoom"]),
+                local_engines=(
+                    [LocalOcrEngine(language=job["ocr_language"], jobs=job["ocr_jobs"])]
+                    if job["ocr"]
+                    else None
+                ),
+                escalate=not job["offline"],
+                page_callback=on_page if sinks else None,
+            )
+            if not data:
+                for sink in sinks:
+                    sink.discard()
+        except Exception:
+            for sink in sinks:
+                sink.discard()
+            raise
+        summary["extract_seconds"] = round(time.perf_counter() - started, 3)
+        summary["page_errors"] = errors
+        summary["scheduler"] = dict(model.scheduler.stats)
+        if router is not None:
+            # Routes pace themselves with their own copies of the scheduler
+            for key, value in router.scheduler_stats().items():
+                summary["scheduler"][key] = summary["scheduler"].get(key, 0) + value
+            summary["routing"] = router.stats()
+        if job["context_cache"]:
+            summary["context_cache"] = model.context_cache_stats()
+        summary["hang_muc"] = sum(1 for hm in data if hm.ten_hang_muc.strip())
+        summary["rows"] = data.row_count
+
+        if not data:
+            raise ValueError("AI extraction returned no pages")
+
+        write_started = time.perf_counter()
+        with report.span("excel_write"):
+            if sinks:
+                for sink in sinks:
+                    sink.close()
+            else:
+                write_data_to_excel(
+                    data,
+                    job["output"],
+                    backend=job["excel_backend"],
+                    number_convention=number_convention,
+                )
+                for fmt, path in exports.items():
+                    export_data(data, path, fmt, number_convention)
+        summary["excel_seconds"] = round(time.perf_counter() - write_started, 3)
+        summary["exports"] = list(exports.values())
+
+        run = report.to_dict()
+        summary["stages"] = run["stages"]
+        summary["tokens"] = run["tokens"]
+        if job["metrics"]:
+            report.write_json(str(output.with_suffix(".report.json")))
+            report.write_prometheus(str(output.with_suffix(".prom")))
+
+        if not errors:
+            journal.reset()
+    except Exception as e:
+        summary["status"] = "failed"
+        summary["error"] = f"{type(e).__name__}: {e}"
+        summary["traceback"] = traceback.format_exc()
+
+    summary["total_seconds"] = round(time.perf_counter() - started, 3)
+    return summary
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Extract BOQ tables from many PDFs into Excel workbooks."
+    )
+    parser.add_argument("inputs", nargs="+", help="PDF files or glob patterns")
+    parser.add_argument("--output-dir", required=True, help="Directory for .xlsx files")
+    parser.add_argument(
+        "--pages",
+        type=parse_page_range,
+        default=None,
+        help="Page range for every PDF, e.g. '3-40' (default: all pages)",
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument(
+        "--max-requests",
+        type=int,
+        default=8,
+        help="Global limit on concurrent API calls across all workers",
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=4, help="In-flight requests per PDF"
+    )
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument(
+        "--rpm", type=float, default=None, help="Requests-per-minute quota (all workers)"
+    )
+    parser.add_argument(
+        "--tpm", type=float, default=None, help="Tokens-per-minute quota (all workers)"
+    )
+    parser.add_argument(
+        "--request-timeout",
+        type=float,
+        default=180.0,
+        help="Deadline per model call in seconds; expired calls are retried",
+    )
+    parser.add_argument(
+        "--hedge-percentile",
+        type=float,
+        default=None,
+        help="Duplicate a request still running after this percentile of recent "
+        "latencies (e.g. 95); the first valid answer wins",
+    )
+    parser.add_argument(
+        "--context-cache",
+        action="store_true",
+        help="Upload the prompt once per PDF as Gemini cached content instead of "
+        "sending it with every page (falls back to inline when refused)",
+    )
+    parser.add_argument(
+        "--context-cache-ttl",
+        type=float,
+        default=3600.0,
+        help="Seconds the cached prompt lives; extended while the run goes on",
+    )
+    parser.add_argument("--text-layer", action="store_true", help="Try the PDF text layer first")
+    parser.add_argument(
+        "--tiles",
+        type=int,
+        default=1,
+        help="Cut dense pages into this many overlapping bands extracted in parallel",
+    )
+    parser.add_argument(
+        "--tile-zoom", type=float, default=None, help="Render zoom for tiles (default: the page zoom)"
+    )
+    parser.add_argument(
+        "--ocr",
+        action="store_true",
+        help="OCR scanned pages locally with ocrmypdf/Tesseract before using Gemini",
+    )
+    parser.add_argument(
+        "--ocr-jobs",
+        type=int,
+        default=None,
+        help="OCR processes per PDF (default: the CPUs divided among the workers)",
+    )
+    parser.add_argument("--ocr-language", default="vie+eng", help="Tesseract languages")
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Never call Gemini; pages the local engines cannot read are reported as errors",
+    )
+    parser.add_argument(
+        "--auto-pages",
+        action="store_true",
+        help="Only extract pages that a local scan finds BOQ tables on",
+    )
+    parser.add_argument("--model", default="gemini-2.5-flash")
+    parser.add_argument(
+        "--cascade",
+        default=None,
+        help="Comma separated models, cheapest first, e.g. "
+        "'gemini-2.5-flash-lite,gemini-2.5-flash'; pages whose answer fails "
+        "validation or sanity checks are retried on the next model",
+    )
+    parser.add_argument(
+        "--api-key",
+        default=None,
+        help="Defaults to $GEMINI_API_KEY; several comma separated keys are used "
+        "side by side, each with its own --rpm/--tpm quota",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=None,
+        help="Response cache directory (default: ~/.pdf2excel/response_cache)",
+    )
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Reuse pages checkpointed by an earlier interrupted run",
+    )
+    parser.add_argument(
+        "--journal-dir",
+        default=None,
+        help="Checkpoint directory (default: ~/.pdf2excel/journals)",
+    )
+    parser.add_argument(
+        "--excel-backend",
+        choices=["xlsxwriter", "openpyxl"],
+        default="xlsxwriter",
+        help="xlsxwriter streams rows in constant memory",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream model responses and write pages to the workbook as they finish "
+        "(always with the xlsxwriter backend)",
+    )
+    parser.add_argument(
+        "--number-format",
+        choices=["auto", "vn", "en"],
+        default="auto",
+        help='Khối lượng number format: vn "1.082,5", en "1,082.5"; auto infers it '
+        "from the document (with --stream, from the PDF text layer)",
+    )
+    parser.add_argument(
+        "--export",
+        type=parse_export_formats,
+        default=[],
+        metavar="FORMATS",
+        help="Also write these formats next to each workbook, comma separated: "
+        "csv, jsonl, arrow, parquet (arrow and parquet need pyarrow)",
+    )
+    parser.add_argument(
+        "--metrics",
+        action="store_true",
+        help="Also write <name>.report.json and Prometheus <name>.prom per PDF",
+    )
+    parser.add_argument(
+        "--summary", default=None, help="Summary JSON path (default: <output-dir>/summary.json)"
+    )
+    return parser
+
+
+def main(argv=None):
+    load_dotenv()
+    args = build_parser().parse_args(argv)
+
+    from ai.model_router import split_keys
+
+    api_keys = split_keys(args.api_key or os.environ.get("GEMINI_API_KEY", ""))
+    if not api_keys:
+        if not args.offline:
+            raise SystemExit("No API key: pass --api-key or set GEMINI_API_KEY")
+        # --offline never calls the API
+        api_keys = [""]
+
+    pdfs = []
+    for pattern in args.inputs:
+        matches = sorted(glob.glob(pattern, recursive=True)) or [pattern]
+        pdfs.extend(p for p in matches if p.lower().endswith(".pdf") and os.path.isfile(p))
+    pdfs = list(dict.fromkeys(pdfs))
+    if not pdfs:
+        raise SystemExit("No PDF files matched")
+
+    pdfs, duplicates = drop_duplicate_pdfs(pdfs)
+    for pdf, original in duplicates.items():
+        print(f"Skipping {pdf}: same content as {original}")
+
+    output_dir = pathlib.Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    stems = output_stems(pdfs)
+    for stem in stems.values():
+        (output_dir / stem).parent.mkdir(parents=True, exist_ok=True)
+
+    if args.no_cache:
+        cache_dir = None
+    else:
+        from ai.response_cache import DEFAULT_CACHE_DIR
+
+        cache_dir = args.cache_dir or str(DEFAULT_CACHE_DIR)
+
+    jobs = [
+        {
+            "pdf": pdf,
+            "output": str(output_dir / f"{stems[pdf]}.xlsx"),
+            "pages": args.pages,
+            "api_keys": api_keys,
+            "model_name": args.model,
+            "cascade": args.cascade.split(",") if args.cascade else None,
+            "request_timeout": args.request_timeout,
+            "hedge_percentile": args.hedge_percentile,
+            "context_cache": args.context_cache,
+            "context_cache_ttl": args.context_cache_ttl,
+            "cache_dir": cache_dir,
+            "concurrency": args.concurrency,
+            "batch_size": args.batch_size,
+            "text_layer_first": args.text_layer,
+            "excel_backend": args.excel_backend,
+            "resume": args.resume,
+            "journal_dir": args.journal_dir,
+            "metrics": args.metrics,
+            "stream": args.stream,
+            "exports": args.export,
+            "number_format": None if args.number_format == "auto" else args.number_format,
+            "auto_pages": args.auto_pages,
+            "tiles": args.tiles,
+            "ocr": args.ocr,
+            "ocr_language": args.ocr_language,
+            "offline": args.offline,
+            "tile_zoom": args.tile_zoom,
+        }
+        for pdf in pdfs
+    ]
+
+    # Each worker process paces itself to its share of the global quota, and
+    # OCRs with its share of the CPUs rather than all of them
+    workers = max(1, min(args.workers, len(jobs)))
+    for job in jobs:
+        job["rpm"] = args.rpm / workers if args.rpm else None
+        job["tpm"] = args.tpm / workers if args.tpm else None
+        job["ocr_jobs"] = args.ocr_jobs or max(1, (os.cpu_count() or 1) // workers)
+
+    started = time.perf_counter()
+    results = []
+    with multiprocessing.Manager() as manager:
+        request_limiter = manager.BoundedSemaphore(max(1, args.max_requests))
+        with multiprocessing.Pool(
+            processes=workers,
+            initializer=_init_worker,
+            initargs=(request_limiter,),
+        ) as pool:
+            for summary in pool.imap_unordered(process_pdf, jobs):
+                results.append(summary)
+                print(
+                    f"[{len(results)}/{len(jobs)}] {summary['status']:6} "
+                    f"{summary['pdf']} ({summary['total_seconds']}s)"
+                )
+
+    results.sort(key=lambda r: r["pdf"])
+    report = {
+        "total_seconds": round(time.perf_counter() - started, 3),
+        "pdfs": len(results),
+        "succeeded": sum(1 for r in results if r["status"] == "ok"),
+        "failed": sum(1 for r in results if r["status"] != "ok"),
+        "pages": sum(r["pages"] for r in results),
+        "rows": sum(r["rows"] for r in results),
+        "tokens": sum(r.get("tokens", {}).get("total_token_count", 0) for r in results),
+        "duplicates": duplicates,
+        "results": results,
+    }
+    summary_path = args.summary or output_dir / "summary.json"
+    with open(summary_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"✔ {report['succeeded']}/{report['pdfs']} PDFs exported, summary: {summary_path}")
+    return 0 if report["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,13 +1,27 @@
+import bisect
+import importlib
+import os
 import pathlib
+import re
 import threading
-from queue import Queue
+import time
+from queue import Empty, Queue
 from tkinter import messagebox
 
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
 
-from ai.gemini_caller import GeminiModel
-from services.excel_handler import write_data_to_excel
+from ai.request_scheduler import RequestScheduler
+from ai.response_cache import ResponseCache
+from services.run_report import RunReport
+
+# The Gemini SDK, pydantic, PyMuPDF and openpyxl take most of a second to
+# import, so they are imported where they are used and preloaded in the
+# background once the window is up
+PRELOAD_MODULES = (
+    "ai.gemini_caller",
+    "services.excel_handler",
+)
 
 
 class BoqExtractorEngine(ttk.Frame):
@@ -25,6 +39,18 @@ class BoqExtractorEngine(ttk.Frame):
         self.api_key_var = ttk.StringVar(value="Input your API key")
         self.lbl_width = 12
 
+        # Page responses are reused across runs of the same PDF
+        self.response_cache = ResponseCache()
+
+        # With a shared job service (services/job_server.py) configured, runs
+        # go there and this window only uploads, watches and downloads
+        self.server_url = os.environ.get("PDF2EXCEL_SERVER")
+        self._saved_remotely = False
+
+        # From/To as last filled in by on_browse (the entries' defaults at
+        # first); only these, never a range the user typed, are replaced
+        self._auto_range = ("1", "1")
+
         # Cancel flag
         self.cancel_requested = False
         self.worker_thread = None
@@ -32,6 +58,11 @@ class BoqExtractorEngine(ttk.Frame):
         # Thread-safe queue for status updates
         self.status_queue = Queue()
 
+        # Rows streamed from the model, (page_number, CongViec); a None row
+        # takes back the rows shown so far for that page
+        self.row_queue = Queue()
+        self.preview_pages = {}
+
         # Build UI
         self._build_option_frame()
         self._build_result_frame()
@@ -46,9 +77,32 @@ class BoqExtractorEngine(ttk.Frame):
         )
         self.progressbar.pack_forget()
 
+        # Live preview of extracted rows
+        self._build_preview()
+
         # Poll queue for status messages
         self.after(100, self.poll_status_queue)
 
+        # Import the heavy modules while the user fills in the form
+        self.warmup_done = threading.Event()
+        self.warmup_seconds = None
+        self.after(100, self._start_warmup)
+
+    # ----------------- Background warm-up -----------------
+    def _start_warmup(self):
+        threading.Thread(target=self._warm_up, daemon=True).start()
+
+    def _warm_up(self):
+        started = time.perf_counter()
+        for name in PRELOAD_MODULES:
+            try:
+                importlib.import_module(name)
+            except Exception as e:
+                # The same import fails again, visibly, when Run is pressed
+                print(f"Preloading {name} failed:", e)
+        self.warmup_seconds = time.perf_counter() - started
+        self.warmup_done.set()
+
     # ----------------- UI Construction -----------------
     def _build_option_frame(self):
         from gui.row_builders import RowBuilder
@@ -62,6 +116,7 @@ class BoqExtractorEngine(ttk.Frame):
         RowBuilder(self).build_input_path_row()
         RowBuilder(self).build_extract_range_row()
         RowBuilder(self).build_output_path_row()
+        RowBuilder(self).build_options_row()
 
     def _build_result_frame(self):
         self.result_lf = ttk.Labelframe(self, padding=15)
@@ -84,6 +139,46 @@ class BoqExtractorEngine(ttk.Frame):
         self.cancel_btn.pack(side=LEFT, padx=5)
         self.cancel_btn.pack_forget()
 
+    def _build_preview(self):
+        columns = ("stt", "noi_dung", "don_vi", "khoi_luong")
+        self.preview = ttk.Treeview(
+            self.result_lf, columns=columns, show="tree headings", height=10
+        )
+        self.preview.heading("#0", text="Page")
+        self.preview.column("#0", width=80, stretch=NO)
+        for column, heading, width in zip(
+            columns,
+            ("STT", "Nội dung công việc", "Đơn vị", "Khối lượng"),
+            (50, 400, 80, 100),
+        ):
+            self.preview.heading(column, text=heading)
+            self.preview.column(column, width=width, stretch=column == "noi_dung")
+        self.preview.pack(fill=BOTH, expand=YES, pady=5)
+
+    def _clear_preview(self):
+        self.preview.delete(*self.preview.get_children())
+        self.preview_pages = {}
+
+    def _show_row(self, page_number, row):
+        parent = self.preview_pages.get(page_number)
+        if row is None:
+            # The rows came from an answer that was thrown away
+            if parent is not None:
+                self.preview.delete(*self.preview.get_children(parent))
+            return
+        if parent is None:
+            # Pages finish out of order; keep the tree in page order
+            index = bisect.bisect(sorted(self.preview_pages), page_number)
+            parent = self.preview.insert(
+                "", index, text=f"Page {page_number}", open=True
+            )
+            self.preview_pages[page_number] = parent
+        self.preview.insert(
+            parent,
+            END,
+            values=(row.stt, row.noi_dung_cong_viec, row.don_vi, row.khoi_luong),
+        )
+
     # ----------------- File Dialogs -----------------
     def on_browse(self):
         from utils.file_dialogs import browse_file
@@ -91,6 +186,19 @@ class BoqExtractorEngine(ttk.Frame):
         path = browse_file()
         if path:
             self.input_path_var.set(path)
+            page_range = (self.from_page_var.get().strip(), self.to_page_var.get().strip())
+            untouched = page_range == self._auto_range or not any(page_range)
+            if self.auto_pages_var.get() and untouched:
+                # Auto-detection scans the whole document by default
+                import fitz
+
+                try:
+                    with fitz.open(path) as document:
+                        self._auto_range = ("1", str(document.page_count))
+                except (RuntimeError, OSError):
+                    return
+                self.from_page_var.set(self._auto_range[0])
+                self.to_page_var.set(self._auto_range[1])
 
     def on_export(self):
         from utils.file_dialogs import save_file
@@ -110,6 +218,9 @@ class BoqExtractorEngine(ttk.Frame):
 
     # ----------------- Threaded AI extraction -----------------
     def extract_info_threaded(self):
+        from services.job_journal import JobJournal
+        from services.pdf_handler import ImageOptions
+
         if not self.input_path_var.get():
             messagebox.showwarning("Warning", "Please load a PDF first.")
             return
@@ -121,54 +232,241 @@ class BoqExtractorEngine(ttk.Frame):
             messagebox.showerror("Error", "Page numbers must be integers.")
             return
 
+        try:
+            concurrency = int(self.concurrency_var.get())
+            batch_size = int(self.batch_size_var.get())
+        except ValueError:
+            messagebox.showerror(
+                "Error", "Parallel requests and batch size must be integers."
+            )
+            return
+
+        if concurrency < 1 or batch_size < 1:
+            messagebox.showerror(
+                "Error", "Parallel requests and batch size must be >= 1."
+            )
+            return
+
         if from_page > to_page:
             messagebox.showerror("Error", "'From page' must be <= 'To page'.")
             return
+        # Pick up pages checkpointed by an earlier, interrupted run
+        if not self.server_url:
+            try:
+                self.journal = JobJournal.for_pdf(self.input_path_var.get())
+            except OSError as e:
+                messagebox.showerror("Error", f"Cannot open PDF: {e}")
+                return
+
+            done = self.journal.completed_pages(from_page, to_page)
+            if done:
+                resume = messagebox.askyesnocancel(
+                    "Resume",
+                    f"{len(done)} of {to_page - from_page + 1} pages were already "
+                    "extracted in a previous run.\n\n"
+                    "Yes: extract only the missing pages\nNo: start over",
+                )
+                if resume is None:
+                    return
+                if not resume:
+                    self.journal.reset()
+
         self._from_page = from_page
         self._to_page = to_page
+        self._concurrency = concurrency
+        self._batch_size = batch_size
+        self._text_layer_first = self.text_layer_var.get()
+        self._auto_pages = self.auto_pages_var.get()
+        self._use_ocr = self.ocr_var.get()
+        self._cascade = self.cascade_var.get()
+        self._pages = None
+        self._image_options = ImageOptions()
+        if self.compact_images_var.get():
+            self._image_options = ImageOptions(
+                grayscale=True,
+                crop_to_table=True,
+                adaptive_zoom=True,
+                image_format="auto",
+            )
+        if self.tiles_var.get():
+            # Three bands at a higher zoom keep each request small but sharp
+            self._image_options.tiles = 3
+            self._image_options.tile_zoom = 3.0
 
+        self._clear_preview()
         self.convert_btn.config(state="disabled")
         self.cancel_btn.config(state="normal")
-        self.progressbar.pack(fill=X, expand=YES)
+        self.progressbar.pack(fill=X, expand=YES, before=self.preview)
         self.progressbar.start(10)
 
+        self._saved_remotely = False
         self.worker_thread = threading.Thread(
-            target=self._run_ai_extraction, daemon=True
+            target=(
+                self._run_remote_extraction if self.server_url else self._run_ai_extraction
+            ),
+            daemon=True,
         )
         self.worker_thread.start()
 
     def _run_ai_extraction(self):
+        self.run_report = RunReport(pathlib.Path(self.input_path_var.get()).stem)
         try:
+            from ai.gemini_caller import GeminiModel
+            from ai.model_router import DEFAULT_CASCADE, ModelRouter, split_keys
+            from ai.ocr_engine import LocalOcrEngine
+            from services.page_triage import detect_boq_pages
+
+            if self._auto_pages:
+                # Only pages with a BOQ table go to the model
+                self._pages = detect_boq_pages(
+                    self.input_path_var.get(),
+                    self._from_page,
+                    self._to_page,
+                    progress_callback=lambda msg: self.status_queue.put(msg),
+                )
+                if not self._pages:
+                    raise ValueError("No BOQ pages found in the selected range")
+                self.status_queue.put(f"Found {len(self._pages)} BOQ pages")
+
+            # Back off on 429s instead of skipping pages
+            scheduler = RequestScheduler(
+                max_concurrency=self._concurrency,
+                initial_concurrency=min(2, self._concurrency),
+            )
+            api_keys = split_keys(self.api_key_var.get()) or [""]
+            router = None
+            if len(api_keys) > 1 or self._cascade:
+                router = ModelRouter.from_keys(
+                    api_keys,
+                    DEFAULT_CASCADE if self._cascade else ["gemini-2.5-flash"],
+                    scheduler=scheduler,
+                )
             model = GeminiModel(
-                api_key=self.api_key_var.get(), model_name="gemini-2.5-flash"
+                api_key=api_keys[0],
+                model_name="gemini-2.5-flash",
+                cache=self.response_cache,
+                scheduler=scheduler,
+                report=self.run_report,
+                stream=True,
+                router=router,
             )
-            self.extracted_data = model.extract_info(
+            model.extract_info(
                 pdf_path=self.input_path_var.get(),
                 from_page=self._from_page,
                 to_page=self._to_page,
                 cancel_flag=lambda: self.cancel_requested,
                 progress_callback=lambda msg: self.status_queue.put(msg),
+                max_concurrency=self._concurrency,
+                text_layer_first=self._text_layer_first,
+                image_options=self._image_options,
+                batch_size=self._batch_size,
+                journal=self.journal,
+                pages=self._pages,
+                local_engines=[LocalOcrEngine()] if self._use_ocr else None,
+                row_callback=lambda page, row: self.row_queue.put((page, row)),
+                row_reset_callback=lambda page: self.row_queue.put((page, None)),
             )
+            if router is not None:
+                stats = router.stats()
+                self.status_queue.put(
+                    f"{stats['escalations']} pages escalated to a stronger model, "
+                    f"≈ ${stats['cost_usd']:.4f}"
+                )
+            # The workbook is built from the checkpoint journal
+            self.extracted_data = [
+                hang_muc
+                for hang_muc in map(self.journal.get, self._expected_pages())
+                if hang_muc is not None
+            ]
         except Exception as e:
             self.extracted_data = None
             print("AI Extraction Error:", e)
+            self.status_queue.put(f"Error: {e}")
+        finally:
+            self.after(0, self._finish_extraction)
+
+    def _run_remote_extraction(self):
+        self.extracted_data = None
+        try:
+            from ai.row_store import Row
+            from services.job_client import JobClient
+
+            client = JobClient(self.server_url)
+            # The service only takes letters, digits, spaces, ".", "-" and "_"
+            stem = pathlib.Path(self.input_path_var.get()).stem
+            name = re.sub(r"[^\w.\- ]", "_", stem)[:100] or "boq"
+            job = client.submit(
+                self.input_path_var.get(),
+                name=name,
+                from_page=self._from_page,
+                to_page=self._to_page,
+                auto_pages=int(self._auto_pages),
+                text_layer=int(self._text_layer_first),
+                concurrency=self._concurrency,
+                batch_size=self._batch_size,
+                tiles=self._image_options.tiles,
+            )
+            self.status_queue.put(f"Queued as job {job['id']} on {self.server_url}")
+
+            cancel_sent = False
+            for event in client.events(job["id"]):
+                if self.cancel_requested and not cancel_sent:
+                    client.cancel(job["id"])
+                    cancel_sent = True
+                if event["type"] == "progress":
+                    self.status_queue.put(event["message"])
+                elif event["type"] == "row":
+                    self.row_queue.put((event["page"], Row(**event["row"])))
+                elif event["type"] == "reset":
+                    self.row_queue.put((event["page"], None))
+                elif event["type"] == "status" and event["status"] == "failed":
+                    raise RuntimeError(event["error"])
+
+            if client.status(job["id"])["status"] == "done":
+                client.download(job["id"], self.output_path_var.get())
+                self._saved_remotely = True
+        except Exception as e:
+            print("Job service error:", e)
+            self.status_queue.put(f"Error: {e}")
         finally:
             self.after(0, self._finish_extraction)
 
     def _finish_extraction(self):
+        from services.excel_handler import write_data_to_excel
+
+        was_cancelled = self.cancel_requested
         self.progressbar.stop()
         self.progressbar.pack_forget()
         self.convert_btn.config(state="normal")
         self.cancel_btn.config(state="disabled")
         self.cancel_requested = False
 
-        if self.extracted_data:
+        if self._saved_remotely:
+            messagebox.showinfo("Success", f"Saved to {self.output_path_var.get()}!")
+        elif self.server_url:
+            if not was_cancelled:
+                messagebox.showerror("Error", "AI extraction failed!")
+        elif self.extracted_data:
             try:
-                write_data_to_excel(self.extracted_data, self.output_path_var.get())
-                messagebox.showinfo(
-                    "Success",
-                    f"Saved to {self.output_path_var.get()}!",
+                with self.run_report.span("excel_write"):
+                    write_data_to_excel(self.extracted_data, self.output_path_var.get())
+                self._save_run_report()
+                missing = sum(
+                    self.journal.get(page) is None for page in self._expected_pages()
                 )
+                if was_cancelled or missing:
+                    # Keep the checkpoint so the next Run can resume
+                    messagebox.showinfo(
+                        "Saved",
+                        f"Saved {len(self.extracted_data)} pages to "
+                        f"{self.output_path_var.get()}. Run again to resume the rest.",
+                    )
+                else:
+                    self.journal.reset()
+                    messagebox.showinfo(
+                        "Success",
+                        f"Saved to {self.output_path_var.get()}!",
+                    )
             except ValueError as ve:
                 # Display the error in a messagebox
                 messagebox.showerror("Error", str(ve))
@@ -176,6 +474,19 @@ class BoqExtractorEngine(ttk.Frame):
         else:
             messagebox.showerror("Error", "AI extraction failed!")
 
+    def _expected_pages(self):
+        if self._pages is not None:
+            return self._pages
+        return range(self._from_page, self._to_page + 1)
+
+    def _save_run_report(self):
+        # Timings and token usage go next to the workbook
+        report_path = pathlib.Path(self.output_path_var.get()).with_suffix(".report.json")
+        try:
+            self.run_report.write_json(str(report_path))
+        except OSError as e:
+            print("Could not write run report:", e)
+
     # ----------------- Status Queue Polling -----------------
     def poll_status_queue(self):
         try:
@@ -184,4 +495,9 @@ class BoqExtractorEngine(ttk.Frame):
                 self.status_label.config(text=msg)
         except:
             pass
+        try:
+            while True:
+                self._show_row(*self.row_queue.get_nowait())
+        except Empty:
+            pass
         self.after(100, self.poll_status_queue)
@@ -14,7 +14,8 @@ class RowBuilder:
         row = ttk.Frame(self.option_lf)
         row.pack(fill=X, expand=YES, pady=10)
 
-        ttk.Label(row, text="API Key:", width=self.lbl_width).pack(
+        # Several comma separated keys are used side by side
+        ttk.Label(row, text="API Key(s):", width=self.lbl_width).pack(
             side=LEFT, padx=(15, 0)
         )
         ttk.Entry(row, textvariable=self.engine.api_key_var).pack(
@@ -55,6 +56,55 @@ class RowBuilder:
         )
         save_btn.pack(side=LEFT, padx=5)
 
+    def build_options_row(self):
+        row = ttk.Frame(self.option_lf)
+        row.pack(fill=X, expand=YES, pady=(10, 0))
+
+        ttk.Label(row, text="Options:", width=self.lbl_width).pack(
+            side=LEFT, padx=(15, 0)
+        )
+        self.engine.text_layer_var = ttk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            row,
+            text="Read digital PDFs locally (skip AI when possible)",
+            variable=self.engine.text_layer_var,
+        ).pack(side=LEFT, padx=5)
+
+        self.engine.compact_images_var = ttk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            row,
+            text="Compact images (crop, grayscale)",
+            variable=self.engine.compact_images_var,
+        ).pack(side=LEFT, padx=5)
+
+        self.engine.tiles_var = ttk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            row,
+            text="Split dense pages into tiles",
+            variable=self.engine.tiles_var,
+        ).pack(side=LEFT, padx=5)
+
+        self.engine.cascade_var = ttk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            row,
+            text="Cheap model first (Flash-Lite → Flash)",
+            variable=self.engine.cascade_var,
+        ).pack(side=LEFT, padx=5)
+
+        self.engine.ocr_var = ttk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            row,
+            text="Local OCR for scans (Tesseract)",
+            variable=self.engine.ocr_var,
+        ).pack(side=LEFT, padx=5)
+
+        self.engine.auto_pages_var = ttk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            row,
+            text="Auto-detect BOQ pages in the range",
+            variable=self.engine.auto_pages_var,
+        ).pack(side=LEFT, padx=5)
+
     def build_extract_range_row(self):
         row = ttk.Frame(self.option_lf)
         row.pack(fill=X, expand=YES, pady=10)
@@ -73,6 +123,18 @@ class RowBuilder:
             side=LEFT, fill=X, expand=YES, padx=5
         )
 
+        ttk.Label(row, text="Parallel:", width=8).pack(side=LEFT, padx=(15, 0))
+        self.engine.concurrency_var = ttk.StringVar(value="4")
+        ttk.Entry(row, textvariable=self.engine.concurrency_var, width=4).pack(
+            side=LEFT, padx=5
+        )
+
+        ttk.Label(row, text="Batch:", width=6).pack(side=LEFT, padx=(15, 0))
+        self.engine.batch_size_var = ttk.StringVar(value="1")
+        ttk.Entry(row, textvariable=self.engine.batch_size_var, width=4).pack(
+            side=LEFT, padx=5
+        )
+
         # ttk.Label(row, text="Start counter:", width=8).pack(side=LEFT, padx=(15, 0))
         # self.engine.counter = ttk.StringVar(value="1")
         # ttk.Entry(row, textvariable=self.engine.counter).pack(
@@ -1,8 +1,49 @@
+import time
+
+STARTED = time.perf_counter()
+
+import json
+import os
+
 import ttkbootstrap as ttk
 
 from gui.boq_engine import BoqExtractorEngine
 
+# Set to 1 to print startup timings and quit once the background preload is
+# done, or to a file path to also write them there as JSON (windowed builds
+# have no console)
+STARTUP_TIMING_ENV = "PDF2EXCEL_STARTUP_TIMING"
+
+
+def measure_startup(app, engine, target):
+    timings = {}
+
+    def window_ready():
+        app.update_idletasks()
+        timings["window_interactive_ms"] = round((time.perf_counter() - STARTED) * 1000)
+        wait_for_warmup()
+
+    def wait_for_warmup():
+        if not engine.warmup_done.is_set():
+            app.after(20, wait_for_warmup)
+            return
+        timings["preload_done_ms"] = round((time.perf_counter() - STARTED) * 1000)
+        timings["preload_imports_ms"] = round(engine.warmup_seconds * 1000)
+        print(
+            f"Window interactive after {timings['window_interactive_ms']} ms, "
+            f"modules preloaded after {timings['preload_done_ms']} ms"
+        )
+        if target != "1":
+            with open(target, "w", encoding="utf-8") as f:
+                json.dump(timings, f, indent=2)
+        app.destroy()
+
+    app.after(0, window_ready)
+
+
 if __name__ == "__main__":
     app = ttk.Window("BOQ Extractor", "journal")
-    BoqExtractorEngine(app)
+    engine = BoqExtractorEngine(app)
+    if os.environ.get(STARTUP_TIMING_ENV):
+        measure_startup(app, engine, os.environ[STARTUP_TIMING_ENV])
     app.mainloop()
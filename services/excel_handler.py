@@ -1,9 +1,13 @@
 from typing import Union
 
+import xlsxwriter
 from openpyxl import Workbook
 from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
 from openpyxl.utils import get_column_letter
 
+from ai.row_store import page_columns
+from services.number_format import VN, NumberNormalizer, infer_number_convention
+
 # ---------------------------------------------------------------------
 
 
@@ -58,7 +62,258 @@ def vn_string_to_float(vn_string: str) -> Union[float, None]:
         return None
 
 
-def write_data_to_excel(hang_muc_list, output_file="output_incremental_stt.xlsx"):
+HEADERS_MAIN = [
+    "STT (1)",
+    "Mô tả công việc mời thầu (2)",
+    "Yêu cầu kỹ thuật/ Chỉ dẫn kỹ thuật chính (3)",
+    "Khối lượng mời thầu (4)",
+    "Đơn vị tính (5)",
+]
+
+# Fixed widths for B, C, D; A and E are sized to their content
+FIXED_COLUMN_WIDTHS = {1: 60.0, 2: 42.0, 3: 24.0}
+
+
+def _sheet_title(ten_hang_muc: str) -> str:
+    return ten_hang_muc[:31].replace(":", "").replace("/", "")
+
+
+def _khoi_luong_values(khoi_luong, normalizer: NumberNormalizer):
+    """Normalized khối lượng per row; unparsable values are kept as text."""
+    numbers, errors = normalizer.normalize(khoi_luong)
+    return [
+        text if error else number
+        for text, number, error in zip(khoi_luong, numbers, errors)
+    ]
+
+
+class ColumnWidthTracker:
+    """
+    Running max content length per column of the sheet being written.
+
+    Rows are measured once as they are written, so sizing a sheet costs
+    O(rows) instead of rescanning every cell after each page.
+    """
+
+    def __init__(self, num_columns: int):
+        self.num_columns = num_columns
+        self.lengths = {}
+
+    def track(self, col: int, value):
+        if col in FIXED_COLUMN_WIDTHS:
+            return
+        length = len(str(value)) if value is not None else 0
+        if length > self.lengths.get(col, 0):
+            self.lengths[col] = length
+
+    def track_row(self, values):
+        for col, value in enumerate(values):
+            self.track(col, value)
+
+    def widths(self):
+        """Yields (0-based column, width) for every column, then resets."""
+        for col in range(self.num_columns):
+            width = FIXED_COLUMN_WIDTHS.get(col)
+            if width is None:
+                width = self.lengths.get(col, 0) + 2
+            yield col, width
+        self.lengths = {}
+
+
+# ---------------------------------------------------------------------
+# Streaming (constant memory) writer
+# ---------------------------------------------------------------------
+class StreamingExcelWriter:
+    """
+    Writes HangMuc pages to an xlsx file as they arrive, using xlsxwriter's
+    constant_memory mode: each row is flushed to disk once the next one starts,
+    so memory stays flat however many rows are written.
+
+    Produces the same sheets, title row, header styling and STT numbering as
+    the openpyxl backend of `write_data_to_excel`.
+
+    Rows are written before the rest of the document is seen, so the number
+    convention is fixed up front: pass the document's (write_data_to_excel
+    infers it, streaming callers can use detect_number_convention). Without
+    one the Vietnamese convention is used.
+
+        with StreamingExcelWriter("out.xlsx", VN) as writer:
+            for hang_muc in pages:
+                writer.add(hang_muc)
+    """
+
+    NUM_COLUMNS = 5
+
+    def __init__(self, output_file, number_convention=None):
+        self.output_file = output_file
+        self.numbers = NumberNormalizer(number_convention or VN)
+        self.wb = xlsxwriter.Workbook(output_file, {"constant_memory": True})
+        self.ws = None
+        self.row = 0
+        self.main_item_counter = 1
+        self.sheet_names = set()
+        self.column_widths = ColumnWidthTracker(self.NUM_COLUMNS)
+
+        border = {"border": 1}
+        self.header_format = self.wb.add_format(
+            {
+                **border,
+                "bold": True,
+                "align": "center",
+                "valign": "vcenter",
+                "text_wrap": True,
+                "bg_color": "#BDD7EE",
+            }
+        )
+        self.title_format = self.wb.add_format(
+            {**border, "bold": True, "valign": "vcenter", "text_wrap": True}
+        )
+        self.stt_format = self.wb.add_format(
+            {**border, "align": "center", "valign": "vcenter", "text_wrap": True}
+        )
+        self.normal_format = self.wb.add_format(
+            {**border, "valign": "top", "text_wrap": True}
+        )
+        self.number_format = self.wb.add_format(
+            {**border, "align": "right", "valign": "top"}
+        )
+        self.unit_format = self.wb.add_format(
+            {**border, "align": "center", "valign": "top"}
+        )
+        self.row_formats = [
+            self.stt_format,
+            self.normal_format,
+            self.unit_format,
+            self.number_format,
+            self.unit_format,
+        ]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+        return False
+
+    def _unique_sheet_name(self, title: str) -> str:
+        # Mirror openpyxl: duplicate titles get a numeric suffix
+        name, suffix = title, 1
+        while name.lower() in self.sheet_names:
+            name = f"{title[:31 - len(str(suffix))]}{suffix}"
+            suffix += 1
+        self.sheet_names.add(name.lower())
+        return name
+
+    def _finish_sheet(self):
+        if self.ws is None:
+            return
+        for col, width in self.column_widths.widths():
+            self.ws.set_column(col, col, width)
+
+    def _start_sheet(self, ten_hang_muc: str):
+        self._finish_sheet()
+        self.ws = self.wb.add_worksheet(self._unique_sheet_name(_sheet_title(ten_hang_muc)))
+
+        # 1. Main item (Hang Muc) title, merged across all columns
+        self.ws.merge_range(
+            0,
+            0,
+            0,
+            self.NUM_COLUMNS - 1,
+            f"{self.main_item_counter}. {ten_hang_muc}",
+            self.title_format,
+        )
+
+        # 2. Header row
+        for col, header in enumerate(HEADERS_MAIN):
+            self.ws.write_string(1, col, header, self.header_format)
+        self.column_widths.track_row(HEADERS_MAIN)
+
+        self.row = 2
+        self.main_item_counter += 1
+
+    def add(self, hang_muc):
+        if hang_muc.ten_hang_muc.strip() != "":
+            self._start_sheet(hang_muc.ten_hang_muc)
+
+        if self.ws is None:
+            raise ValueError('First input page should have "Hang Muc" information')
+
+        base_stt = self.main_item_counter - 1
+        stt_column, noi_dung_column, don_vi_column, khoi_luong_column = page_columns(
+            hang_muc
+        )
+        khoi_luong_values = _khoi_luong_values(khoi_luong_column, self.numbers)
+        for stt, noi_dung, don_vi, khoi_luong in zip(
+            stt_column, noi_dung_column, don_vi_column, khoi_luong_values
+        ):
+            if noi_dung == "TỔNG CỘNG":
+                continue
+
+            if stt:
+                row_data = [
+                    f"{base_stt}.{stt}",
+                    noi_dung,
+                    "Theo quy định tại Chương V",
+                    khoi_luong,
+                    don_vi,
+                ]
+            else:
+                row_data = ["", noi_dung, "", "", don_vi]
+
+            for col, value in enumerate(row_data):
+                if value is None or value == "":
+                    self.ws.write_blank(self.row, col, None, self.row_formats[col])
+                elif isinstance(value, float):
+                    self.ws.write_number(self.row, col, value, self.row_formats[col])
+                else:
+                    self.ws.write_string(self.row, col, value, self.row_formats[col])
+            self.column_widths.track_row(row_data)
+            self.row += 1
+
+    def close(self):
+        self._finish_sheet()
+        self.wb.close()
+        print("✔ Exported data to", self.output_file)
+
+    def discard(self):
+        """Drops the workbook without writing the output file."""
+        self.wb.fileclosed = True
+
+
+# ---------------------------------------------------------------------
+
+
+def write_data_to_excel(
+    hang_muc_list,
+    output_file="output_incremental_stt.xlsx",
+    backend="openpyxl",
+    number_convention=None,
+):
+    """
+    Writes the extracted pages (HangMuc objects or a RowStore) to a styled
+    workbook.
+
+    backend="xlsxwriter" streams rows to disk in constant memory; the default
+    "openpyxl" backend builds the workbook in memory. The number convention
+    (VN or EN) is inferred from the whole document unless one is given.
+    """
+    # One number convention for the whole document
+    hang_muc_list = list(hang_muc_list)
+    if number_convention is None:
+        number_convention = infer_number_convention(
+            value for hang_muc in hang_muc_list for value in page_columns(hang_muc)[3]
+        )
+
+    if backend == "xlsxwriter":
+        with StreamingExcelWriter(output_file, number_convention) as writer:
+            for hang_muc in hang_muc_list:
+                writer.add(hang_muc)
+        return
+
     wb = Workbook()
     ws = None
 
@@ -102,11 +357,22 @@ def write_data_to_excel(hang_muc_list, output_file="output_incremental_stt.xlsx"
     # We need a counter to handle the main numbering (1, 2, 3...)
     main_item_counter = 1
 
+    numbers = NumberNormalizer(number_convention)
+
+    # Column widths are tracked as rows are written and applied once per sheet
+    column_widths = ColumnWidthTracker(NUM_COLUMNS)
+
+    def finish_sheet(ws):
+        for col, width in column_widths.widths():
+            ws.column_dimensions[get_column_letter(col + 1)].width = width
+
     # -------- Iterate HangMuc -------- #
     for hang_muc in hang_muc_list:
         if hang_muc.ten_hang_muc.strip() != "":
-            sheet_name = hang_muc.ten_hang_muc[:31].replace(":", "").replace("/", "")
-            ws = wb.create_sheet(title=sheet_name)
+            if ws is not None:
+                finish_sheet(ws)
+
+            ws = wb.create_sheet(title=_sheet_title(hang_muc.ten_hang_muc))
 
             start_row = 1
 
@@ -129,20 +395,14 @@ def write_data_to_excel(hang_muc_list, output_file="output_incremental_stt.xlsx"
             start_row += 1
 
             # 2. Write header row (Row 2)
-            headers_main = [
-                "STT (1)",
-                "Mô tả công việc mời thầu (2)",
-                "Yêu cầu kỹ thuật/ Chỉ dẫn kỹ thuật chính (3)",
-                "Khối lượng mời thầu (4)",
-                "Đơn vị tính (5)",
-            ]
-            ws.append(headers_main)
+            ws.append(HEADERS_MAIN)
+            column_widths.track_row(HEADERS_MAIN)
 
             # Apply header style
             for col in range(1, NUM_COLUMNS + 1):
                 ws.cell(row=start_row, column=col).style = "header_style"
 
-            data_start_row = start_row + 1
+            current_row = start_row
 
             # Increment main counter for the next HangMuc
             main_item_counter += 1
@@ -157,14 +417,19 @@ def write_data_to_excel(hang_muc_list, output_file="output_incremental_stt.xlsx"
         # This provides the leading number (e.g., '1')
         base_stt = main_item_counter - 1
 
-        for i, cv in enumerate(hang_muc.cong_viec):
-            if cv.noi_dung_cong_viec == "TỔNG CỘNG":
+        stt_column, noi_dung_column, don_vi_column, khoi_luong_column = page_columns(
+            hang_muc
+        )
+        khoi_luong_values = _khoi_luong_values(khoi_luong_column, numbers)
+        for stt, noi_dung, don_vi, khoi_luong in zip(
+            stt_column, noi_dung_column, don_vi_column, khoi_luong_values
+        ):
+            if noi_dung == "TỔNG CỘNG":
                 continue
 
             # Calculate the incremental STT: 1.1, 1.2, 1.3...
-            if cv.stt:
-                sub_stt = f"{base_stt}.{cv.stt}"
-                khoi_luong = vn_string_to_float(cv.khoi_luong)
+            if stt:
+                sub_stt = f"{base_stt}.{stt}"
                 quy_dinh = "Theo quy định tại Chương V"
 
             else:
@@ -172,13 +437,14 @@ def write_data_to_excel(hang_muc_list, output_file="output_incremental_stt.xlsx"
 
             row_data = [
                 sub_stt,
-                cv.noi_dung_cong_viec,
+                noi_dung,
                 quy_dinh,
                 khoi_luong,
-                cv.don_vi,
+                don_vi,
             ]
             ws.append(row_data)
-            current_row = ws.max_row
+            column_widths.track_row(row_data)
+            current_row += 1
 
             # Apply specific styles for 4 columns:
 
@@ -199,22 +465,9 @@ def write_data_to_excel(hang_muc_list, output_file="output_incremental_stt.xlsx"
             # Col 5 (Đơn vị tính): Unit style (Centered)
             ws.cell(row=current_row, column=5).style = "unit_style"
 
-        # Auto-adjust column width
-        for i, column_cells in enumerate(ws.columns):
-            column_letter = get_column_letter(column_cells[0].column)
-
-            if column_letter == "B":
-                ws.column_dimensions[column_letter].width = 60.0
-            elif column_letter == "C":
-                ws.column_dimensions[column_letter].width = 42.0
-            elif column_letter == "D":
-                ws.column_dimensions[column_letter].width = 24.0
-            else:
-                length = max(
-                    len(str(cell.value)) if cell.value is not None else 0
-                    for cell in column_cells[1:]
-                )
-                ws.column_dimensions[column_letter].width = length + 2
+    # Auto-adjust column width of the last sheet
+    if ws is not None:
+        finish_sheet(ws)
 
     # Remove default empty sheet
     if "Sheet" in wb.sheetnames:
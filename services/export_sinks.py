@@ -0,0 +1,295 @@
+"""
+Machine-readable exports of the extracted rows: CSV, JSON Lines, Parquet and
+Arrow, alongside (or instead of) the styled workbook.
+
+Every sink takes pages one at a time, in document order, and writes them as
+they arrive:
+
+    with open_sink("out.parquet", number_convention=VN) as sink:
+        for page in data:              # a RowStore, HangMuc list, …
+            sink.add(page, page.page_number)
+
+The khối lượng convention (VN or EN) is fixed when the sink is opened, since
+rows are written before the rest of the document is seen; export_data infers
+it from the whole document first.
+
+Rows carry the same hierarchical STT as the workbook ("1.1", "1.2", …), the
+khối lượng normalized to a float (None where it cannot be parsed, with the
+original text alongside) and the source page number.
+"""
+
+import abc
+import csv
+import json
+import os
+import pathlib
+from typing import Dict, List, Optional
+
+from ai.row_store import page_columns
+from services.excel_handler import StreamingExcelWriter
+from services.number_format import VN, NumberNormalizer, infer_number_convention
+
+EXPORT_COLUMNS = (
+    "page",
+    "hang_muc",
+    "ten_hang_muc",
+    "stt",
+    "noi_dung_cong_viec",
+    "don_vi",
+    "khoi_luong",
+    "khoi_luong_text",
+)
+
+
+# -----------------------------
+# Flat rows
+# -----------------------------
+class RowFlattener:
+    """
+    Turns pages into flat export columns with the workbook's numbering: a
+    page with a ten_hang_muc starts the next hạng mục, numbered rows get
+    "<hạng mục>.<stt>" and "TỔNG CỘNG" rows are dropped.
+    """
+
+    def __init__(self, number_convention: Optional[str] = None):
+        self.numbers = NumberNormalizer(number_convention or VN)
+        self.hang_muc = 0
+        self.ten_hang_muc = None
+
+    def columns(self, hang_muc, page_number: Optional[int] = None) -> Dict[str, list]:
+        """EXPORT_COLUMNS of one page's rows, as lists."""
+        if hang_muc.ten_hang_muc.strip():
+            self.hang_muc += 1
+            self.ten_hang_muc = hang_muc.ten_hang_muc
+        if self.ten_hang_muc is None:
+            raise ValueError('First input page should have "Hang Muc" information')
+
+        stt_column, noi_dung_column, don_vi_column, khoi_luong_column = page_columns(
+            hang_muc
+        )
+        numbers, errors = self.numbers.normalize(khoi_luong_column)
+
+        columns = {name: [] for name in EXPORT_COLUMNS}
+        for stt, noi_dung, don_vi, text, number, error in zip(
+            stt_column, noi_dung_column, don_vi_column, khoi_luong_column, numbers, errors
+        ):
+            if noi_dung == "TỔNG CỘNG":
+                continue
+            columns["stt"].append(f"{self.hang_muc}.{stt}" if stt else "")
+            columns["noi_dung_cong_viec"].append(noi_dung)
+            columns["don_vi"].append(don_vi)
+            # Unnumbered rows are headings; the workbook leaves their khối lượng blank
+            columns["khoi_luong"].append(number if stt and not error else None)
+            columns["khoi_luong_text"].append(text)
+
+        count = len(columns["stt"])
+        columns["page"] = [page_number] * count
+        columns["hang_muc"] = [self.hang_muc] * count
+        columns["ten_hang_muc"] = [self.ten_hang_muc] * count
+        return columns
+
+
+# -----------------------------
+# Sinks
+# -----------------------------
+class ExportSink(abc.ABC):
+    """
+    Base class: `add` flattens a page and hands its columns to `write`;
+    subclasses implement `write` and `_close_file`.
+
+    Used as a context manager the file is closed on success and removed if
+    an exception escapes, so a failed run leaves no half-written export.
+    """
+
+    def __init__(self, output_file, number_convention: Optional[str] = None):
+        self.output_file = str(output_file)
+        self.flattener = RowFlattener(number_convention)
+        self.rows = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+        return False
+
+    def add(self, hang_muc, page_number: Optional[int] = None):
+        columns = self.flattener.columns(hang_muc, page_number)
+        if columns["stt"]:
+            self.write(columns)
+            self.rows += len(columns["stt"])
+
+    @abc.abstractmethod
+    def write(self, columns: Dict[str, list]):
+        """Appends one page's EXPORT_COLUMNS."""
+
+    @abc.abstractmethod
+    def _close_file(self):
+        """Flushes and closes the output file."""
+
+    def close(self):
+        self._close_file()
+        print("✔ Exported data to", self.output_file)
+
+    def discard(self):
+        """Closes the sink and deletes what it wrote."""
+        self._close_file()
+        if os.path.exists(self.output_file):
+            os.remove(self.output_file)
+
+
+class CsvSink(ExportSink):
+    """UTF-8 CSV with a header row; empty cells for missing values."""
+
+    def __init__(self, output_file, number_convention=None, delimiter: str = ","):
+        super().__init__(output_file, number_convention)
+        self.file = open(self.output_file, "w", encoding="utf-8", newline="")
+        self.writer = csv.writer(self.file, delimiter=delimiter)
+        self.writer.writerow(EXPORT_COLUMNS)
+
+    def write(self, columns):
+        self.writer.writerows(zip(*(columns[name] for name in EXPORT_COLUMNS)))
+
+    def _close_file(self):
+        self.file.close()
+
+
+class JsonLinesSink(ExportSink):
+    """One JSON object per row."""
+
+    def __init__(self, output_file, number_convention=None):
+        super().__init__(output_file, number_convention)
+        self.file = open(self.output_file, "w", encoding="utf-8")
+
+    def write(self, columns):
+        self.file.writelines(
+            json.dumps(dict(zip(EXPORT_COLUMNS, values)), ensure_ascii=False) + "\n"
+            for values in zip(*(columns[name] for name in EXPORT_COLUMNS))
+        )
+
+    def _close_file(self):
+        self.file.close()
+
+
+class ArrowSink(ExportSink):
+    """
+    Arrow IPC file (readable with pyarrow.feather / polars / pandas).
+
+    Rows are buffered into batches of `batch_rows` so small pages do not turn
+    into thousands of tiny record batches. Needs pyarrow (pip install pyarrow).
+    """
+
+    def __init__(self, output_file, number_convention=None, batch_rows: int = 65536):
+        super().__init__(output_file, number_convention)
+        try:
+            import pyarrow as pa
+        except ImportError as e:
+            raise RuntimeError(
+                f"{type(self).__name__} needs pyarrow (pip install pyarrow)"
+            ) from e
+        self.pa = pa
+        self.schema = pa.schema(
+            [
+                ("page", pa.uint32()),
+                ("hang_muc", pa.uint32()),
+                ("ten_hang_muc", pa.dictionary(pa.int32(), pa.string())),
+                ("stt", pa.string()),
+                ("noi_dung_cong_viec", pa.string()),
+                ("don_vi", pa.dictionary(pa.int32(), pa.string())),
+                ("khoi_luong", pa.float64()),
+                ("khoi_luong_text", pa.string()),
+            ]
+        )
+        self.batch_rows = batch_rows
+        self.buffer: Dict[str, List] = {name: [] for name in EXPORT_COLUMNS}
+        self.writer = self._open_writer()
+
+    def _open_writer(self):
+        return self.pa.ipc.new_file(self.output_file, self.schema)
+
+    def _write_batch(self, batch):
+        self.writer.write_batch(batch)
+
+    def write(self, columns):
+        for name in EXPORT_COLUMNS:
+            self.buffer[name].extend(columns[name])
+        if len(self.buffer["stt"]) >= self.batch_rows:
+            self._flush()
+
+    def _flush(self):
+        if not self.buffer["stt"]:
+            return
+        batch = self.pa.record_batch(
+            [
+                self.pa.array(self.buffer[field.name], type=field.type)
+                for field in self.schema
+            ],
+            schema=self.schema,
+        )
+        self._write_batch(batch)
+        self.buffer = {name: [] for name in EXPORT_COLUMNS}
+
+    def _close_file(self):
+        self._flush()
+        self.writer.close()
+
+
+class ParquetSink(ArrowSink):
+    """Parquet file, one row group per `batch_rows` rows. Needs pyarrow."""
+
+    def _open_writer(self):
+        import pyarrow.parquet as pq
+
+        return pq.ParquetWriter(self.output_file, self.schema, compression="zstd")
+
+
+class ExcelSink(StreamingExcelWriter):
+    """The styled workbook behind the sink interface (page numbers are not shown)."""
+
+    def add(self, hang_muc, page_number: Optional[int] = None):
+        super().add(hang_muc)
+
+
+SINKS = {
+    "xlsx": ExcelSink,
+    "csv": CsvSink,
+    "jsonl": JsonLinesSink,
+    "arrow": ArrowSink,
+    "parquet": ParquetSink,
+}
+
+
+def sink_format(path) -> str:
+    """Export format implied by the file extension."""
+    suffix = pathlib.Path(path).suffix.lower().lstrip(".")
+    fmt = {"feather": "arrow", "ndjson": "jsonl", "pq": "parquet"}.get(suffix, suffix)
+    if fmt not in SINKS:
+        raise ValueError(f"Unknown export format: {path} (one of {', '.join(SINKS)})")
+    return fmt
+
+
+def open_sink(output_file, fmt: Optional[str] = None, number_convention=None):
+    """A sink for `output_file`; the format defaults to its extension."""
+    return SINKS[fmt or sink_format(output_file)](output_file, number_convention)
+
+
+def export_data(
+    hang_muc_list, output_file, fmt: Optional[str] = None, number_convention=None
+) -> str:
+    """
+    Writes all extracted pages (a RowStore or HangMuc objects) to one export
+    file. Page numbers come from RowStore pages; plain HangMuc have none.
+    """
+    hang_muc_list = list(hang_muc_list)
+    # One number convention for the whole document, as in write_data_to_excel
+    if number_convention is None:
+        number_convention = infer_number_convention(
+            value for hang_muc in hang_muc_list for value in page_columns(hang_muc)[3]
+        )
+    with open_sink(output_file, fmt, number_convention) as sink:
+        for hang_muc in hang_muc_list:
+            sink.add(hang_muc, getattr(hang_muc, "page_number", None))
+    return str(output_file)
@@ -0,0 +1,84 @@
+"""
+Client for services/job_server.py.
+
+    client = JobClient("http://127.0.0.1:8765")
+    job = client.submit("boq.pdf", from_page=3, to_page=40)
+    for event in client.events(job["id"]):
+        print(event)
+    client.download(job["id"], "boq.xlsx")
+"""
+
+import json
+import urllib.error
+import urllib.request
+from typing import Iterator, List, Optional
+from urllib.parse import urlencode
+
+
+class JobServiceError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+        self.message = message
+
+
+class JobClient:
+    def __init__(self, base_url: str, timeout: float = 60.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def _open(self, method: str, path: str, body: Optional[bytes] = None, **headers):
+        request = urllib.request.Request(
+            self.base_url + path, data=body, method=method, headers=headers
+        )
+        try:
+            return urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read()).get("error", e.reason)
+            except ValueError:
+                message = e.reason
+            raise JobServiceError(e.code, message) from None
+
+    def _json(self, method: str, path: str, body: Optional[bytes] = None, **headers):
+        with self._open(method, path, body, **headers) as response:
+            return json.loads(response.read())
+
+    def submit(self, pdf_path: str, **options) -> dict:
+        """Uploads a PDF; options are the server's JOB_OPTIONS (from_page, auto_pages, …)."""
+        with open(pdf_path, "rb") as f:
+            body = f.read()
+        query = urlencode({key: value for key, value in options.items() if value is not None})
+        return self._json(
+            "POST", f"/jobs?{query}", body, **{"Content-Type": "application/pdf"}
+        )
+
+    def jobs(self) -> List[dict]:
+        return self._json("GET", "/jobs")
+
+    def status(self, job_id: str) -> dict:
+        return self._json("GET", f"/jobs/{job_id}")
+
+    def cancel(self, job_id: str) -> dict:
+        return self._json("DELETE", f"/jobs/{job_id}")
+
+    def events(self, job_id: str, since: int = 0) -> Iterator[dict]:
+        """
+        Yields the job's events (status, progress, row, reset) until it has
+        ended, plus a {"type": "keep-alive"} about every second while nothing
+        happens, so the caller can check its own cancel flag between pages.
+        """
+        with self._open("GET", f"/jobs/{job_id}/events?since={since}") as response:
+            for raw in response:
+                line = raw.decode("utf-8").rstrip("\r\n")
+                if line.startswith("data: "):
+                    yield json.loads(line[len("data: ") :])
+                elif line.startswith(":"):
+                    yield {"type": "keep-alive"}
+
+    def download(self, job_id: str, output_path: str) -> str:
+        with self._open("GET", f"/jobs/{job_id}/result") as response:
+            with open(output_path, "wb") as f:
+                while chunk := response.read(1 << 16):
+                    f.write(chunk)
+        return output_path
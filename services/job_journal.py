@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+import pathlib
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Union
+
+from ai.models import HangMuc
+from ai.row_store import PageRows, RowStore
+
+DEFAULT_JOURNAL_DIR = pathlib.Path.home() / ".pdf2excel" / "journals"
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# -----------------------------
+# Checkpoint journal
+# -----------------------------
+@dataclass
+class JobJournal:
+    """
+    Append-only JSON Lines file of validated page results for one PDF.
+
+    Every page is written and fsynced as soon as it is parsed, so a crash,
+    sleep or cancel loses nothing already paid for. Re-running the same PDF
+    with the same journal only extracts the pages that are still missing.
+    A torn last line (crash mid-write) is ignored on load. Pages are held in
+    a RowStore; `get` returns its PageRows views.
+    """
+
+    path: str
+    pdf_sha256: str = ""
+
+    _rows: RowStore = field(default_factory=RowStore, repr=False)
+    _pages: Dict[int, PageRows] = field(default_factory=dict, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    _torn_tail: bool = field(default=False, repr=False)
+
+    def __post_init__(self):
+        self._load()
+
+    @classmethod
+    def for_pdf(cls, pdf_path: str, journal_dir: Optional[str] = None) -> "JobJournal":
+        """Opens the journal of a PDF, keyed by the file's content hash."""
+        pdf_sha256 = file_sha256(pdf_path)
+        directory = pathlib.Path(journal_dir or DEFAULT_JOURNAL_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        return cls(str(directory / f"{pdf_sha256[:32]}.jsonl"), pdf_sha256)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                # A torn last line must not swallow the next record
+                self._torn_tail = not line.endswith("\n")
+                try:
+                    record = json.loads(line)
+                    if "pdf_sha256" in record:
+                        if self.pdf_sha256 and record["pdf_sha256"] != self.pdf_sha256:
+                            # Journal belongs to another file; ignore its pages
+                            self._pages.clear()
+                            self._rows = RowStore()
+                            break
+                        continue
+                    hang_muc = HangMuc.model_validate(record["hang_muc"])
+                    self._pages[record["page"]] = self._rows.add(record["page"], hang_muc)
+                except (ValueError, KeyError):
+                    continue
+
+    def get(self, page_number: int) -> Optional[PageRows]:
+        return self._pages.get(page_number)
+
+    def completed_pages(self, from_page: int = 1, to_page: Optional[int] = None) -> List[int]:
+        return sorted(
+            p for p in self._pages if p >= from_page and (to_page is None or p <= to_page)
+        )
+
+    def append(self, page_number: int, hang_muc: Union[HangMuc, PageRows]):
+        with self._lock:
+            if page_number in self._pages:
+                return
+            new_file = not os.path.exists(self.path)
+            with open(self.path, "a", encoding="utf-8") as f:
+                if new_file:
+                    f.write(json.dumps({"pdf_sha256": self.pdf_sha256}) + "\n")
+                elif self._torn_tail:
+                    f.write("\n")
+                    self._torn_tail = False
+                page = self._rows.add(page_number, hang_muc)
+                record = {"page": page_number, "hang_muc": page.to_dict()}
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._pages[page_number] = page
+
+    def results(
+        self, from_page: int = 1, to_page: Optional[int] = None
+    ) -> List[PageRows]:
+        """Journaled pages in document order."""
+        return [self._pages[p] for p in self.completed_pages(from_page, to_page)]
+
+    def reset(self):
+        with self._lock:
+            self._pages.clear()
+            self._rows = RowStore()
+            if os.path.exists(self.path):
+                os.remove(self.path)
@@ -0,0 +1,591 @@
+"""
+Local HTTP job service: one warm process, one response cache and one global
+limit on model requests, shared by everyone on the team.
+
+    python -m services.job_server --port 8765 --workers 2 --max-requests 8
+    python -m services.job_server --fake-model      # offline, for testing
+
+Endpoints (JSON unless noted):
+    POST   /jobs?from_page=3&to_page=40&auto_pages=1   body: the PDF  -> 202 job
+    GET    /jobs                    all jobs
+    GET    /jobs/<id>               one job
+    GET    /jobs/<id>/events        progress as server-sent events until the job ends:
+                                    status, progress, row and reset (drop the rows
+                                    sent so far for a page, its final rows follow);
+                                    a ": keep-alive" comment every idle second
+    GET    /jobs/<id>/result        the xlsx
+    DELETE /jobs/<id>               cancel
+
+See services/job_client.py for a Python client.
+"""
+
+import argparse
+import json
+import os
+import pathlib
+import re
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, quote, urlparse
+
+from ai.request_scheduler import RequestScheduler
+from ai.response_cache import ResponseCache
+from services.run_report import RunReport
+
+# Query parameters accepted by POST /jobs, with their types
+JOB_OPTIONS = {
+    "from_page": int,
+    "to_page": int,
+    "concurrency": int,
+    "batch_size": int,
+    "auto_pages": bool,
+    "text_layer": bool,
+    "tiles": int,
+    "name": str,
+}
+FINAL_STATUSES = ("done", "failed", "cancelled")
+# Job names end up in the result's file name and Content-Disposition header
+_SAFE_NAME = re.compile(r"[\w.\- ]{1,100}")
+
+
+def _parse_options(query: Dict[str, List[str]]) -> dict:
+    options = {}
+    for key, values in query.items():
+        kind = JOB_OPTIONS.get(key)
+        if kind is None:
+            raise ValueError(f"Unknown option: {key}")
+        value = values[-1]
+        if kind is bool:
+            options[key] = value.lower() in ("1", "true", "yes", "on")
+        else:
+            options[key] = kind(value)
+    if "name" in options and not _SAFE_NAME.fullmatch(options["name"]):
+        raise ValueError("name may only contain letters, digits, spaces, '.', '-' and '_'")
+    return options
+
+
+# -----------------------------
+# Job
+# -----------------------------
+@dataclass
+class Job:
+    id: str
+    pdf_path: str
+    output_path: str
+    options: dict
+
+    status: str = "queued"
+    error: Optional[str] = None
+    created: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    pages: int = 0
+    rows: int = 0
+    cancel_requested: bool = False
+    report: Optional[RunReport] = field(default=None, repr=False)
+
+    events: List[dict] = field(default_factory=list, repr=False)
+    _condition: threading.Condition = field(default_factory=threading.Condition, repr=False)
+
+    def emit(self, kind: str, **data):
+        with self._condition:
+            self.events.append({"seq": len(self.events), "type": kind, **data})
+            self._condition.notify_all()
+
+    def set_status(self, status: str, **data):
+        with self._condition:
+            self.status = status
+            if status == "running":
+                self.started = time.time()
+            elif status in FINAL_STATUSES:
+                self.finished = time.time()
+        self.emit("status", status=status, **data)
+
+    def wait_events(self, since: int, timeout: float) -> Tuple[List[dict], bool]:
+        """Events after `since` (waiting up to `timeout` for one) and whether the job ended."""
+        with self._condition:
+            self._condition.wait_for(
+                lambda: len(self.events) > since or self.status in FINAL_STATUSES, timeout
+            )
+            return self.events[since:], self.status in FINAL_STATUSES
+
+    def to_dict(self) -> dict:
+        data = {
+            "id": self.id,
+            "name": self.options.get("name", ""),
+            "status": self.status,
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "pages": self.pages,
+            "rows": self.rows,
+            "options": self.options,
+        }
+        if self.report is not None:
+            data["progress"] = self.report.progress_text()
+            if self.status in FINAL_STATUSES:
+                run = self.report.to_dict()
+                data["stages"] = run["stages"]
+                data["tokens"] = run["tokens"]
+        return data
+
+
+# -----------------------------
+# Shared job service
+# -----------------------------
+class JobService:
+    """
+    Queues uploaded PDFs onto `workers` job threads that share one response
+    cache, one RequestScheduler and one semaphore of `max_requests` model
+    calls, so however many jobs run, the API key sees one paced client.
+
+    `model_factory(report, scheduler, limiter, cache)` returns the
+    GeminiModel for one job (a fake one in tests).
+    """
+
+    def __init__(
+        self,
+        model_factory: Callable[..., object],
+        work_dir: Optional[str] = None,
+        workers: int = 2,
+        max_requests: int = 8,
+        cache: Optional[ResponseCache] = None,
+        retention_seconds: float = 24 * 3600,
+    ):
+        self.model_factory = model_factory
+        self.work_dir = pathlib.Path(work_dir or tempfile.mkdtemp(prefix="pdf2excel-jobs-"))
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+        self.max_requests = max(1, max_requests)
+        self.limiter = threading.BoundedSemaphore(self.max_requests)
+        self.scheduler = RequestScheduler(
+            max_concurrency=self.max_requests,
+            initial_concurrency=min(2, self.max_requests),
+        )
+        self.cache = cache
+        self.retention_seconds = retention_seconds
+        self.pool = ThreadPoolExecutor(max_workers=max(1, workers))
+        self.jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, pdf_bytes: bytes, options: dict) -> Job:
+        if not pdf_bytes.startswith(b"%PDF"):
+            raise ValueError("Request body is not a PDF")
+        self._purge()
+
+        job_id = uuid.uuid4().hex[:12]
+        job_dir = self.work_dir / job_id
+        job_dir.mkdir()
+        pdf_path = job_dir / "input.pdf"
+        pdf_path.write_bytes(pdf_bytes)
+        job = Job(job_id, str(pdf_path), str(job_dir / "output.xlsx"), options)
+        with self._lock:
+            self.jobs[job_id] = job
+        job.emit("status", status="queued")
+        self.pool.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def list(self) -> List[Job]:
+        with self._lock:
+            return list(self.jobs.values())
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        job = self.get(job_id)
+        if job is not None and job.status not in FINAL_STATUSES:
+            job.cancel_requested = True
+            job.emit("progress", message="Cancelling…")
+        return job
+
+    def shutdown(self):
+        for job in self.list():
+            job.cancel_requested = True
+        self.pool.shutdown(wait=True, cancel_futures=True)
+
+    def _purge(self):
+        # Finished jobs (and their files) are kept for `retention_seconds`
+        cutoff = time.time() - self.retention_seconds
+        with self._lock:
+            expired = [
+                job
+                for job in self.jobs.values()
+                if job.finished is not None and job.finished < cutoff
+            ]
+            for job in expired:
+                del self.jobs[job.id]
+        for job in expired:
+            for path in (job.pdf_path, job.output_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            try:
+                os.rmdir(os.path.dirname(job.pdf_path))
+            except OSError:
+                pass
+
+    def _run(self, job: Job):
+        import fitz
+
+        from services.excel_handler import write_data_to_excel
+        from services.page_triage import detect_boq_pages
+        from services.pdf_handler import ImageOptions
+
+        if job.cancel_requested:
+            job.set_status("cancelled")
+            return
+        job.set_status("running")
+        options = job.options
+        job.report = RunReport(options.get("name") or job.id)
+
+        errors = []
+
+        def progress(message: str):
+            if message.startswith("Error"):
+                errors.append(message)
+            job.emit("progress", message=message)
+
+        def on_row(page_number: int, row):
+            job.emit(
+                "row",
+                page=page_number,
+                row={
+                    "stt": row.stt,
+                    "noi_dung_cong_viec": row.noi_dung_cong_viec,
+                    "don_vi": row.don_vi,
+                    "khoi_luong": row.khoi_luong,
+                },
+            )
+
+        try:
+            with fitz.open(job.pdf_path) as document:
+                page_count = document.page_count
+            from_page = max(1, options.get("from_page", 1))
+            to_page = min(page_count, options.get("to_page", page_count))
+            if from_page > to_page:
+                raise ValueError(f"Invalid page range {from_page}-{to_page}")
+
+            pages = None
+            if options.get("auto_pages"):
+                pages = detect_boq_pages(job.pdf_path, from_page, to_page, progress)
+                if not pages:
+                    raise ValueError("No BOQ pages found in the selected range")
+                progress(f"Found {len(pages)} BOQ pages")
+            job.pages = len(pages) if pages is not None else to_page - from_page + 1
+
+            model = self.model_factory(job.report, self.scheduler, self.limiter, self.cache)
+            data = model.extract_info(
+                pdf_path=job.pdf_path,
+                from_page=from_page,
+                to_page=to_page,
+                cancel_flag=lambda: job.cancel_requested,
+                progress_callback=progress,
+                max_concurrency=min(options.get("concurrency", 4), self.max_requests),
+                text_layer_first=options.get("text_layer", False),
+                image_options=ImageOptions(tiles=options.get("tiles", 1)),
+                batch_size=options.get("batch_size", 1),
+                pages=pages,
+                row_callback=on_row,
+                row_reset_callback=lambda page_number: job.emit("reset", page=page_number),
+            )
+            if job.cancel_requested:
+                job.set_status("cancelled")
+                return
+            if not data:
+                raise ValueError("AI extraction returned no pages")
+
+            with job.report.span("excel_write"):
+                write_data_to_excel(data, job.output_path, backend="xlsxwriter")
+            job.rows = data.row_count
+            job.set_status("done", pages=len(data), rows=job.rows, page_errors=errors)
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            print(f"Job {job.id} failed:\n{traceback.format_exc()}")
+            job.set_status("failed", error=job.error)
+
+
+# -----------------------------
+# HTTP front end
+# -----------------------------
+_JOB_PATH = re.compile(r"^/jobs/([0-9a-f]+)(/events|/result)?$")
+
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    """Routes the endpoints listed in the module docstring to `server.service`."""
+
+    server_version = "pdf2excel-jobs/1.0"
+    # Progress streams stay open for the whole job
+    protocol_version = "HTTP/1.0"
+
+    @property
+    def service(self) -> JobService:
+        return self.server.service
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, data, status: int = HTTPStatus.OK):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status: int, message: str):
+        self._send_json({"error": message}, status)
+
+    def _job(self) -> Tuple[Optional[Job], Optional[str]]:
+        match = _JOB_PATH.match(urlparse(self.path).path)
+        if match is None:
+            self._send_error(HTTPStatus.NOT_FOUND, "Not found")
+            return None, None
+        job = self.service.get(match.group(1))
+        if job is None:
+            self._send_error(HTTPStatus.NOT_FOUND, "No such job")
+        return job, match.group(2)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/jobs":
+            self._send_error(HTTPStatus.NOT_FOUND, "Not found")
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if length <= 0:
+            self._send_error(HTTPStatus.LENGTH_REQUIRED, "Send the PDF as the request body")
+            return
+        if length > self.server.max_upload_bytes:
+            self._send_error(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "PDF is too large")
+            return
+        try:
+            options = _parse_options(parse_qs(url.query))
+            job = self.service.submit(self.rfile.read(length), options)
+        except ValueError as e:
+            self._send_error(HTTPStatus.BAD_REQUEST, str(e))
+            return
+        self._send_json(job.to_dict(), HTTPStatus.ACCEPTED)
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/jobs":
+            self._send_json([job.to_dict() for job in self.service.list()])
+            return
+        job, action = self._job()
+        if job is None:
+            return
+        if action is None:
+            self._send_json(job.to_dict())
+        elif action == "/events":
+            self._stream_events(job)
+        elif job.status != "done":
+            self._send_error(HTTPStatus.CONFLICT, f"Job is {job.status}")
+        else:
+            self._send_file(job)
+
+    def do_DELETE(self):
+        job, action = self._job()
+        if job is None:
+            return
+        if action is not None:
+            self._send_error(HTTPStatus.METHOD_NOT_ALLOWED, "Cancel the job itself")
+            return
+        self.service.cancel(job.id)
+        self._send_json(job.to_dict(), HTTPStatus.ACCEPTED)
+
+    def _send_file(self, job: Job):
+        with open(job.output_path, "rb") as f:
+            body = f.read()
+        filename = (job.options.get("name") or job.id) + ".xlsx"
+        # Headers are latin-1: an ASCII fallback plus the UTF-8 name (RFC 6266)
+        fallback = filename.encode("ascii", "replace").decode("ascii").replace("?", "_")
+        self.send_response(HTTPStatus.OK)
+        self.send_header(
+            "Content-Type",
+            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        )
+        self.send_header(
+            "Content-Disposition",
+            f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename)}",
+        )
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream_events(self, job: Job):
+        """Server-sent events from ?since=<seq> until the job has ended."""
+        since = int(parse_qs(urlparse(self.path).query).get("since", ["0"])[-1])
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        try:
+            while True:
+                events, ended = job.wait_events(since, self.server.keepalive_seconds)
+                for event in events:
+                    line = json.dumps(event, ensure_ascii=False)
+                    self.wfile.write(f"data: {line}\n\n".encode("utf-8"))
+                since += len(events)
+                if ended and since >= len(job.events):
+                    break
+                if not events:
+                    # Keeps proxies from dropping the stream and lets clients
+                    # act (e.g. on a cancel) while a slow page is in flight
+                    self.wfile.write(b": keep-alive\n\n")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class JobServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: Tuple[str, int],
+        service: JobService,
+        max_upload_bytes: int = 200 * 1024 * 1024,
+        verbose: bool = False,
+        keepalive_seconds: float = 1.0,
+    ):
+        super().__init__(address, JobRequestHandler)
+        self.service = service
+        self.max_upload_bytes = max_upload_bytes
+        self.keepalive_seconds = keepalive_seconds
+        self.verbose = verbose
+
+
+# -----------------------------
+# Model backends
+# -----------------------------
+def gemini_model_factory(api_keys: List[str], model_name: str, stream: bool = True):
+    from ai.gemini_caller import GeminiModel
+    from ai.model_router import ModelRouter
+
+    router = None
+    if len(api_keys) > 1:
+        router = ModelRouter.from_keys(api_keys, [model_name])
+
+    def factory(report, scheduler, limiter, cache):
+        return GeminiModel(
+            api_key=api_keys[0],
+            model_name=model_name,
+            cache=cache,
+            request_limiter=limiter,
+            scheduler=scheduler,
+            report=report,
+            stream=stream,
+            router=router,
+        )
+
+    return factory
+
+
+def fake_model_factory(latency: float = 0.2, rows: int = 30):
+    """Offline backend: FakeGenerativeModel answers for every page."""
+    from ai.fake_model import FakeGenerativeModel, sample_hang_muc
+    from ai.gemini_caller import GeminiModel
+
+    fake = FakeGenerativeModel(latency=latency, response=sample_hang_muc(rows))
+
+    def factory(report, scheduler, limiter, cache):
+        model = GeminiModel(
+            api_key="fake",
+            cache=cache,
+            request_limiter=limiter,
+            scheduler=scheduler,
+            report=report,
+            stream=True,
+        )
+        model.model_multimodal = fake
+        return model
+
+    return factory
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Shared BOQ extraction job service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=2, help="Jobs processed at once")
+    parser.add_argument(
+        "--max-requests",
+        type=int,
+        default=8,
+        help="Global limit on concurrent model calls across all jobs",
+    )
+    parser.add_argument("--model", default="gemini-2.5-flash")
+    parser.add_argument(
+        "--api-key", default=None, help="Defaults to $GEMINI_API_KEY; comma separated for several"
+    )
+    parser.add_argument("--work-dir", default=None, help="Uploads and results (default: a temp dir)")
+    parser.add_argument(
+        "--cache-dir",
+        default=None,
+        help="Response cache directory (default: ~/.pdf2excel/response_cache)",
+    )
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--max-upload-mb", type=float, default=200)
+    parser.add_argument(
+        "--fake-model",
+        action="store_true",
+        help="Answer with a local fake model instead of Gemini (no API key needed)",
+    )
+    parser.add_argument("--fake-latency", type=float, default=0.2)
+    parser.add_argument("--verbose", action="store_true", help="Log every HTTP request")
+    return parser
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+
+    from ai.model_router import split_keys
+
+    load_dotenv()
+    args = build_parser().parse_args(argv)
+
+    if args.fake_model:
+        factory = fake_model_factory(args.fake_latency)
+    else:
+        api_keys = split_keys(args.api_key or os.environ.get("GEMINI_API_KEY", ""))
+        if not api_keys:
+            raise SystemExit("No API key: pass --api-key, set GEMINI_API_KEY or use --fake-model")
+        factory = gemini_model_factory(api_keys, args.model)
+
+    cache = None
+    if not args.no_cache:
+        cache = ResponseCache(args.cache_dir) if args.cache_dir else ResponseCache()
+
+    service = JobService(
+        factory,
+        work_dir=args.work_dir,
+        workers=args.workers,
+        max_requests=args.max_requests,
+        cache=cache,
+    )
+    server = JobServer(
+        (args.host, args.port),
+        service,
+        max_upload_bytes=int(args.max_upload_mb * 1024 * 1024),
+        verbose=args.verbose,
+    )
+    print(f"✔ Job service on http://{args.host}:{server.server_port} (work dir {service.work_dir})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
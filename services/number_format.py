@@ -0,0 +1,144 @@
+import re
+from collections import Counter
+from typing import Iterable, List, Optional, Tuple
+
+# Number conventions
+VN = "vn"  # "1.082,333": dot groups thousands, comma is the decimal separator
+EN = "en"  # "1,082.333": comma groups thousands, dot is the decimal separator
+
+_SPACES = re.compile(r"\s+")
+_VALID = {
+    VN: re.compile(r"[+-]?(?:\d|\d[\d.]*\d)(?:,\d+)?"),
+    EN: re.compile(r"[+-]?(?:\d|\d[\d,]*\d)(?:\.\d+)?"),
+}
+# Separator rewrite per convention: drop thousands separator, decimal -> "."
+_TRANSLATE = {
+    VN: str.maketrans({".": None, ",": "."}),
+    EN: str.maketrans({",": None}),
+}
+# Joins a whole column so the separator rewrite runs once per column
+_JOIN = "\n"
+
+
+def _vote(value: str) -> Optional[str]:
+    """Returns the convention a single value proves, or None if it is ambiguous."""
+    has_dot, has_comma = "." in value, "," in value
+    if has_dot and has_comma:
+        return VN if value.rfind(",") > value.rfind(".") else EN
+    if has_dot:
+        if value.count(".") > 1:
+            return VN
+        return None if len(value.rsplit(".", 1)[1]) == 3 else EN
+    if has_comma:
+        if value.count(",") > 1:
+            return EN
+        return None if len(value.rsplit(",", 1)[1]) == 3 else VN
+    return None
+
+
+class NumberNormalizer:
+    """
+    Converts khối lượng strings to floats with one convention per document.
+
+    The convention is inferred from the values themselves: "1.082,333",
+    "12,5" or "1.234.567" prove the Vietnamese convention, "1,082.333",
+    "12.5" or "1,234,567" prove the English one. Values such as "360,000"
+    are ambiguous on their own and simply follow the document's majority.
+    With no evidence at all the Vietnamese convention is assumed, matching
+    the format the extraction prompt asks for.
+    """
+
+    def __init__(self, convention: Optional[str] = None):
+        self.fixed = convention
+        self.votes = Counter()
+
+    @property
+    def convention(self) -> str:
+        if self.fixed:
+            return self.fixed
+        return EN if self.votes[EN] > self.votes[VN] else VN
+
+    def observe(self, values: Iterable[str]):
+        for value in values:
+            if isinstance(value, str):
+                vote = _vote(_SPACES.sub("", value))
+                if vote:
+                    self.votes[vote] += 1
+
+    def normalize(self, values: Iterable[str]) -> Tuple[List[Optional[float]], List[bool]]:
+        """
+        Converts a column of strings in one pass.
+        Returns the floats (None where conversion failed; "" becomes 0.0) and
+        the matching error mask.
+        """
+        values = list(values)
+        if not self.fixed:
+            self.observe(values)
+        convention = self.convention
+        valid = _VALID[convention]
+
+        # Whitespace (including _JOIN) is stripped, so the join below is safe
+        cleaned = [_SPACES.sub("", v) if isinstance(v, str) else "" for v in values]
+        translated = _JOIN.join(cleaned).translate(_TRANSLATE[convention]).split(_JOIN)
+
+        numbers: List[Optional[float]] = []
+        errors: List[bool] = []
+        for raw, clean, standard in zip(values, cleaned, translated):
+            if not isinstance(raw, str):
+                numbers.append(None)
+                errors.append(True)
+            elif not clean:
+                numbers.append(0.0)
+                errors.append(False)
+            elif valid.fullmatch(clean):
+                numbers.append(float(standard))
+                errors.append(False)
+            else:
+                numbers.append(None)
+                errors.append(True)
+        return numbers, errors
+
+
+def infer_number_convention(values: Iterable[str]) -> str:
+    """Returns VN or EN for a whole document's worth of number strings."""
+    normalizer = NumberNormalizer()
+    normalizer.observe(values)
+    return normalizer.convention
+
+
+# Number-like tokens of a page's text layer
+_NUMBER_TOKEN = re.compile(r"(?<![\w.,])\d[\d.,]*\d(?![\w.,]*\w)")
+
+
+def _is_grouped(token: str) -> bool:
+    """Both separators, or one separator used twice: "1.082,333", "1,234,567"."""
+    return ("." in token and "," in token) or token.count(".") > 1 or token.count(",") > 1
+
+
+def detect_number_convention(pdf_path: str, page_numbers: Iterable[int]) -> str:
+    """
+    Cheap pre-pass for writers that must fix the convention before the first
+    page arrives: votes over the numbers in the PDF text layer of
+    `page_numbers` (1-based).
+
+    Free text is full of item numbers ("1.1", "2.12") that look like English
+    decimals, so only grouped numbers vote when the pages have any; single
+    separator tokens decide otherwise. Scanned pages have no text layer, and
+    with no evidence the result is VN, as in infer_number_convention.
+    """
+    import fitz
+
+    tokens: List[str] = []
+    with fitz.open(pdf_path) as document:
+        for page_number in page_numbers:
+            if 1 <= page_number <= document.page_count:
+                tokens.extend(_NUMBER_TOKEN.findall(document[page_number - 1].get_text()))
+    grouped = [token for token in tokens if _is_grouped(token)]
+    return infer_number_convention(grouped or tokens)
+
+
+def normalize_numbers(
+    values: Iterable[str], convention: Optional[str] = None
+) -> Tuple[List[Optional[float]], List[bool]]:
+    """Batch version of vn_string_to_float: (floats, error mask) for a column."""
+    return NumberNormalizer(convention).normalize(values)
@@ -0,0 +1,239 @@
+import re
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+import fitz
+
+from ai.text_layer_extractor import _fold
+
+# Folded header words of a BOQ table
+HEADER_WORDS = ("STT", "NOI DUNG", "DON VI", "KHOI LUONG")
+HANG_MUC = re.compile(r"\bHANG\s*MUC\b")
+NUMBER_TOKEN = re.compile(r"^[+-]?\d{1,3}(?:[.,]\d{3})*(?:[.,]\d+)?$")
+
+# Gray levels counted as ink in the low-resolution raster; thin rules come
+# out light gray once downsampled, so this is generous
+_INK = bytes(range(192))
+
+
+def _runs(flags: List[bool]) -> List[Tuple[int, int]]:
+    """(start, end) of each True run, so a 3px-thick rule counts once."""
+    runs, start = [], None
+    for idx, flag in enumerate(flags):
+        if flag and start is None:
+            start = idx
+        elif not flag and start is not None:
+            runs.append((start, idx))
+            start = None
+    if start is not None:
+        runs.append((start, len(flags)))
+    return runs
+
+
+def _ink_profiles(page: fitz.Page, zoom: float):
+    """Dark pixel counts per pixel row and per pixel column of a gray render."""
+    pix = page.get_pixmap(
+        matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False
+    )
+    samples, width, height, stride = pix.samples, pix.width, pix.height, pix.stride
+    row_ink = [
+        width - len(samples[y * stride : y * stride + width].translate(None, _INK))
+        for y in range(height)
+    ]
+    column_ink = [
+        height - len(samples[x : height * stride : stride].translate(None, _INK))
+        for x in range(width)
+    ]
+    return row_ink, column_ink
+
+
+def find_raster_rules(page: fitz.Page, zoom: float = 2.0) -> Tuple[List[float], List[float]]:
+    """
+    Table rules visible in the page image, for scans without vector drawings.
+    Returns the y of each horizontal and the x of each vertical rule, in page
+    coordinates and sorted.
+    """
+    row_ink, column_ink = _ink_profiles(page, zoom)
+    width, height = len(column_ink), len(row_ink)
+    rows = _runs([ink >= width * 0.5 for ink in row_ink])
+    columns = _runs([ink >= height * 0.3 for ink in column_ink])
+    return (
+        [(start + end) / 2 / zoom for start, end in rows],
+        [(start + end) / 2 / zoom for start, end in columns],
+    )
+
+
+@dataclass
+class PageScore:
+    page_number: int
+    table_score: float  # 0..1: a BOQ table is on this page
+    header_score: float  # 0..1: a new hạng mục starts here (0.5 = cannot tell)
+    source: str  # "text" for digital pages, "raster" for scans
+    features: Dict[str, float] = field(default_factory=dict)
+
+
+# -----------------------------
+# Page triage
+# -----------------------------
+@dataclass
+class PageTriage:
+    """
+    Fast local pre-pass that finds the pages worth sending to the model.
+
+    Digital pages are scored from their text (BOQ header words, hạng mục
+    titles, quantity-like numbers) and vector ruling lines; scanned pages from
+    ruling lines found in a low-resolution grayscale render, counted with
+    bytes.translate over pixel rows and columns. No page is sent anywhere.
+    """
+
+    table_threshold: float = 0.5
+    raster_zoom: float = 1.0  # 72 dpi is plenty to see table rules
+    min_text_chars: int = 40
+
+    def _vector_rules(self, page: fitz.Page):
+        width, height = page.rect.width, page.rect.height
+        horizontal = vertical = cells = 0
+        for drawing in page.get_drawings():
+            for item in drawing["items"]:
+                if item[0] == "l":
+                    p1, p2 = item[1], item[2]
+                    if abs(p1.y - p2.y) < 1 and abs(p1.x - p2.x) > width * 0.3:
+                        horizontal += 1
+                    elif abs(p1.x - p2.x) < 1 and abs(p1.y - p2.y) > height * 0.05:
+                        vertical += 1
+                elif item[0] == "re":
+                    rect = item[1]
+                    if rect.height < 2 and rect.width > width * 0.3:
+                        horizontal += 1
+                    elif rect.width < 2 and rect.height > height * 0.05:
+                        vertical += 1
+                    elif rect.width > 10 and rect.height > 5:
+                        cells += 1
+        # Tables drawn as cell rectangles have a rule on every cell edge
+        if cells >= 8:
+            horizontal, vertical = max(horizontal, cells // 3), max(vertical, 3)
+        return horizontal, vertical
+
+    def _raster_features(self, page: fitz.Page):
+        row_ink, column_ink = _ink_profiles(page, self.raster_zoom)
+        width, height = len(column_ink), len(row_ink)
+        return {
+            "h_rules": len(_runs([ink >= width * 0.5 for ink in row_ink])),
+            "v_rules": len(_runs([ink >= height * 0.3 for ink in column_ink])),
+            "ink_ratio": sum(row_ink) / max(1, width * height),
+        }
+
+    def horizontal_rules(self, page: fitz.Page) -> List[float]:
+        """
+        y of the horizontal table rules on a page, sorted: from vector drawings
+        on digital pages (cell rectangles give their top and bottom edges),
+        from the image on scans.
+        """
+        if len(page.get_text().strip()) < self.min_text_chars:
+            return find_raster_rules(page, self.raster_zoom)[0]
+        width = page.rect.width
+        rules = []
+        for drawing in page.get_drawings():
+            for item in drawing["items"]:
+                if item[0] == "l":
+                    p1, p2 = item[1], item[2]
+                    if abs(p1.y - p2.y) < 1 and abs(p1.x - p2.x) > width * 0.3:
+                        rules.append((p1.y + p2.y) / 2)
+                elif item[0] == "re":
+                    rect = item[1]
+                    if rect.height < 2 and rect.width > width * 0.3:
+                        rules.append((rect.y0 + rect.y1) / 2)
+                    elif rect.width > 10 and rect.height > 5:
+                        rules.extend((rect.y0, rect.y1))
+        return sorted(rules)
+
+    def count_rules(self, page: fitz.Page) -> Tuple[int, int]:
+        """(horizontal, vertical) table rules on a page, digital or scanned."""
+        if len(page.get_text().strip()) >= self.min_text_chars:
+            return self._vector_rules(page)
+        features = self._raster_features(page)
+        return features["h_rules"], features["v_rules"]
+
+    def score_page(self, page: fitz.Page) -> PageScore:
+        text = page.get_text()
+        page_number = page.number + 1
+
+        if len(text.strip()) < self.min_text_chars:
+            # Scanned (or empty) page: only the picture can tell
+            features = self._raster_features(page)
+            table = 0.0
+            if features["h_rules"] >= 5 and features["v_rules"] >= 3:
+                table = 0.7
+            elif features["h_rules"] >= 3 and features["ink_ratio"] > 0.02:
+                table = 0.4
+            return PageScore(page_number, table, 0.5, "raster", features)
+
+        folded = _fold(text)
+        header_hits = sum(word in folded for word in HEADER_WORDS)
+        numbers = sum(bool(NUMBER_TOKEN.match(token)) for token in text.split())
+        h_rules, v_rules = self._vector_rules(page)
+
+        table = 0.0
+        if header_hits >= 3:
+            table += 0.5
+        elif header_hits == 2:
+            table += 0.25
+        if h_rules >= 5 and v_rules >= 3:
+            table += 0.4
+        if numbers >= 5:
+            table += 0.2
+
+        header = 0.0
+        title = HANG_MUC.search(folded)
+        if title:
+            # A title counts when it comes before the table header, not in a row
+            stt = folded.find("STT")
+            header = 1.0 if stt < 0 or title.start() < stt else 0.3
+
+        features = {
+            "header_words": header_hits,
+            "numbers": numbers,
+            "h_rules": h_rules,
+            "v_rules": v_rules,
+        }
+        return PageScore(page_number, min(1.0, table), header, "text", features)
+
+    def triage(
+        self,
+        pdf_path: str,
+        from_page: int = 1,
+        to_page: Optional[int] = None,
+        progress_callback: Optional[Callable[[str], None]] = None,
+    ) -> List[PageScore]:
+        with fitz.open(pdf_path) as document:
+            to_page = min(to_page or document.page_count, document.page_count)
+            scores = []
+            for page_num in range(from_page - 1, to_page):
+                if progress_callback and page_num % 20 == 0:
+                    progress_callback(f"Scanning pages… {page_num + 1}/{to_page}")
+                scores.append(self.score_page(document.load_page(page_num)))
+        return scores
+
+    def select_pages(self, scores: List[PageScore]) -> List[int]:
+        """
+        Page numbers to extract: the BOQ table pages, starting at the first one
+        that may open a hạng mục (the workbook needs a title to start from).
+        """
+        pages = [s for s in scores if s.table_score >= self.table_threshold]
+        for idx, score in enumerate(pages):
+            if score.header_score >= 0.5:
+                return [s.page_number for s in pages[idx:]]
+        return [s.page_number for s in pages]
+
+
+def detect_boq_pages(
+    pdf_path: str,
+    from_page: int = 1,
+    to_page: Optional[int] = None,
+    progress_callback: Optional[Callable[[str], None]] = None,
+) -> List[int]:
+    """Pages of `pdf_path` (within from_page..to_page) that hold BOQ tables."""
+    triage = PageTriage()
+    return triage.select_pages(
+        triage.triage(pdf_path, from_page, to_page, progress_callback)
+    )
@@ -0,0 +1,186 @@
+import contextlib
+import json
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+USAGE_FIELDS = (
+    "prompt_token_count",
+    "candidates_token_count",
+    "cached_content_token_count",
+    "total_token_count",
+)
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+def _format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+
+# -----------------------------
+# Per-run instrumentation
+# -----------------------------
+class RunReport:
+    """
+    Collects stage timings and Gemini token usage for one extraction run.
+
+    Stages are timed with `span("render")`-style context managers from any
+    thread; token counts come from each response's `usage_metadata`. The
+    result can be written as JSON or in Prometheus text format.
+    """
+
+    def __init__(self, name: str = "run"):
+        self.name = name
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+        self.stages: Dict[str, List[float]] = defaultdict(list)
+        self.page_tokens: Dict[int, Dict[str, int]] = {}
+        self.pages_done = 0
+        self.pages_total = 0
+        # Page image sizes, when ImageOptions.report_savings measures them
+        self.image_bytes = {"pages": 0, "sent": 0, "baseline": 0}
+
+    # ----------------- Recording -----------------
+    @contextlib.contextmanager
+    def span(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            self.stages[stage].append(seconds)
+
+    def record_usage(self, page_numbers: Iterable[int], usage_metadata):
+        """Adds a response's token usage, split evenly across its pages."""
+        if usage_metadata is None:
+            return
+        page_numbers = list(page_numbers)
+        with self._lock:
+            for field in USAGE_FIELDS:
+                value = getattr(usage_metadata, field, None) or 0
+                share, remainder = divmod(value, len(page_numbers))
+                for idx, page_number in enumerate(page_numbers):
+                    tokens = self.page_tokens.setdefault(page_number, {})
+                    tokens[field] = tokens.get(field, 0) + share + (idx < remainder)
+
+    def record_image_bytes(self, sent: int, baseline: int):
+        """Adds one page image and the size of the full-page PNG it replaced."""
+        with self._lock:
+            self.image_bytes["pages"] += 1
+            self.image_bytes["sent"] += sent
+            self.image_bytes["baseline"] += baseline
+
+    def page_finished(self):
+        with self._lock:
+            self.pages_done += 1
+
+    # ----------------- Live progress -----------------
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._t0
+
+    def progress_text(self) -> str:
+        """'12/200 pages · 6.3 pages/min · ETA 29:50' for the status label."""
+        elapsed = self.elapsed()
+        done, total = self.pages_done, self.pages_total
+        if not done or not elapsed:
+            return f"{done}/{total} pages"
+        rate = done / elapsed * 60
+        eta = (total - done) / done * elapsed if total > done else 0
+        return (
+            f"{done}/{total} pages · {rate:.1f} pages/min · "
+            f"ETA {_format_duration(eta)}"
+        )
+
+    # ----------------- Output -----------------
+    def to_dict(self) -> dict:
+        with self._lock:
+            stages = {}
+            for stage, values in self.stages.items():
+                ordered = sorted(values)
+                stages[stage] = {
+                    "count": len(ordered),
+                    "total_seconds": round(sum(ordered), 4),
+                    "mean_seconds": round(sum(ordered) / len(ordered), 4),
+                    "p50_seconds": round(_percentile(ordered, 0.5), 4),
+                    "p95_seconds": round(_percentile(ordered, 0.95), 4),
+                    "p99_seconds": round(_percentile(ordered, 0.99), 4),
+                    "max_seconds": round(ordered[-1], 4),
+                }
+            totals = {
+                field: sum(t.get(field, 0) for t in self.page_tokens.values())
+                for field in USAGE_FIELDS
+            }
+            elapsed = self.elapsed()
+            return {
+                "name": self.name,
+                "started": self.started,
+                "elapsed_seconds": round(elapsed, 3),
+                "pages_done": self.pages_done,
+                "pages_total": self.pages_total,
+                "pages_per_minute": round(self.pages_done / elapsed * 60, 3)
+                if elapsed
+                else 0.0,
+                "stages": stages,
+                "tokens": totals,
+                "page_tokens": {str(p): t for p, t in sorted(self.page_tokens.items())},
+                "image_bytes": dict(self.image_bytes),
+            }
+
+    def write_json(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+    def to_prometheus(self) -> str:
+        data = self.to_dict()
+        run = f'run="{data["name"]}"'
+        lines = [
+            "# HELP pdf2excel_stage_seconds Time spent per pipeline stage.",
+            "# TYPE pdf2excel_stage_seconds summary",
+        ]
+        for stage, s in data["stages"].items():
+            labels = f'{run},stage="{stage}"'
+            lines.append(f'pdf2excel_stage_seconds{{{labels},quantile="0.5"}} {s["p50_seconds"]}')
+            lines.append(f'pdf2excel_stage_seconds{{{labels},quantile="0.95"}} {s["p95_seconds"]}')
+            lines.append(f'pdf2excel_stage_seconds{{{labels},quantile="0.99"}} {s["p99_seconds"]}')
+            lines.append(f"pdf2excel_stage_seconds_sum{{{labels}}} {s['total_seconds']}")
+            lines.append(f"pdf2excel_stage_seconds_count{{{labels}}} {s['count']}")
+
+        lines += [
+            "# HELP pdf2excel_tokens_total Gemini tokens billed in this run.",
+            "# TYPE pdf2excel_tokens_total counter",
+        ]
+        for field, value in data["tokens"].items():
+            kind = field.replace("_token_count", "")
+            lines.append(f'pdf2excel_tokens_total{{{run},kind="{kind}"}} {value}')
+
+        lines += [
+            "# HELP pdf2excel_pages_total Pages extracted in this run.",
+            "# TYPE pdf2excel_pages_total counter",
+            f"pdf2excel_pages_total{{{run}}} {data['pages_done']}",
+            "# HELP pdf2excel_run_seconds Wall-clock duration of the run.",
+            "# TYPE pdf2excel_run_seconds gauge",
+            f"pdf2excel_run_seconds{{{run}}} {data['elapsed_seconds']}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+
+
+def maybe_span(report: Optional[RunReport], stage: str):
+    """`report.span(stage)`, or a no-op when no report is being collected."""
+    return report.span(stage) if report is not None else contextlib.nullcontext()
@@ -0,0 +1,91 @@
+import tempfile
+import threading
+import time
+import unittest
+import urllib.request
+
+import fitz
+
+from services.job_client import JobClient, JobServiceError
+from services.job_server import JobServer, JobService, fake_model_factory
+
+
+def _pdf_bytes() -> bytes:
+    with fitz.open() as document:
+        document.new_page().insert_text((72, 72), "HẠNG MỤC: test")
+        return document.tobytes()
+
+
+class _ServerTestCase(unittest.TestCase):
+    """Runs a job server with the fake model on a free port for the class."""
+
+    latency = 0.01
+
+    @classmethod
+    def setUpClass(cls):
+        cls.work_dir = tempfile.TemporaryDirectory()
+        cls.service = JobService(
+            fake_model_factory(latency=cls.latency, rows=3), work_dir=cls.work_dir.name
+        )
+        cls.server = JobServer(("127.0.0.1", 0), cls.service, keepalive_seconds=0.2)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+        cls.client = JobClient(cls.base_url, timeout=10)
+        cls.pdf_path = f"{cls.work_dir.name}/test.pdf"
+        with open(cls.pdf_path, "wb") as f:
+            f.write(_pdf_bytes())
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.service.shutdown()
+        cls.work_dir.cleanup()
+
+
+class JobServerTest(_ServerTestCase):
+    def test_hostile_name_is_rejected(self):
+        for name in ('x"\r\nX-Evil: 1', "a\nb", "../../etc/passwd", 'q"uote'):
+            with self.subTest(name=name):
+                with self.assertRaises(JobServiceError) as raised:
+                    self.client.submit(self.pdf_path, name=name)
+                self.assertEqual(raised.exception.status, 400)
+        self.assertFalse([job for job in self.client.jobs() if "Evil" in job["name"]])
+
+    def test_result_headers_carry_the_name(self):
+        job = self.client.submit(self.pdf_path, name="Bảng khối lượng 1")
+        statuses = [
+            event["status"] for event in self.client.events(job["id"])
+            if event["type"] == "status"
+        ]
+        self.assertEqual(statuses[-1], "done")
+
+        url = f"{self.base_url}/jobs/{job['id']}/result"
+        with urllib.request.urlopen(url, timeout=10) as response:
+            disposition = response.headers["Content-Disposition"]
+            self.assertNotIn("X-Evil", response.headers)
+        self.assertIn('filename="B_ng kh_i l__ng 1.xlsx"', disposition)
+        self.assertIn(
+            "filename*=UTF-8''B%E1%BA%A3ng%20kh%E1%BB%91i%20l%C6%B0%E1%BB%A3ng%201.xlsx",
+            disposition,
+        )
+
+
+class SlowJobTest(_ServerTestCase):
+    latency = 3.0
+
+    def test_cancel_between_events(self):
+        job = self.client.submit(self.pdf_path)
+        started = time.monotonic()
+        cancelled_after = None
+        for event in self.client.events(job["id"]):
+            if event["type"] == "keep-alive" and cancelled_after is None:
+                self.client.cancel(job["id"])
+                cancelled_after = time.monotonic() - started
+        # Cancelled while the only page was still with the model
+        self.assertLess(cancelled_after, self.latency)
+        self.assertEqual(self.client.status(job["id"])["status"], "cancelled")
+
+
+if __name__ == "__main__":
+    unittest.main()
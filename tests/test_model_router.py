@@ -0,0 +1,38 @@
+import unittest
+
+from ai.model_router import check_hang_muc
+from ai.models import CongViec, HangMuc
+
+
+def _page(*stts: str) -> HangMuc:
+    return HangMuc(
+        ten_hang_muc="HẠNG MỤC",
+        cong_viec=[
+            CongViec(stt=stt, noi_dung_cong_viec=f"row {stt}", don_vi="m3", khoi_luong="1,5")
+            for stt in stts
+        ],
+    )
+
+
+class CheckHangMucTest(unittest.TestCase):
+    def test_consecutive_rows_pass(self):
+        self.assertIsNone(check_hang_muc(_page("1", "2", "3", "", "4")))
+
+    def test_restarting_sections_pass(self):
+        self.assertIsNone(check_hang_muc(_page("1", "2", "3", "1", "2")))
+        self.assertIsNone(check_hang_muc(_page("I", "1", "2", "II", "1", "2")))
+        self.assertIsNone(check_hang_muc(_page("A", "4", "5", "B", "9", "10")))
+
+    def test_forward_gap_fails(self):
+        self.assertEqual(check_hang_muc(_page("1", "2", "4")), "STT jumps from 2 to 4")
+        self.assertEqual(
+            check_hang_muc(_page("I", "1", "2", "II", "1", "3")), "STT jumps from 1 to 3"
+        )
+
+    def test_empty_page(self):
+        self.assertEqual(check_hang_muc(_page()), "no rows")
+        self.assertIsNone(check_hang_muc(_page(), allow_empty=True))
+
+
+if __name__ == "__main__":
+    unittest.main()